@@ -26,9 +26,9 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 from typing import List, Optional
-from os.path import join, dirname, expanduser, isdir
+from os.path import basename, join, dirname, expanduser, isdir
 from random import sample
 from ovos_plugin_common_play import MediaType, PlaybackType
 from ovos_workshop.skills.common_play import OVOSCommonPlaybackSkill, ocp_search, ocp_play
@@ -38,19 +38,29 @@ from ovos_utils.process_utils import RuntimeRequirements
 from ovos_utils.xdg_utils import xdg_cache_home
 import os
 import sys
+import time
 sys.path.append(os.path.abspath("/home/neon/.local/share/neon/skills/skill-local_music-mike99mac"))
+from async_mpc_client import AsyncMpcClient
 from mpc_client import MpcClient
+from mpd_connection import MpdError
 from music_info import Music_info
+from stream_resolver import StreamUrlCache, YtDlpResolver
+from tracing import TRACER, traced
 from util import MusicLibrary, Track
+from util.watcher import LibraryWatcher
 
 class LocalMusicSkill(OVOSCommonPlaybackSkill):
   def __init__(self, **kwargs):
     self.supported_media = [MediaType.MUSIC,
                             MediaType.AUDIO,
                             MediaType.GENERIC]
-    self.library_update_event = Event()
+    self.library_update_event = Event()    # set when the warm-up is done
+    self.search_ready = Event()            # set when the mpd catalog and the stations are loaded
     self.mpc_client = MpcClient("file:///mnt/usb/music/") # search for music under /mnt/usb/music
+    self.aio = AsyncMpcClient(self.mpc_client) # coroutines of the searches that wait on the network
     self._music_library = None
+    self._music_library_lock = Lock()      # the warm-up and the first search may both ask for it
+    self._library_watcher = None
     # self.music_dir = "/mnt/usb"   
     self.music_info = Music_info("none", "", {}, []) # music to play
     self._image_url = join(dirname(__file__), 'ui/music-solid.svg')
@@ -76,43 +86,143 @@ class LocalMusicSkill(OVOSCommonPlaybackSkill):
 
   @property
   def music_dir(self) -> str:
-    # default_path = "/media"
-    # return expanduser(self.settings.get('music_dir', ""))
-    return self.music_dir
+    return expanduser(self.settings.get('music_dir', "/mnt/usb/music"))
 
   @property
   def music_library(self):
-    if not self._music_library:
-      LOG.info(f"LocalMusicSkill:music_library() Initializing music library at: {self.music_dir}")
-      self._music_library = MusicLibrary(self.music_dir, self.file_system.path)
+    if self._music_library is None:        # an empty library is falsy
+      with self._music_library_lock:       # one library - one database and one scan
+        if self._music_library is None:
+          LOG.info(f"LocalMusicSkill:music_library() Initializing music library at: {self.music_dir}")
+          self._music_library = MusicLibrary(self.music_dir, self.file_system.path,
+                                             scan_workers=self.settings.get("scan_workers"),
+                                             scan_processes=self.settings.get("scan_processes", False),
+                                             art_cache_bytes=self.settings.get("art_cache_mb", 64) * 1024 * 1024)
     return self._music_library
 
     # TODO: Move to __init__ after ovos-workshop stable release
   def initialize(self):
-      # TODO: add intent to update library?
-      # Thread(target=self.update_library, daemon=True).start()
-      pass
+    # TODO: add intent to update library?
+    if self.settings.get("tracing", False): # time the stages of every request
+      TRACER.enabled = True
+    if self.settings.get("metrics_port"):  # serve the stage metrics for Prometheus
+      TRACER.serve(self.settings["metrics_port"])
+    self.add_event("local_music.metrics", self.handle_metrics)
+    Thread(target=self.warm_up, name="LocalMusicWarmUp", daemon=True).start()
+    if self.settings.get("resolve_streams", False): # resolve YouTube streams with yt-dlp instead of ytadd
+      if YtDlpResolver.available():
+        self.mpc_client.stream_cache = StreamUrlCache(YtDlpResolver())
+      else:
+        LOG.warning("LocalMusicSkill:initialize() resolve_streams is set but yt-dlp is not installed - using ytadd")
+    if self.settings.get("prefetch_news", False): # download each news episode as soon as it is out
+      self.mpc_client.news.start_prefetch(self.settings.get("news_interval", 1800))
+
+  def warm_up(self):
+    """
+    Load everything the first request needs in the background: the mpd catalog and the radio stations
+    first - searches wait for them - then the music library, with a full scan that finds tags edited meanwhile
+    """
+    start = time.monotonic()
+    try:
+      try:
+        self.mpc_client.catalog.refresh()
+      except MpdError as e:                # searches ask mpd directly until it is loaded
+        LOG.warning(f"LocalMusicSkill:warm_up() cannot load the mpd catalog: {e}")
+      self.mpc_client.stations.load()
+    finally:                               # never keep searches waiting for a failed warm-up
+      self.search_ready.set()
+    LOG.info(f"LocalMusicSkill:warm_up() searches ready after {time.monotonic() - start:.1f} seconds")
+    try:
+      if isdir(self.music_dir):            # stat every file - tags may have been edited while the skill was down
+        self.music_library.update_library(full=True)
+      else:
+        LOG.info(f"LocalMusicSkill:warm_up() {self.music_dir} not found - not scanning")
+    finally:
+      self.library_update_event.set()
+    LOG.info(f"LocalMusicSkill:warm_up() done after {time.monotonic() - start:.1f} seconds")
+    if self.settings.get("watch_library", True):
+      self.watch_library()
+
+  def watch_library(self):
+    """
+    Keep the music library current by watching the music directory
+    """
+    if not isdir(self.music_dir):
+      LOG.info(f"LocalMusicSkill:watch_library() {self.music_dir} not found - not watching")
+      return
+    self._library_watcher = LibraryWatcher(self.music_library,
+                                           debounce=self.settings.get("watch_debounce", 2.0),
+                                           poll_interval=self.settings.get("watch_poll_interval", 60.0))
+    self._library_watcher.start()
+
+  def handle_metrics(self, message):
+    """
+    Answer a 'local_music.metrics' message with the per-stage counters and latencies
+    'format' in the message data selects 'json' (the default) or 'prometheus'
+    """
+    if message.data.get("format") == "prometheus":
+      data = {"format": "prometheus", "metrics": TRACER.prometheus()}
+    else:
+      data = {"format": "json", "metrics": TRACER.snapshot()}
+    self.bus.emit(message.response(data))
+
+  def speak_lang(self, *args, **kwargs):
+    with TRACER.span("tts"):
+      return super().speak_lang(*args, **kwargs)
+
+  def shutdown(self):
+    TRACER.close()
+    if self._library_watcher:
+      self._library_watcher.stop()
+      self._library_watcher.join(10)
+    self.aio.close()
+    self.mpc_client.close()
 
   def update_library(self):
     LOG.info(f"LocalMusicSkill:update_library() - can mpd auto-update?")
     self.mpc_client.mpc_update()
 
+  def library_track(self, track: Track) -> Track:
+    """
+    Return the music library's track of a search result, which carries its album art
+    mpd results are double quoted paths under the music directory of MpcClient such as
+    "file:///mnt/usb/music/Artist/Album/01 Track.mp3" - other results are returned as they are
+    """
+    path = track.path.strip('"')
+    prefix = self.mpc_client.music_dir
+    if not path.startswith(prefix):
+      return track
+    return self.music_library.get_song(join(self.music_dir, path[len(prefix):])) or track
+
+  @traced("search_music.results")
   def tracks_to_search_results(self, tracks: List[Track], score: int):
     LOG.info(f"LocalMusicSkill.tracks_to_search_results() match_type = {self.music_info.match_type} score = {score}")
+    # URLs of internet and news results and the files of playlists are plain strings
+    tracks = [track if isinstance(track, Track) else Track(track, basename(track)) for track in tracks]
+    # embedded art is extracted in the background - what is not ready yet shows with the next search
+    artworks = self.music_library.get_artworks([self.library_track(track) for track in tracks])
     tracks = [{'media_type': MediaType.MUSIC,
                'playback': PlaybackType.AUDIO,
-               'image': track.artwork if track.artwork else None,
+               'image': artwork,
                'skill_icon': self._image_url,
                'uri': track.path,
                'title': track.title,
                'artist': track.artist,
                'length': track.duration_ms,
-               'match_confidence': 100} for track in tracks]
+               'match_confidence': 100} for track, artwork in zip(tracks, artworks)]
     return tracks   
 
   @ocp_search()
   def search_music(self, sentence, media_type=MediaType.GENERIC):
+    with TRACER.request("search_music"):   # the stages below are timed within it
+      return self._search_music(sentence)
+
+  def _search_music(self, sentence):
     LOG.info(f"LocalMusicSkill:search_music(): sentence = {sentence}")
+    with TRACER.span("search_music.wait_ready"):
+      ready = self.search_ready.wait(self.settings.get("warm_up_wait", 3.0))
+    if not ready:                          # just after boot
+      LOG.info("LocalMusicSkill:search_music(): still warming up - searching anyway")
     sentence = sentence.lower()            # fold to lower case
 
     # if first word is a playlist verb then manipulate playlists  
@@ -151,15 +261,15 @@ class LocalMusicSkill(OVOSCommonPlaybackSkill):
           self.music_info.mesg_file = "searching_internet"
           self.music_info.mesg_info = {"sentence": sentence}
           self.speak_lang(self.skill_base_dir, self.music_info.mesg_file, self.music_info.mesg_info)
-          self.music_info = self.mpc_client.search_internet(self.sentence) # search Internet as fallback
+          self.music_info = self.aio.run(self.aio.search_internet(self.sentence)) # search Internet as fallback
       case "radio":
         self.music_info = self.mpc_client.parse_radio(sentence)
       case "internet":
-        self.music_info = self.mpc_client.search_internet(sentence)
+        self.music_info = self.aio.run(self.aio.search_internet(sentence))
       case "playlist":
-        self.music_info = self.mpc_client.get_playlist(sentence)
+        self.music_info = self.aio.run(self.aio.get_playlist(sentence))
       case "news":
-        self.music_info = self.mpc_client.search_news(sentence)
+        self.music_info = self.aio.run(self.aio.search_news(sentence))
     if self.music_info.tracks != None:     # found music
       LOG.info("LocalMusicSkill:search_music(): found tracks or URLs - calling tracks_to_search_results()")
       tracks = self.tracks_to_search_results(self.music_info.tracks, 100)
@@ -173,6 +283,10 @@ class LocalMusicSkill(OVOSCommonPlaybackSkill):
     """
     Either music has been found, a playlist operation finished, or an error message has to be spoken
     """
+    with TRACER.request("media_play"):
+      return self._media_play()
+
+  def _media_play(self):
     LOG.info(f"LocalMusicSkill.media_play() match_type = {self.music_info.match_type}")
     if self.music_info.match_type == "none": # no music was found
       self.log.debug("MpcSkill.media_play() no music found")
@@ -182,12 +296,16 @@ class LocalMusicSkill(OVOSCommonPlaybackSkill):
       self.log.debug("MpcSkill.media_play() speak results of playlist request")
       self.speak_lang(self.skill_base_dir, self.music_info.mesg_file, self.music_info.mesg_info)
       return None
+    elif self.music_info.match_type == "internet": # URLs are resolved and queued by start_music()
+      pass
     elif self.music_info.match_type != "playlist": # playlists are already queued up
-      self.mpc_client.mpc_cmd("clear")     # stop any media that might be playing
-      for next_url in self.music_info.tracks_or_urls:
-        self.log.debug(f"MpcSkill.media_play() adding URL to MPC queue: {next_url}")
-        cmd = f"add {next_url}"
-        self.mpc_client.mpc_cmd(cmd)
+      play_now = self.music_info.mesg_file == None # nothing to say first
+      # clear, add all tracks, set the modes and play in one round trip to mpd
+      result = self.aio.run(self.aio.enqueue(self.music_info.tracks, clear=True, play=play_now))
+      if result.failed:
+        self.log.warning(f"MpcSkill.media_play() could not queue: {result.failed}")
+      if play_now:
+        return None
     elif self.music_info.match_type == "playlist":
       self.mpc_client.mpc_cmd("random on") # shuffle tracks
     if self.music_info.mesg_file == None:  # no message
@@ -195,4 +313,10 @@ class LocalMusicSkill(OVOSCommonPlaybackSkill):
     else:                                  # speak message and pass callback
       self.speak_lang(self.skill_base_dir, self.music_info.mesg_file, self.music_info.mesg_info, self.start_music)
 
+  def start_music(self):
+    """
+    Start playing the queued music - called after any message has been spoken
+    """
+    self.mpc_client.start_music(self.music_info)
+
   
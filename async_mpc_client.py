@@ -0,0 +1,131 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import asyncio
+import threading
+from concurrent.futures import Future
+from ovos_utils.log import LOG
+from typing import Coroutine, Iterable, List, Optional, Union
+
+from mpc_client import MpcClient, QueueResult
+from mpd_connection import AsyncMpdConnection, MpdCommandError, MpdError
+from music_info import Music_info
+from news_fetcher import NewsError
+from tracing import TRACER
+from util import Track
+
+class AsyncMpcClient():
+  """
+  Coroutine versions of the MpcClient searches, queueing and playlist operations
+  mpd is used through one AsyncMpdConnection and the catalog, search cache, stations and news of the
+  MpcClient are shared. Blocking libraries - youtube_search and the news download - only run in a worker
+  thread on a cache miss.
+  The coroutines run on one background event loop: submit() and run() are the synchronous facade for
+  callers such as OCP search handlers, so concurrent requests need no thread each
+  """
+  def __init__(self, client: MpcClient):
+    self.client = client
+    self.mpd = AsyncMpdConnection.from_connection(client.mpd)
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._lock = threading.Lock()
+
+  def submit(self, coro: Coroutine) -> Future:
+    """ Start a coroutine on the background loop and return its concurrent.futures.Future """
+    return asyncio.run_coroutine_threadsafe(coro, self._event_loop())
+
+  def run(self, coro: Coroutine, timeout: Optional[float]=None):
+    """ Run a coroutine on the background loop and wait for its result - timed as a stage of the caller """
+    with TRACER.span(f"aio.{coro.__name__}"):
+      return self.submit(coro).result(timeout)
+
+  def close(self):
+    """ Close the mpd connection and stop the background loop """
+    with self._lock:
+      loop, self._loop = self._loop, None
+    if loop:
+      asyncio.run_coroutine_threadsafe(self.mpd.close(), loop).result(5)
+      loop.call_soon_threadsafe(loop.stop)
+
+  def _event_loop(self) -> asyncio.AbstractEventLoop:
+    with self._lock:
+      if self._loop is None:
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="AsyncMpcClient", daemon=True).start()
+      return self._loop
+
+  async def search_music(self, command: str, type1: Optional[str]=None, name1: Optional[str]=None,
+                         type2: Optional[str]=None, name2: Optional[str]=None) -> List[List[str]]:
+    """ See MpcClient.search_music() - answered from the catalog once it is loaded in the background """
+    command, args = self.client.search_args(command, type1, name1, type2, name2)
+    try:
+      songs = self.client.catalog.query(command, *args)
+      if songs == None:
+        songs = await self.mpd.songs(command, *args)
+    except MpdError as e:
+      LOG.error(f"AsyncMpcClient.search_music(): {command} {args} failed: {e}")
+      return []
+    return [song.to_fields() for song in songs]
+
+  async def enqueue(self, tracks: Iterable[Union[str, Track]], clear: bool=True, repeat: Optional[bool]=None,
+                    random_mode: Optional[bool]=None, play: bool=True) -> QueueResult:
+    """ See MpcClient.enqueue() - the same command lists and retries, sent over the async connection """
+    head, pending, tail = self.client.queue_commands(tracks, clear, repeat, random_mode, play)
+    result = QueueResult([], [])
+    while head or pending or tail:
+      try:
+        await self.mpd.command_list(head + [("add", uri) for uri in pending] + tail)
+        error = None
+      except MpdError as e:
+        error = e
+      pending = self.client.queue_outcome(result, head, pending, play, error)
+      if pending == None:
+        break
+      head = []                            # the queue was already cleared
+    LOG.info(f"AsyncMpcClient.enqueue() queued: {len(result.queued)} failed: {len(result.failed)} playing: {result.playing}")
+    return result
+
+  async def list_playlists(self):
+    """ See MpcClient.list_playlists() """
+    names = []
+    try:
+      names = await self.mpd.values("listplaylists", "playlist")
+    except MpdError as e:
+      LOG.error(f"AsyncMpcClient.list_playlists(): listplaylists failed: {e}")
+    return self.client.playlists_message(names)
+
+  async def get_playlist(self, playlist_name: str) -> Music_info:
+    """ See MpcClient.get_playlist() - clear, load and list the queue in one round trip """
+    playlist_name = playlist_name.replace(" ", "_")
+    try:
+      _, _, songs = await self.mpd.command_list([("clear",), ("load", playlist_name), ("playlistinfo",)])
+    except MpdCommandError as e:
+      LOG.error(f"AsyncMpcClient.get_playlist(): {e.command} {playlist_name} failed: {e.message}")
+      return Music_info("none", "playlists_not_found", {"playlist_name": playlist_name}, [])
+    except MpdError as e:
+      LOG.error(f"AsyncMpcClient.get_playlist(): mpd not available: {e}")
+      return Music_info("none", "mpc_failed", {"cmd": "playlist", "rc": 1}, [])
+    track_files = [value for key, value in songs if key == "file"]
+    return self.client.playlist_music_info(playlist_name, track_files)
+
+  async def search_youtube(self, phrase: str, max_results: int=3) -> List[dict]:
+    """ See MpcClient.search_youtube() - fresh cached results are returned without a worker thread """
+    results = self.client.search_cache.get_fresh(self.client.youtube_key(phrase, max_results))
+    if results != None:
+      return list(results)
+    return await asyncio.to_thread(self.client.search_youtube, phrase, max_results)
+
+  async def search_internet(self, utterance: str) -> Music_info:
+    """ See MpcClient.search_internet() """
+    phrase = self.client.internet_phrase(utterance)
+    results = await self.search_youtube(phrase, max_results=self.client.max_internet_results)
+    return self.client.internet_music_info(utterance, results)
+
+  async def search_news(self, utterance: str) -> Music_info:
+    """ See MpcClient.search_news() """
+    LOG.info(f"AsyncMpcClient.search_news() utterance: {utterance}")
+    try:
+      file_name = await asyncio.to_thread(self.client.news.fetch)
+    except NewsError as e:
+      LOG.info(f"AsyncMpcClient.search_news() {e}")
+      return Music_info("none", "cannot_play_npr", {}, [])
+    return Music_info("news", "playing_npr", {}, [file_name])
@@ -0,0 +1,225 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Time and measure the memory of the local music library and of MpcClient parsing against deterministic
+# synthetic libraries, and write the results as JSON for comparing runs:
+#   python benchmarks/bench_library.py [--sizes 1000,10000,100000,1000000] [--tagged] [--output results.json]
+#
+# scan   - MusicLibrary.update_library(): first scan, unchanged rescan and full rescan of the files
+# load   - opening the library database and iterating all tracks, with the resident memory
+# search - the MusicLibrary searches the skill runs for artist, album, genre, track and free text
+# parse  - MusicLibrary.song_from_file_path(), MpcClient.time_to_seconds(), mpd response parsing,
+#          MpdCatalog.refresh() and MpcClient.search_library() over request phrases
+#
+# Files are empty and tracks come from their paths unless --tagged writes ID3 tagged files - with an
+# embedded cover each if --covers - which are parsed by the files plugin like a real library
+#
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_library import mpd_pairs, synthetic_tracks, write_library
+from mpc_client import MpcClient
+from mpd_catalog import MpdCatalog
+from mpd_connection import parse_songs
+from util import MusicLibrary, _resident_memory
+from version import __version__
+
+BENCHMARKS = ("scan", "load", "search", "parse")
+PHRASES = ["{title} by {artist}", "track {title}", "album {album} by artist {artist}", "artist {artist}",
+           "genre {genre}", "random music", "{title}"]
+
+class PathLibrary(MusicLibrary):
+  """ Takes tracks from file paths like the fallback for unreadable tags, so empty files can be scanned """
+  def _parse_track_from_file(self, file_path: str, album_art: str=None):
+    return self.song_from_file_path(file_path, album_art)
+
+class SyntheticMpd():
+  """ Answers the commands MpdCatalog.refresh() sends with the mpd protocol pairs of the synthetic tracks """
+  def __init__(self, tracks: list):
+    self.directories = {}
+    for track in tracks:
+      self.directories.setdefault(track.artist, []).append(track)
+
+  def listing(self, directory: str) -> list:
+    pairs = [("directory", directory)]
+    for track in self.directories[directory]:
+      pairs.extend(mpd_pairs(track))
+    return pairs
+
+  def command(self, name: str, *args) -> list:
+    if name == "lsinfo" and not args:
+      return [("directory", directory) for directory in self.directories]
+    if name == "listallinfo" and args:
+      return self.listing(args[0])
+    return []
+
+  def songs(self, name: str, *args) -> list:
+    return parse_songs(self.command(name, *args))
+
+  def command_list(self, commands: list) -> list:
+    return [self.command(*command) for command in commands]
+
+  def values(self, name: str, key: str, *args) -> list:
+    return []
+
+  def close(self):
+    pass
+
+def timed(function, repeat: int) -> float:
+  """ Return the median seconds of repeat calls """
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - start)
+  return sorted(times)[len(times) // 2]
+
+def peak_memory() -> int:
+  """ Peak resident memory of this process in bytes """
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == "darwin" else peak * 1024
+
+def result(benchmark: str, operation: str, tracks: int, seconds: float, items: int, **extra) -> dict:
+  """ One result record - per_item_us is the time per track, file, phrase or query """
+  record = {"benchmark": benchmark, "operation": operation, "tracks": tracks, "seconds": round(seconds, 6),
+            "items": items, "per_item_us": round(seconds / max(items, 1) * 1e6, 3)}
+  record.update(extra)
+  return record
+
+def bench_scan(library_dir: str, cache_dir: str, tracks: list, tagged: bool) -> list:
+  library_class = MusicLibrary if tagged else PathLibrary
+  library = library_class(library_dir, cache_dir)
+  results = []
+  for operation, full in (("first scan", False), ("unchanged rescan", False), ("full rescan", True)):
+    start = time.perf_counter()
+    changes = library.update_library(full=full)
+    seconds = time.perf_counter() - start
+    results.append(result("scan", operation, len(tracks), seconds, len(tracks), parsed=len(changes.added) +
+                          len(changes.changed), db_bytes=library.memory_usage()["db_bytes"]))
+  return results
+
+def bench_load(library_dir: str, cache_dir: str, tracks: list) -> list:
+  rss_before = _resident_memory()
+  start = time.perf_counter()
+  library = MusicLibrary(library_dir, cache_dir)
+  count = len(library)
+  opened = time.perf_counter() - start
+  start = time.perf_counter()
+  iterated = sum(1 for _ in library.all_songs)
+  seconds = time.perf_counter() - start
+  rss_after = _resident_memory()
+  growth = rss_after - rss_before if rss_before and rss_after else None
+  return [result("load", "open", len(tracks), opened, count, rss_bytes=rss_after, rss_growth_bytes=growth),
+          result("load", "iterate all songs", len(tracks), seconds, iterated, rss_bytes=_resident_memory(),
+                 peak_rss_bytes=peak_memory())]
+
+def bench_search(library_dir: str, cache_dir: str, tracks: list, repeat: int, rng: random.Random) -> list:
+  library = MusicLibrary(library_dir, cache_dir)
+  samples = rng.sample(tracks, min(len(tracks), 20))
+  searches = {
+    "artist": lambda: [library.search_songs_for_artist(track.artist) for track in samples],
+    "album": lambda: [library.search_songs_for_album(track.album) for track in samples],
+    "genre": lambda: [library.search_songs_for_genre(track.genre) for track in samples],
+    "track": lambda: [library.search_songs_for_track(track.title) for track in samples],
+    "free text": lambda: [library.search_songs(f"{track.title} by {track.artist}") for track in samples],
+  }
+  return [result("search", name, len(tracks), timed(search, repeat), len(samples))
+          for name, search in searches.items()]
+
+def bench_parse(library_dir: str, cache_dir: str, tracks: list, repeat: int, rng: random.Random) -> list:
+  results = []
+  paths = [os.path.join(library_dir, track.rel_path) for track in tracks]
+  seconds = timed(lambda: [MusicLibrary.song_from_file_path(path) for path in paths], repeat)
+  results.append(result("parse", "song_from_file_path", len(tracks), seconds, len(paths)))
+  mpd = SyntheticMpd(tracks)
+  client = MpcClient(library_dir, cache_dir=os.path.join(cache_dir, "mpc"))
+  client.mpd.close()
+  client.mpd = mpd
+  client.catalog = MpdCatalog(mpd, watch=False)
+  times = [track.time_str for track in tracks]
+  seconds = timed(lambda: [client.time_to_seconds(time_str) for time_str in times], repeat)
+  results.append(result("parse", "time_to_seconds", len(tracks), seconds, len(times)))
+  pairs = [pair for directory in mpd.directories for pair in mpd.listing(directory)]
+  seconds = timed(lambda: parse_songs(pairs), repeat)
+  results.append(result("parse", "mpd response", len(tracks), seconds, len(tracks), pairs=len(pairs)))
+  rss_before = _resident_memory()
+  seconds = timed(client.catalog.refresh, repeat)
+  rss_after = _resident_memory()
+  results.append(result("parse", "catalog refresh", len(tracks), seconds, len(client.catalog),
+                        rss_bytes=rss_after, rss_growth_bytes=rss_after - rss_before if rss_before else None))
+  phrases = [rng.choice(PHRASES).format(title=track.title, artist=track.artist, album=track.album,
+                                        genre=track.genre).lower() for track in rng.sample(tracks, min(len(tracks), 50))]
+  client.search_library(phrases[0])        # the fuzzy index is built on the first miss
+  seconds = timed(lambda: [client.search_library(phrase) for phrase in phrases], repeat)
+  results.append(result("parse", "search_library", len(tracks), seconds, len(phrases)))
+  client.close()
+  return results
+
+def run(size: int, args, benchmarks: list) -> list:
+  tmp_dir = tempfile.mkdtemp(prefix=f"bench_library_{size}_")
+  library_dir = os.path.join(tmp_dir, "Music")
+  cache_dir = os.path.join(tmp_dir, "cache")
+  rng = random.Random(args.seed)
+  try:
+    tracks = list(synthetic_tracks(size, args.seed))
+    start = time.perf_counter()
+    written = write_library(library_dir, tracks, tagged=args.tagged, covers=args.covers)
+    results = [result("generate", "write files", size, time.perf_counter() - start, size, bytes=written)]
+    if "scan" in benchmarks or "load" in benchmarks or "search" in benchmarks:
+      scan = bench_scan(library_dir, cache_dir, tracks, args.tagged)
+      if "scan" in benchmarks:
+        results.extend(scan)
+    if "load" in benchmarks:
+      results.extend(bench_load(library_dir, cache_dir, tracks))
+    if "search" in benchmarks:
+      results.extend(bench_search(library_dir, cache_dir, tracks, args.repeat, rng))
+    if "parse" in benchmarks:
+      results.extend(bench_parse(library_dir, cache_dir, tracks, args.repeat, rng))
+    return results
+  finally:
+    if not args.keep:
+      shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark MusicLibrary and MpcClient on synthetic libraries")
+  parser.add_argument("--sizes", default="1000,10000", help="comma separated library sizes in tracks")
+  parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help=f"any of {','.join(BENCHMARKS)}")
+  parser.add_argument("--seed", type=int, default=1, help="seed of the synthetic libraries")
+  parser.add_argument("--repeat", type=int, default=5, help="runs of each timed operation, the median is reported")
+  parser.add_argument("--tagged", action="store_true", help="write ID3 tagged files and parse their tags")
+  parser.add_argument("--covers", action="store_true", help="embed a cover in each tagged file")
+  parser.add_argument("--keep", action="store_true", help="keep the generated libraries")
+  parser.add_argument("--output", help="JSON file to write, standard output if not given")
+  args = parser.parse_args()
+  benchmarks = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+  unknown = set(benchmarks) - set(BENCHMARKS)
+  if unknown:
+    parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+  logging.disable(logging.INFO)            # the library logs every scan and search
+  report = {"suite": "bench_library", "version": __version__, "python": platform.python_version(),
+            "machine": platform.machine(), "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "seed": args.seed,
+            "tagged": args.tagged, "covers": args.covers, "repeat": args.repeat, "results": []}
+  for size in (int(size) for size in args.sizes.split(",")):
+    print(f"bench_library: {size} tracks", file=sys.stderr)
+    report["results"].extend(run(size, args, benchmarks))
+  text = json.dumps(report, indent=2)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(text + "\n")
+  else:
+    print(text)
+
+if __name__ == "__main__":
+  main()
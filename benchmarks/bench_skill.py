@@ -0,0 +1,299 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Replay an utterance corpus through LocalMusicSkill.search_music() and media_play() against the fake mpd
+# and report the latency percentiles and mpd round trips per kind of request as JSON:
+#   python benchmarks/bench_skill.py [--tracks 5000] [--rounds 3] [--latency-ms 1] [--output results.json]
+#
+# Everything outside the process is local: the fake mpd serves the synthetic library the skill also scans,
+# YouTube searches and stream resolution wait --youtube-ms and --resolve-ms, the news podcast is served
+# over HTTP after --http-ms and speaking a message takes --tts-ms before its callback runs.
+# Streams are queued by a ytadd stand-in calling the fake mpc - the subprocess path - unless
+# --streams resolver resolves them in process.
+# Round trips count every request mpd received while an utterance was handled, including streams still
+# being queued in the background by an earlier one. --trace adds the latencies of the stages of the
+# requests - the library search, mpd round trips, YouTube, ytadd, queueing, speaking - from the tracer
+#
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import stat
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SKILL_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BENCH_DIR)
+sys.path.append(SKILL_DIR)
+from fake_mpd import FakeMpd
+from synthetic_library import synthetic_tracks, write_library
+from version import __version__
+
+SKILL_ID = "skill-local_music.mike99mac"
+CORPUS = [                                 # kind, template filled from a random synthetic track
+  ("track", "play {title} by {artist}"),
+  ("track", "play the song {title}"),
+  ("album", "play the album {album} by {artist}"),
+  ("artist", "play artist {artist}"),
+  ("genre", "play genre {genre}"),
+  ("random", "play some music"),
+  ("misheard", "play {misheard} by {artist}"),
+  ("internet", "play {title} from the internet"),
+  ("playlist", "play playlist {genre} mix"),
+  ("playlist_op", "list my playlists"),
+  ("news", "play the news"),
+]
+YTADD = """#!/bin/sh
+# resolving takes a while, then the stream is queued with mpc
+sleep {delay}
+exec mpc add "https://stream.example/$(echo "$1" | sed 's/.*v=//')"
+"""
+MPC = """#!/bin/sh
+exec "{python}" "{fake_mpc}" "$@"
+"""
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+  """ Nearest-rank p50, p90, p95 and p99 with the mean and the maximum """
+  if not values:
+    return {}
+  ordered = sorted(values)
+  stats = {f"p{p}": round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))], 3)
+           for p in (50, 90, 95, 99)}
+  stats.update({"mean": round(sum(ordered) / len(ordered), 3), "max": round(ordered[-1], 3)})
+  return stats
+
+def make_corpus(tracks: list, count: int, seed: int) -> List[Tuple[str, str]]:
+  """ count utterances cycling through the kinds of CORPUS """
+  rng = random.Random(seed)
+  corpus = []
+  for i in range(count):
+    kind, template = CORPUS[i % len(CORPUS)]
+    track = rng.choice(tracks)
+    title = track.title.rsplit(" ", 1)[0]  # without the number that makes names unique
+    cut = rng.randrange(len(title))
+    misheard = title[:cut] + title[cut + 1:] if len(title) > 4 else title
+    corpus.append((kind, template.format(title=track.title, artist=track.artist, album=track.album,
+                                         genre=track.genre, misheard=misheard + track.title[len(title):]).lower()))
+  return corpus
+
+def read_corpus(path: str) -> List[Tuple[str, str]]:
+  """ One utterance per line, optionally after its kind and a tab """
+  corpus = []
+  with open(path) as f:
+    for line in f:
+      line = line.strip()
+      if line and not line.startswith("#"):
+        kind, _, utterance = line.rpartition("\t")
+        corpus.append((kind or "custom", utterance))
+  return corpus
+
+class _Podcast(BaseHTTPRequestHandler):
+  """ News podcast page with an ETag, and its episode """
+  delay = 0.0
+
+  def do_GET(self):
+    time.sleep(self.delay)
+    if self.path == "/podcast":
+      if self.headers.get("If-None-Match") == '"ep1"':
+        self.send_response(304)
+        self.end_headers()
+        return
+      host, port = self.server.server_address
+      body = f'<script>{{"audioUrl":"http:\\/\\/{host}:{port}\\/ep1.mp3"}}</script>'.encode()
+      self.send_response(200)
+      self.send_header("ETag", '"ep1"')
+    else:
+      body = bytes(64 * 1024)
+      self.send_response(200)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+class FakeYoutubeSearch():
+  """ Answers like youtube_search.YoutubeSearch after the configured delay """
+  delay = 0.0
+
+  def __init__(self, phrase: str, max_results: int=10):
+    self.phrase = phrase.strip()
+    self.max_results = max_results
+
+  def to_dict(self) -> List[dict]:
+    time.sleep(self.delay)
+    slug = "".join(c for c in self.phrase if c.isalnum())[:12]
+    return [{"title": f"{self.phrase} {i}", "url_suffix": f"/watch?v={slug}{i}"} for i in range(self.max_results)]
+
+def install_shims(bin_dir: str, ytadd_delay: float) -> str:
+  """ Write mpc and ytadd stand-ins into bin_dir and put it first on the PATH, return the ytadd path """
+  os.makedirs(bin_dir, exist_ok=True)
+  scripts = {"mpc": MPC.format(python=sys.executable, fake_mpc=os.path.join(BENCH_DIR, "fake_mpc.py")),
+             "ytadd": YTADD.format(delay=ytadd_delay)}
+  for name, script in scripts.items():
+    path = os.path.join(bin_dir, name)
+    with open(path, "w") as f:
+      f.write(script)
+    os.chmod(path, stat.S_IRWXU)
+  os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+  return os.path.join(bin_dir, "ytadd")
+
+def load_skill_class():
+  """ Import the skill from its directory the way the skill loader does """
+  spec = importlib.util.spec_from_file_location("skill_local_music", os.path.join(SKILL_DIR, "__init__.py"),
+                                                submodule_search_locations=[SKILL_DIR])
+  module = importlib.util.module_from_spec(spec)
+  sys.modules[spec.name] = module
+  spec.loader.exec_module(module)
+  return module.LocalMusicSkill
+
+def fake_bus():
+  try:
+    from ovos_utils.fakebus import FakeBus
+  except ImportError:                      # older ovos_utils
+    from ovos_utils.messagebus import FakeBus
+  return FakeBus()
+
+def replay(skill, fake: FakeMpd, corpus: List[Tuple[str, str]], rounds: int) -> List[dict]:
+  records = []
+  for round_no in range(rounds):
+    for kind, utterance in corpus:
+      record = {"round": round_no, "kind": kind, "utterance": utterance, "error": None}
+      trips = fake.round_trips
+      searched = None
+      start = time.perf_counter()
+      try:
+        skill.search_music(utterance)
+        searched = time.perf_counter()
+        skill.media_play(None)
+      except Exception as e:               # keep going - the failure is part of the result
+        record["error"] = f"{type(e).__name__}: {e}"
+      end = time.perf_counter()
+      searched = searched or end
+      record.update({"match_type": skill.music_info.match_type, "search_ms": (searched - start) * 1000,
+                     "play_ms": (end - searched) * 1000, "total_ms": (end - start) * 1000,
+                     "round_trips": fake.round_trips - trips})
+      records.append(record)
+  return records
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+  groups: Dict[str, List[dict]] = {"all": records}
+  for record in records:
+    groups.setdefault(record["kind"], []).append(record)
+  return {kind: {"requests": len(group), "errors": sum(1 for r in group if r["error"]),
+                 "total_ms": percentiles([r["total_ms"] for r in group]),
+                 "search_ms": percentiles([r["search_ms"] for r in group]),
+                 "play_ms": percentiles([r["play_ms"] for r in group]),
+                 "round_trips": percentiles([r["round_trips"] for r in group])}
+          for kind, group in groups.items()}
+
+def main():
+  parser = argparse.ArgumentParser(description="Replay utterances through the skill against a fake mpd")
+  parser.add_argument("--tracks", type=int, default=5000, help="size of the synthetic library")
+  parser.add_argument("--corpus", help="utterances to replay, one per line as '<kind><tab><utterance>'")
+  parser.add_argument("--utterances", type=int, default=55, help="size of the generated corpus")
+  parser.add_argument("--rounds", type=int, default=3, help="times the corpus is replayed")
+  parser.add_argument("--seed", type=int, default=1)
+  parser.add_argument("--latency-ms", type=float, default=0.0, help="added by mpd to every round trip")
+  parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra mpd latency up to this")
+  parser.add_argument("--failure-rate", type=float, default=0.0, help="share of mpd round trips failing")
+  parser.add_argument("--drop-rate", type=float, default=0.0, help="share of mpd round trips dropping the connection")
+  parser.add_argument("--fail", default="", help="comma separated mpd commands that always fail")
+  parser.add_argument("--streams", choices=("ytadd", "resolver"), default="ytadd", help="how streams are queued")
+  parser.add_argument("--youtube-ms", type=float, default=300.0, help="time of a YouTube search")
+  parser.add_argument("--resolve-ms", type=float, default=1000.0, help="time to resolve a stream URL")
+  parser.add_argument("--http-ms", type=float, default=50.0, help="time of a request to the news podcast")
+  parser.add_argument("--tts-ms", type=float, default=0.0, help="time to speak a message")
+  parser.add_argument("--trace", action="store_true", help="include the per-stage metrics of the requests")
+  parser.add_argument("--details", action="store_true", help="include every request in the results")
+  parser.add_argument("--output", help="JSON file to write, standard output if not given")
+  args = parser.parse_args()
+  logging.disable(logging.WARNING)         # the skill logs every step of every request
+
+  tmp_dir = tempfile.mkdtemp(prefix="bench_skill_")
+  for name in ("XDG_CONFIG_HOME", "XDG_DATA_HOME", "XDG_CACHE_HOME"): # keep the user's skill data out of it
+    os.environ[name] = os.path.join(tmp_dir, name.lower())
+  tracks = list(synthetic_tracks(args.tracks, args.seed))
+  music_dir = os.path.join(tmp_dir, "music")
+  write_library(music_dir, tracks, tagged=True)
+  corpus = read_corpus(args.corpus) if args.corpus else make_corpus(tracks, args.utterances, args.seed)
+  fake = FakeMpd(tracks, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed,
+                 fail_commands=[name for name in args.fail.split(",") if name]).start()
+  rng = random.Random(args.seed)
+  for kind, utterance in corpus:           # the playlist each playlist request loads
+    if kind == "playlist":
+      fake.playlists[utterance.replace(" ", "_")] = [track.rel_path for track in rng.sample(tracks, 20)]
+  os.environ["MPD_HOST"], os.environ["MPD_PORT"] = fake.address[0], str(fake.address[1])
+  ytadd = install_shims(os.path.join(tmp_dir, "bin"), args.resolve_ms / 1000)
+  podcast = ThreadingHTTPServer(("127.0.0.1", 0), _Podcast)
+  _Podcast.delay = args.http_ms / 1000
+  threading.Thread(target=podcast.serve_forever, daemon=True).start()
+
+  import mpc_client
+  from stream_resolver import StreamUrlCache
+  from tracing import TRACER
+  FakeYoutubeSearch.delay = args.youtube_ms / 1000
+  mpc_client.YoutubeSearch = FakeYoutubeSearch # the network boundary - the search cache stays in use
+  skill_class = load_skill_class()
+  start = time.perf_counter()
+  skill = skill_class(skill_id=SKILL_ID, bus=fake_bus(),
+                      settings={"music_dir": music_dir, "watch_library": False, "warm_up_wait": 30.0})
+  skill.search_ready.wait(120)
+  search_ready = time.perf_counter() - start
+  skill.library_update_event.wait()
+  warm_up = time.perf_counter() - start
+  client = skill.mpc_client
+  client.news.page_url = "http://%s:%d/podcast" % podcast.server_address
+  if args.streams == "ytadd":
+    client.stream_cache = None
+    client.ytadd = ytadd
+  else:
+    def resolve(page_url: str) -> str:
+      time.sleep(args.resolve_ms / 1000)
+      return f"https://stream.example/{page_url.rsplit('=', 1)[-1]}"
+    client.stream_cache = StreamUrlCache(resolve)
+
+  def speak_lang(base_dir, mesg_file, mesg_info=None, callback=None):
+    with TRACER.span("tts"):
+      time.sleep(args.tts_ms / 1000)
+    if callback:
+      callback()
+  skill.speak_lang = speak_lang
+  fake.failure_rate, fake.drop_rate = args.failure_rate, args.drop_rate # after the warm-up
+  fake.reset_stats()
+  TRACER.reset()
+  TRACER.enabled = args.trace
+  records = replay(skill, fake, corpus, args.rounds)
+  stages = TRACER.snapshot()["stages"]
+  mpd_stats = fake.stats()
+  skill.shutdown()
+  fake.stop()
+  podcast.shutdown()
+
+  report = {"suite": "bench_skill", "version": __version__, "python": platform.python_version(), "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "seed": args.seed,
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "details")},
+            "warm_up": {"search_ready_ms": round(search_ready * 1000, 3), "library_ms": round(warm_up * 1000, 3)},
+            "summary": summarize(records), "mpd": mpd_stats}
+  if args.trace:
+    report["stages"] = stages
+  if args.details:
+    report["requests"] = [{key: round(value, 3) if isinstance(value, float) else value
+                           for key, value in record.items()} for record in records]
+  text = json.dumps(report, indent=2)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(text + "\n")
+  else:
+    print(text)
+
+if __name__ == "__main__":
+  main()
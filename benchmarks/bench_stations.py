@@ -0,0 +1,77 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Time the import of a synthetic radio directory dump into the station store and the lookups
+# MpcClient.get_stations() runs against it:
+#   python benchmarks/bench_stations.py [--stations 50000]
+#
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from station_store import StationStore, import_stations
+
+GENRES = ["pop", "top 40", "rock", "jazz", "classical", "news", "talk", "hip hop", "country", "oldies",
+          "electronic", "ambient", "blues", "reggae", "latin", "metal", "folk", "soul", "rnb", "dance"]
+COUNTRIES = ["The United States Of America", "Germany", "France", "The United Kingdom", "Canada", "Brazil",
+             "Spain", "Italy", "Mexico", "Australia", "Japan", "India", "Netherlands", "Poland", "Russia"]
+LANGUAGES = ["english", "german", "french", "spanish", "portuguese", "italian", "japanese", "hindi", "dutch"]
+
+def make_dump(path: str, count: int, seed: int=1):
+  """ Write a radio-browser style JSON array of count stations, 5% of them repeating a stream URL """
+  rng = random.Random(seed)
+  with open(path, "w") as f:
+    f.write("[")
+    for i in range(count):
+      url_id = rng.randrange(i) if i and rng.random() < 0.05 else i
+      station = {"name": f"station {i} {rng.choice(GENRES)} fm",
+                 "url": f"http://stream{url_id % 97}.example.com/{url_id}",
+                 "tags": ",".join(rng.sample(GENRES, rng.randint(1, 4))),
+                 "country": rng.choice(COUNTRIES), "language": rng.choice(LANGUAGES)}
+      f.write(("," if i else "") + json.dumps(station))
+    f.write("]")
+
+def timed(function, repeat: int):
+  """ Return the median seconds of repeat calls """
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - start)
+  return sorted(times)[len(times) // 2]
+
+def main():
+  parser = argparse.ArgumentParser(description="Time station store import and lookups")
+  parser.add_argument("--stations", type=int, default=50000, help="number of stations in the dump")
+  parser.add_argument("--repeat", type=int, default=50, help="runs of each lookup")
+  args = parser.parse_args()
+  tmp_dir = tempfile.mkdtemp()
+  source = os.path.join(tmp_dir, "stations.json")
+  make_dump(source, args.stations)
+  db_file = os.path.join(tmp_dir, "stations.sqlite")
+  stats = import_stations(source, db_file)
+  print(f"import: {stats.read} records, {stats.imported} stations, {stats.duplicates} duplicates "
+        f"in {stats.seconds:.2f} s ({os.path.getsize(db_file) / 1e6:.1f} MB)")
+  store = StationStore(db_file)
+  start = time.perf_counter()
+  store.load()
+  print(f"open: {(time.perf_counter() - start) * 1000:.2f} ms")
+  lookups = {
+    "random 20": lambda: store.sample(20),
+    "genre 20": lambda: store.sample(20, "genre", "jazz"),
+    "genre substring 20": lambda: store.sample(20, "genre", "hop"),
+    "country 20": lambda: store.sample(20, "country", "france"),
+    "country substring 20": lambda: store.sample(20, "country", "united"),
+    "language 20": lambda: store.sample(20, "language", "german"),
+    "station name": lambda: store.find("name", "station 4711"),
+  }
+  for name, lookup in lookups.items():
+    print(f"{name}: {timed(lookup, args.repeat) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+  main()
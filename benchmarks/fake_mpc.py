@@ -0,0 +1,85 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Stand-in for the mpc command line client, for scripts such as ytadd that queue streams with 'mpc add'.
+# It sends the mpd protocol command for each mpc sub-command to MPD_HOST:MPD_PORT - the fake mpd of the
+# benchmarks or a real one - and exits like mpc: 0 on success, 1 with the error on standard error.
+# bench_skill.py installs it as 'mpc' on the PATH of the processes it starts:
+#   python benchmarks/fake_mpc.py add http://stream.example/1
+#
+import os
+import socket
+import sys
+from typing import List, Optional, Tuple
+
+# mpc sub-command -> mpd command, for those that differ or need their argument translated
+COMMANDS = {"prev": "previous", "toggle": "pause", "insert": "addid", "lsplaylists": "listplaylists",
+            "playlist": "playlistinfo", "volume": "setvol", "del": "delete", "current": "currentsong",
+            "ls": "lsinfo"}
+TOGGLES = ("repeat", "random", "single", "consume")
+
+def quote(arg: str) -> str:
+  return '"' + arg.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def translate(args: List[str]) -> Tuple[str, List[str]]:
+  """ Return the mpd command and its arguments for an mpc command line """
+  name, rest = (args[0], args[1:]) if args else ("status", [])
+  if name in TOGGLES:
+    rest = ["1" if arg == "on" else "0" if arg == "off" else arg for arg in rest]
+  elif name == "del":                      # mpc counts from 1
+    rest = [str(int(arg) - 1) for arg in rest]
+  elif name == "play" and rest:
+    rest = [str(int(rest[0]) - 1)]
+  return COMMANDS.get(name, name), rest
+
+def connect(host: Optional[str]=None, port: Optional[int]=None) -> Tuple[socket.socket, object]:
+  host = host or os.getenv("MPD_HOST") or "localhost"
+  password = None
+  if "@" in host and not host.startswith("@"):
+    password, host = host.split("@", 1)
+  port = int(port or os.getenv("MPD_PORT") or 6600)
+  if host.startswith("/"):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(host)
+  else:
+    sock = socket.create_connection((host, port), timeout=30)
+  rfile = sock.makefile("rb")
+  if not rfile.readline().startswith(b"OK MPD "):
+    raise OSError(f"{host}:{port} is not mpd")
+  if password:
+    request(sock, rfile, f"password {quote(password)}")
+  return sock, rfile
+
+def request(sock: socket.socket, rfile, line: str) -> List[str]:
+  """ Send one command line and return the lines of the response, raising RuntimeError on ACK """
+  sock.sendall((line + "\n").encode("utf-8"))
+  lines = []
+  while True:
+    response = rfile.readline().decode("utf-8", errors="replace").rstrip("\n")
+    if not response:
+      raise OSError("connection closed by mpd")
+    if response == "OK":
+      return lines
+    if response.startswith("ACK "):
+      raise RuntimeError(response.split("} ", 1)[-1])
+    lines.append(response)
+
+def main(argv: List[str]) -> int:
+  name, args = translate(argv)
+  try:
+    sock, rfile = connect()
+    with sock:
+      lines = request(sock, rfile, " ".join([name] + [quote(arg) for arg in args]))
+  except (OSError, RuntimeError, ValueError) as e:
+    print(f"error: {e}", file=sys.stderr)
+    return 1
+  for line in lines:                       # mpc prints file names and values - close enough for scripts
+    key, _, value = line.partition(": ")
+    if name in ("status", "stats"):
+      print(line)
+    elif key in ("file", "playlist", "directory"):
+      print(value)
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,326 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# A stand-in mpd server for benchmarks: it speaks enough of the mpd protocol for MpcClient, MpdCatalog,
+# AsyncMpcClient and mpc, serves a synthetic library from memory, counts round trips and can add latency
+# and failures. Run on its own to point mpc or the skill at it:
+#   python benchmarks/fake_mpd.py [--port 6600] [--tracks 10000] [--latency-ms 2] [--failure-rate 0.01]
+#
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test"))
+from fake_mpd_server import ACK_ARG, ACK_NO_EXIST, Ack, FakeMpdServer
+from synthetic_library import SyntheticTrack, mpd_pairs, synthetic_tracks
+
+TAGS = {"artist": "artist", "album": "album", "title": "title", "genre": "genre", "file": "rel_path"}
+
+class FakeMpd(FakeMpdServer):
+  """
+  In-memory mpd: a library of synthetic tracks, the queue, stored playlists and the player state
+  The protocol, the fault injection and the counters are those of FakeMpdServer, the fake mpd of the tests:
+    latency, jitter   - seconds added before answering a round trip
+    failure_rate      - share of round trips answered with an ACK for their first command
+    drop_rate         - share of round trips whose connection is closed without an answer
+    fail_commands     - commands that always fail
+  round_trips counts requests answered, idle excluded; stats() has the commands by name
+  """
+  def __init__(self, tracks: Iterable[SyntheticTrack], host: str="127.0.0.1", port: int=0, latency: float=0.0,
+               jitter: float=0.0, failure_rate: float=0.0, drop_rate: float=0.0,
+               fail_commands: Iterable[str]=(), password: Optional[str]=None, seed: int=1):
+    super().__init__(host=host, port=port, latency=latency, jitter=jitter, failure_rate=failure_rate,
+                     drop_rate=drop_rate, fail_commands=fail_commands, strict=True, password=password,
+                     record=False, seed=seed)
+    self.tracks = list(tracks)
+    self.by_file = {track.rel_path: track for track in self.tracks}
+    self.queue: List[str] = []             # URIs of the queue
+    self.playlists: Dict[str, List[str]] = {}
+    self.state = "stop"
+    self.current = -1
+    self.modes = {"repeat": "0", "random": "0", "single": "0", "consume": "0"}
+    self.volume = 100
+    self.queue_version = 1
+
+  # Queries
+
+  def _match(self, args: List[str], exact: bool) -> List[SyntheticTrack]:
+    if len(args) % 2:
+      raise Ack(ACK_ARG, "incorrect arguments")
+    tracks = self.tracks
+    for tag, value in zip(args[0::2], args[1::2]):
+      tag, value = tag.lower(), value.casefold()
+      if tag != "any" and tag not in TAGS:
+        raise Ack(ACK_ARG, f"unknown tag type: {tag}")
+      attrs = TAGS.values() if tag == "any" else [TAGS[tag]]
+      if exact:
+        tracks = [t for t in tracks if any(getattr(t, attr).casefold() == value for attr in attrs)]
+      else:
+        tracks = [t for t in tracks if any(value in getattr(t, attr).casefold() for attr in attrs)]
+    return tracks
+
+  @staticmethod
+  def _songs(tracks: Iterable[SyntheticTrack]) -> List[Tuple[str, str]]:
+    return [pair for track in tracks for pair in mpd_pairs(track)]
+
+  def _under(self, directory: str) -> List[SyntheticTrack]:
+    prefix = directory.strip("/") + "/" if directory.strip("/") else ""
+    return [track for track in self.tracks if track.rel_path.startswith(prefix)]
+
+  def _song(self, uri: str, pos: int) -> List[Tuple[str, str]]:
+    track = self.by_file.get(uri)
+    pairs = mpd_pairs(track) if track else [("file", uri)]
+    return pairs + [("Pos", str(pos)), ("Id", str(pos + 1))]
+
+  def cmd_search(self, *args):
+    return self._songs(self._match(list(args), exact=False))
+
+  def cmd_find(self, *args):
+    return self._songs(self._match(list(args), exact=True))
+
+  def cmd_list(self, tag, *args):
+    attr = TAGS.get(tag.lower())
+    if attr is None:
+      raise Ack(ACK_ARG, f"unknown tag type: {tag}")
+    values = dict.fromkeys(getattr(track, attr) for track in self._match(list(args), exact=True))
+    return [(tag.capitalize(), value) for value in values]
+
+  def cmd_lsinfo(self, directory=""):
+    directory = directory.strip("/")
+    depth = directory.count("/") + 1 if directory else 0
+    tracks = self._under(directory)
+    if directory and not tracks:
+      raise Ack(ACK_NO_EXIST, "No such directory")
+    pairs = []
+    subdirs = dict.fromkeys("/".join(track.rel_path.split("/")[:depth + 1]) for track in tracks
+                            if track.rel_path.count("/") > depth)
+    pairs.extend(("directory", subdir) for subdir in subdirs)
+    pairs.extend(self._songs(track for track in tracks if track.rel_path.count("/") == depth))
+    return pairs
+
+  def cmd_listallinfo(self, directory=""):
+    tracks = self._under(directory)
+    if directory.strip("/") and not tracks:
+      raise Ack(ACK_NO_EXIST, "No such directory")
+    pairs = []
+    seen = set()
+    for track in tracks:
+      album_dir = track.rel_path.rsplit("/", 1)[0]
+      for subdir in (album_dir.split("/")[0], album_dir):
+        if subdir not in seen and subdir != directory.strip("/"):
+          seen.add(subdir)
+          pairs.append(("directory", subdir))
+      pairs.extend(mpd_pairs(track))
+    return pairs
+
+  def cmd_listall(self, directory=""):
+    return [("file", track.rel_path) for track in self._under(directory)]
+
+  def cmd_count(self, *args):
+    tracks = self._match(list(args), exact=True)
+    return [("songs", str(len(tracks))), ("playtime", str(sum(track.seconds for track in tracks)))]
+
+  # Queue and player
+
+  def cmd_add(self, uri):
+    if "://" not in uri and uri not in self.by_file:
+      if not self._under(uri):
+        raise Ack(ACK_NO_EXIST, "No such directory")
+      self.queue.extend(track.rel_path for track in self._under(uri))
+    else:
+      self.queue.append(uri)
+    self.queue_version += 1
+    return []
+
+  def cmd_addid(self, uri, position=None):
+    self.cmd_add(uri)
+    return [("Id", str(len(self.queue)))]
+
+  def cmd_findadd(self, *args):
+    self.queue.extend(track.rel_path for track in self._match(list(args), exact=True))
+    return []
+
+  def cmd_searchadd(self, *args):
+    self.queue.extend(track.rel_path for track in self._match(list(args), exact=False))
+    return []
+
+  def cmd_clear(self):
+    self.queue = []
+    self.state, self.current = "stop", -1
+    self.queue_version += 1
+    return []
+
+  def cmd_delete(self, pos):
+    try:
+      del self.queue[int(pos)]
+    except (ValueError, IndexError):
+      raise Ack(ACK_ARG, "Bad song index")
+    return []
+
+  def cmd_playlistinfo(self, *args):
+    return [pair for pos, uri in enumerate(self.queue) for pair in self._song(uri, pos)]
+
+  def cmd_currentsong(self):
+    return self._song(self.queue[self.current], self.current) if 0 <= self.current < len(self.queue) else []
+
+  def cmd_play(self, pos=None):
+    if not self.queue:
+      return []
+    self.current = int(pos) if pos is not None else max(self.current, 0)
+    self.state = "play"
+    return []
+
+  def cmd_playid(self, song_id=None):
+    return self.cmd_play(None if song_id is None else int(song_id) - 1)
+
+  def cmd_stop(self):
+    self.state = "stop"
+    return []
+
+  def cmd_pause(self, paused=None):
+    if paused is None:
+      self.state = "play" if self.state == "pause" else "pause"
+    else:
+      self.state = "pause" if paused == "1" else "play"
+    return []
+
+  def cmd_next(self):
+    if self.queue:
+      self.current = (self.current + 1) % len(self.queue)
+    return []
+
+  def cmd_previous(self):
+    if self.queue:
+      self.current = max(self.current - 1, 0)
+    return []
+
+  def _mode(self, name: str, value: str):
+    if value not in ("0", "1"):
+      raise Ack(ACK_ARG, "Boolean (0/1) expected")
+    self.modes[name] = value
+    return []
+
+  def cmd_repeat(self, value):
+    return self._mode("repeat", value)
+
+  def cmd_random(self, value):
+    return self._mode("random", value)
+
+  def cmd_single(self, value):
+    return self._mode("single", value)
+
+  def cmd_consume(self, value):
+    return self._mode("consume", value)
+
+  def cmd_setvol(self, volume):
+    self.volume = int(volume)
+    return []
+
+  def cmd_status(self):
+    pairs = [("volume", str(self.volume))] + list(self.modes.items()) + [
+      ("playlist", str(self.queue_version)), ("playlistlength", str(len(self.queue))), ("state", self.state)]
+    if 0 <= self.current < len(self.queue):
+      pairs.extend([("song", str(self.current)), ("songid", str(self.current + 1))])
+    return pairs
+
+  def cmd_stats(self):
+    return [("artists", str(len({t.artist for t in self.tracks}))),
+            ("albums", str(len({(t.artist, t.album) for t in self.tracks}))), ("songs", str(len(self.tracks))),
+            ("uptime", "1"), ("db_playtime", str(sum(t.seconds for t in self.tracks))), ("db_update", "1700000000")]
+
+  # Stored playlists
+
+  def _playlist(self, name: str) -> List[str]:
+    if name not in self.playlists:
+      raise Ack(ACK_NO_EXIST, "No such playlist")
+    return self.playlists[name]
+
+  def cmd_listplaylists(self):
+    return [pair for name in self.playlists for pair in (("playlist", name),
+                                                         ("Last-Modified", "2024-01-01T00:00:00Z"))]
+
+  def cmd_listplaylist(self, name):
+    return [("file", uri) for uri in self._playlist(name)]
+
+  def cmd_listplaylistinfo(self, name):
+    return [pair for uri in self._playlist(name) for pair in self._song(uri, 0)[:-2]]
+
+  def cmd_load(self, name, *args):
+    self.queue.extend(self._playlist(name))
+    self.queue_version += 1
+    return []
+
+  def cmd_save(self, name, *args):
+    if name in self.playlists:
+      raise Ack(56, "Playlist already exists")
+    self.playlists[name] = list(self.queue)
+    self.notify("stored_playlist")
+    return []
+
+  def cmd_rm(self, name):
+    self._playlist(name)
+    del self.playlists[name]
+    self.notify("stored_playlist")
+    return []
+
+  def cmd_playlistadd(self, name, uri):
+    self.playlists.setdefault(name, []).append(uri)
+    return []
+
+  def cmd_playlistdelete(self, name, pos):
+    try:
+      del self._playlist(name)[int(pos)]
+    except (ValueError, IndexError):
+      raise Ack(ACK_ARG, "Bad song index")
+    return []
+
+  def cmd_playlistclear(self, name):
+    self.playlists[name] = []
+    return []
+
+  # Connection and database
+
+  def cmd_ping(self):
+    return []
+
+  def cmd_clearerror(self):
+    return []
+
+  def cmd_update(self, uri=None):
+    threading.Timer(0.01, self.notify, ("update", "database")).start()
+    return [("updating_db", "1")]
+
+  cmd_rescan = cmd_update
+
+  def cmd_tagtypes(self, *args):
+    return [("tagtype", tag.capitalize()) for tag in TAGS if tag != "file"]
+
+def main():
+  parser = argparse.ArgumentParser(description="Serve a synthetic library over the mpd protocol")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=6600)
+  parser.add_argument("--tracks", type=int, default=10000, help="size of the synthetic library")
+  parser.add_argument("--seed", type=int, default=1, help="seed of the synthetic library and the faults")
+  parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every round trip")
+  parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra latency up to this")
+  parser.add_argument("--failure-rate", type=float, default=0.0, help="share of round trips answered with ACK")
+  parser.add_argument("--drop-rate", type=float, default=0.0, help="share of round trips dropping the connection")
+  parser.add_argument("--fail", default="", help="comma separated commands that always fail")
+  args = parser.parse_args()
+  fake = FakeMpd(synthetic_tracks(args.tracks, args.seed), args.host, args.port, args.latency_ms / 1000,
+                 args.jitter_ms / 1000, args.failure_rate, args.drop_rate,
+                 [name for name in args.fail.split(",") if name], seed=args.seed)
+  fake.start()
+  print(f"fake mpd serving {len(fake.tracks)} tracks at {fake.address[0]}:{fake.address[1]}", file=sys.stderr)
+  try:
+    while True:
+      time.sleep(60)
+      print(f"fake mpd: {fake.stats()}", file=sys.stderr)
+  except KeyboardInterrupt:
+    fake.stop()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,120 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Deterministic synthetic music libraries for the benchmarks: the same seed and size always give the same
+# artists, albums, titles and files
+#
+import os
+import random
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+WORDS = ["love", "night", "blue", "fire", "river", "dream", "heart", "shadow", "summer", "rain", "golden",
+         "highway", "midnight", "electric", "silver", "ocean", "storm", "wild", "city", "paper", "glass", "echo",
+         "dancing", "broken", "morning", "velvet", "thunder", "lonely", "sweet", "northern", "crystal", "desert"]
+GENRES = ["rock", "pop", "jazz", "blues", "classical", "country", "electronic", "folk", "hip hop", "metal",
+          "reggae", "soul", "punk", "ambient", "latin"]
+TRACKS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 5
+
+@dataclass
+class SyntheticTrack:
+  artist: str
+  album: str
+  title: str
+  genre: str
+  track: int
+  seconds: int
+
+  @property
+  def rel_path(self) -> str:
+    """ <Artist>/<Album>/<NN> <Title>.mp3 - the layout MusicLibrary.song_from_file_path() expects """
+    return os.path.join(self.artist, self.album, f"{self.track:02d} {self.title}.mp3")
+
+  @property
+  def time_str(self) -> str:
+    minutes, seconds = divmod(self.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def _name(rng: random.Random, words: int, number: int) -> str:
+  """ A readable name, made unique by its number """
+  return " ".join(rng.choice(WORDS) for _ in range(words)).title() + f" {number}"
+
+def synthetic_tracks(count: int, seed: int=1) -> Iterator[SyntheticTrack]:
+  """ Generate count tracks: 10 per album, 5 albums per artist """
+  rng = random.Random(seed)
+  per_artist = TRACKS_PER_ALBUM * ALBUMS_PER_ARTIST
+  for artist_no in range((count + per_artist - 1) // per_artist):
+    artist = _name(rng, 2, artist_no)
+    genre = rng.choice(GENRES)
+    for album_no in range(ALBUMS_PER_ARTIST):
+      album = _name(rng, 3, album_no)
+      for track_no in range(1, TRACKS_PER_ALBUM + 1):
+        if count == 0:
+          return
+        count -= 1
+        yield SyntheticTrack(artist, album, _name(rng, rng.randint(1, 4), track_no), genre, track_no,
+                             rng.randint(90, 600))
+
+def mpd_pairs(track: SyntheticTrack) -> List[Tuple[str, str]]:
+  """ The key/value pairs mpd sends for the track in a listallinfo, search or playlistinfo response """
+  return [("file", track.rel_path), ("Last-Modified", "2024-01-01T00:00:00Z"), ("Artist", track.artist),
+          ("Album", track.album), ("Title", track.title), ("Genre", track.genre), ("Track", str(track.track)),
+          ("Time", str(track.seconds)), ("duration", f"{track.seconds}.000")]
+
+def _syncsafe(size: int) -> bytes:
+  return bytes(((size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f))
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+  return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def cover_image(track: SyntheticTrack, side: int=128) -> bytes:
+  """
+  A valid PNG of random pixels standing in for the cover of the track's album - the same bytes for every
+  track of the album, about 48KB for the default side
+  """
+  rng = random.Random(f"{track.artist}/{track.album}")
+  rows = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side)) # filter type 0, RGB
+  return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)) +
+          _png_chunk(b"IDAT", zlib.compress(rows)) + _png_chunk(b"IEND", b""))
+
+def id3_tagged_mp3(track: SyntheticTrack, frames: int=8, cover: bool=False) -> bytes:
+  """
+  A minimal MP3 file: an ID3v2.4 tag with title, artist, album, genre and track number - and a cover if
+  requested - followed by frames of silence, so tag parsers handle it like a real file
+  """
+  tag = b""
+  texts = [("TIT2", track.title), ("TPE1", track.artist), ("TALB", track.album), ("TCON", track.genre),
+           ("TRCK", str(track.track))]
+  for frame_id, text in texts:
+    data = b"\x03" + text.encode("utf-8")  # UTF-8 encoding
+    tag += frame_id.encode() + _syncsafe(len(data)) + b"\x00\x00" + data
+  if cover:                                # latin-1, MIME type, front cover, no description
+    data = b"\x00image/png\x00\x03\x00" + cover_image(track)
+    tag += b"APIC" + _syncsafe(len(data)) + b"\x00\x00" + data
+  header = b"ID3\x04\x00\x00" + _syncsafe(len(tag))
+  # MPEG-1 layer III, 128 kbit/s, 44.1 kHz, no padding - 417 bytes per frame
+  frame = struct.pack(">I", 0xFFFB9004) + bytes(413)
+  return header + tag + frame * frames
+
+def write_library(root: str, tracks: List[SyntheticTrack], tagged: bool=False, covers: bool=False) -> int:
+  """
+  Write the files of tracks under root - empty files unless tagged, with embedded covers if covers
+  Return: bytes written
+  """
+  written = 0
+  made = set()
+  for track in tracks:
+    path = os.path.join(root, track.rel_path)
+    folder = os.path.dirname(path)
+    if folder not in made:
+      os.makedirs(folder, exist_ok=True)
+      made.add(folder)
+    data = id3_tagged_mp3(track, cover=covers) if tagged else b""
+    with open(path, "wb") as f:
+      f.write(data)
+    written += len(data)
+  return written
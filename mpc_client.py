@@ -1,12 +1,21 @@
 #
 # This code is distributed under the Apache License, v2.0 
 #
-import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from enum import Enum
-import glob
 from ovos_utils.log import LOG
+from ovos_utils.xdg_utils import xdg_cache_home
 from music_info import Music_info
+from news_fetcher import NewsError, NewsFetcher
+from mpd_connection import MpdConnection, MpdError, MpdCommandError, MpdSong
+from mpd_catalog import FieldMatch, MpdCatalog
+from station_directory import DEFAULT_STATIONS_FILE, Station, StationDirectory
+from station_store import DEFAULT_STATIONS_DB, StationStore
+from stream_prober import StreamProber
+from stream_resolver import ResolveError, StreamUrlCache
+from tracing import TRACER, traced
+from ttl_cache import TTLCache
 import os 
 from ovos_utils.log import LOG
 from pathlib import Path
@@ -17,12 +26,21 @@ import requests
 import subprocess
 from subprocess import run, Popen, PIPE, STDOUT
 import sys
+import threading
 import time
-from typing import Union, Optional, List, Iterable
+from typing import Callable, Dict, Union, Optional, List, Iterable, Tuple
 import urllib.parse
 from youtube_search import YoutubeSearch
 sys.path.append(os.path.abspath("/home/neon/.local/share/neon/skills/skill-local_music-mike99mac"))
 from util import MusicLibrary, Track
+from util.search_index import normalize
+
+@dataclass
+class QueueResult:
+  """ Outcome of MpcClient.enqueue() """
+  queued: List[str]                        # URIs added to the queue
+  failed: List[Tuple[str, str]]            # (URI, mpd error message) of tracks mpd refused
+  playing: bool = False                    # play was part of the batch and succeeded
 
 class MpcClient():
   """ 
@@ -38,11 +56,28 @@ class MpcClient():
   station_ads: str    
   station_URL: str 
   request_type: str                        # "genre", "country", "language", "random" or "next_station"
-  list_lines: list                
+  stations: Union[StationStore, StationDirectory] # radio stations, indexed
+  prober: StreamProber                     # liveness of station streams
+  search_cache: TTLCache                   # YouTube search results by normalized phrase
+  stream_cache: Optional[StreamUrlCache]   # YouTube URL -> audio stream URL, None to queue with ytadd
+  news: NewsFetcher                        # current NPR news episode
   tracks: list         
+  mpd: MpdConnection                       # persistent connection to mpd
+  catalog: MpdCatalog                      # in-memory copy of the mpd database answering searches
+  pending_repeat: Optional[bool]           # repeat mode to set with the next enqueue()
+
+  # mpc sub-commands with an on/off argument that mpd expects as 1/0
+  toggle_cmds = ("repeat", "random", "single", "consume")
+  ytadd = "/usr/local/sbin/ytadd"          # resolves a YouTube URL and adds its audio stream to the mpd queue
+  ytadd_timeout = 60                       # seconds
+  max_internet_results = 5                 # YouTube results to queue - resolved concurrently
 
-  def __init__(self, music_dir: Path):
+  def __init__(self, music_dir: Path, mpd_host: Optional[str]=None, mpd_port: Optional[int]=None, timeout: float=5.0,
+               stations_file: str=DEFAULT_STATIONS_FILE, stations_db: str=DEFAULT_STATIONS_DB,
+               cache_dir: Optional[str]=None, resolver: Optional[Callable[[str], str]]=None):
     self.music_dir = music_dir
+    self.mpd = MpdConnection(mpd_host, mpd_port, timeout) # connects on first command
+    self.catalog = MpdCatalog(self.mpd)    # loaded on the first search
     self.max_queued = 20                               
     self.station_name = "unknown"                   
     self.station_genre = "unknown"
@@ -51,9 +86,20 @@ class MpcClient():
     self.station_ads = "unknown" 
     self.station_URL = "unknown"  
     self.request_type = "unknown"  
-    self.list_lines = []
-    # base_dir = str(os.getenv('SVA_BASE_DIR'))
-    # self.temp_dir = base_dir + "/logs"     # log dir should be a tmpfs so files self-delete at minimy restart
+    if os.path.exists(stations_db):        # an imported station directory
+      self.stations = StationStore(stations_db)
+    else:                                  # the hand-maintained CSV file
+      self.stations = StationDirectory(stations_file)
+    self.prober = StreamProber()
+    cache_dir = cache_dir or os.path.join(os.path.expanduser(xdg_cache_home()), "neon", "local_music")
+    self._ytadd_pool = ThreadPoolExecutor(max_workers=self.max_internet_results, thread_name_prefix="ytadd")
+    self._ytadd_procs = set()              # running ytadd processes of the current request
+    self._ytadd_request = 0                # incremented by every stream_internet_music() call
+    self._ytadd_lock = threading.Lock()
+    self.search_cache = TTLCache(os.path.join(cache_dir, "youtube_search.sqlite"), ttl=7 * 86400, max_entries=500)
+    self.stream_cache = StreamUrlCache(resolver) if resolver else None # ytadd by default
+    self.news = NewsFetcher(os.path.join(cache_dir, "news"))
+    self.pending_repeat = None
 
   def initialize(self, music_dir: Path):  
     """ 
@@ -66,33 +112,145 @@ class MpcClient():
     # except subprocess.CalledProcessError as e:      
     #   self.LOG.info(f"MpcClient.__init__():  mpc single off return code: {e.returncode}") 
 
+  def close(self):
+    """ Stop watching the mpd database and close the connection """
+    self.catalog.close()
+    self.prober.close()
+    self.search_cache.close()
+    self.news.close()
+    self._ytadd_pool.shutdown(wait=False, cancel_futures=True)
+    self.mpd.close()
+
+  def to_mpd_uri(self, path: Union[str, Track]) -> str:
+    """
+    Convert a (possibly double quoted) track path to a URI mpd accepts over any connection 
+    Files under music_dir become relative to the mpd music directory, URLs are unchanged
+    """
+    if isinstance(path, Track):
+      path = path.path
+    path = path.strip().strip('"')
+    for prefix in (self.music_dir, self.music_dir.replace("file://", "", 1)):
+      if prefix and path.startswith(prefix):
+        return path[len(prefix):]
+    if path.startswith("/"):               # local file outside the mpd music directory
+      return "file://" + path
+    return path
+
+  @traced("mpc.enqueue")
+  def enqueue(self, tracks: Iterable[Union[str, Track]], clear: bool=True, repeat: Optional[bool]=None,
+              random_mode: Optional[bool]=None, play: bool=True) -> QueueResult:
+    """
+    Queue tracks with one mpd command list: clear, add every track, set the modes and play
+    If mpd refuses a track, the ones before it are already queued, so the rest is sent again without it
+    Param: tracks      - Track objects, file paths or URLs
+           clear       - clear the queue first
+           repeat      - set repeat on/off, default is the mode chosen by the last search
+           random_mode - set random on/off, None leaves it unchanged
+           play        - start playing after the tracks are queued
+    Return: QueueResult with the queued and the failed URIs
+    """
+    head, pending, tail = self.queue_commands(tracks, clear, repeat, random_mode, play)
+    result = QueueResult([], [])
+    while head or pending or tail:
+      try:
+        self.mpd.command_list(head + [("add", uri) for uri in pending] + tail)
+        error = None
+      except MpdError as e:
+        error = e
+      pending = self.queue_outcome(result, head, pending, play, error)
+      if pending == None:
+        break
+      head = []                            # the queue was already cleared
+    LOG.info(f"MpcClient.enqueue() queued: {len(result.queued)} failed: {len(result.failed)} playing: {result.playing}")
+    return result
+
+  def queue_commands(self, tracks: Iterable[Union[str, Track]], clear: bool, repeat: Optional[bool],
+                     random_mode: Optional[bool], play: bool) -> Tuple[List[Tuple], List[str], List[Tuple]]:
+    """ Return: the commands before the tracks, the URIs of the tracks and the commands after them """
+    if repeat == None:
+      repeat, self.pending_repeat = self.pending_repeat, None
+    uris = [self.to_mpd_uri(track) for track in tracks or []]
+    head = [("clear",)] if clear else []
+    tail = []
+    if repeat != None:
+      tail.append(("repeat", int(repeat)))
+    if random_mode != None:
+      tail.append(("random", int(random_mode)))
+    if play:
+      tail.append(("play",))
+    return head, uris, tail
+
+  def queue_outcome(self, result: QueueResult, head: List[Tuple], pending: List[str], play: bool,
+                    error: Optional[MpdError]) -> Optional[List[str]]:
+    """
+    Record the outcome of one queueing command list in result
+    Param: head, pending - the commands before the tracks and the URIs of the tracks that were sent
+           error         - raised by the command list, None if it succeeded
+    Return: the URIs after a track mpd refused, to be sent again without it - None when done
+    """
+    if error == None:
+      result.queued.extend(pending)
+      result.playing = play
+      return None
+    if not isinstance(error, MpdCommandError):
+      LOG.error(f"MpcClient.enqueue() mpd not available: {error}")
+      result.failed.extend((uri, str(error)) for uri in pending)
+      return None
+    pos = error.index - len(head)
+    if pos < 0 or pos >= len(pending):     # clear or a mode command failed - not a track
+      LOG.error(f"MpcClient.enqueue() command {error.command} failed: {error.message}")
+      result.queued.extend(pending[:max(pos, 0)])
+      return None
+    LOG.error(f"MpcClient.enqueue() mpd refused {pending[pos]}: {error.message}")
+    result.queued.extend(pending[:pos])    # these were added before the failure
+    result.failed.append((pending[pos], error.message))
+    return pending[pos + 1:]
+
+  @traced("mpc.command")
   def mpc_cmd(self, arg1, arg2=None):
     """
-    Run any mpc command that takes one or two arguments
-    Param: arg 1 - such as "clear" or "play"
+    Run any mpc command that takes one or two arguments over the mpd connection
+    Param: arg 1 - such as "clear" or "play" - may also include its argument as in "add <url>"
            arg 2 - args to commands such as "add" or "load"
-    Return: mpc return code
+    Return: 0 on success, 1 on failure as with the mpc return code
     """
-    cmd = "/usr/bin/mpc "+arg1
+    name, _, arg = arg1.strip().partition(" ")
     if arg2 != None:
-      cmd = cmd+" "+arg2
+      arg = arg2
+    match name:
+      case "add":
+        arg = self.to_mpd_uri(arg)
+      case "prev":
+        name = "previous"
+      case "toggle":
+        name = "pause"
+      case _ if name in self.toggle_cmds:
+        arg = "1" if arg == "on" else "0" if arg == "off" else arg
+    arg = str(arg).strip().strip('"')      # args were double quoted for the shell
     try:
-      LOG.info(f"SimpleVoiceAssistant.mpc_cmd(): running command: {cmd}")
-      result = subprocess.check_output(cmd, shell=True)
-      return 0                         # success
-    except subprocess.CalledProcessError as e:
-      LOG.error(f"SimpleVoiceAssistant.mpc_cmd(): cmd: {cmd} returned e.returncode: {e.returncode}")
-      return e.returncode
+      LOG.info(f"MpcClient.mpc_cmd(): running command: {name} {arg}")
+      self.mpd.command(name, arg if arg else None)
+      return 0                             # success
+    except MpdError as e:
+      LOG.error(f"MpcClient.mpc_cmd(): cmd: {name} {arg} failed: {e}")
+      return 1
 
   def mpc_update(self, wait: bool=True):
     """ 
     Update the mpd database by searching for music files 
+    Return: 0 on success, 1 on failure as with the mpc return code
     """
-    cmd = "/usr/bin/mpc update"
+    LOG.info(f"MpcClient.mpc_update() updating the mpd database wait: {wait}")
+    try:
+      self.mpd.command("update")
+      while wait and "updating_db" in self.mpd.command_dict("status"):
+        time.sleep(.5)                     # mpd reports the job until the update finishes
+    except MpdError as e:
+      LOG.error(f"MpcClient.mpc_update(): update failed: {e}")
+      return 1
     if wait:
-      cmd.append("--wait")
-    LOG.info(f"mpc_update() running command: {cmd}")
-    subprocess.check_call(cmd)
+      self.catalog.invalidate()            # do not wait for the idle notification
+    return 0
   
   def mpc_play(self):
     """ 
@@ -103,6 +261,7 @@ class MpcClient():
     time.sleep(.1)                         # is this really needed?
     self.mpc_cmd("play")
 
+  @traced("mpc.start_music")
   def start_music(self, music_info: Music_info):
     """ 
     Start playing the type of music passed in the music_info object   
@@ -123,6 +282,7 @@ class MpcClient():
       self.mpc_play()
       return True
 
+  @traced("mpc.search_music")
   def search_music(self, command: str, type1: Optional[str]=None, name1: Optional[str]=None, type2: Optional[str]=None, name2: Optional[str]=None) -> List[List[str]]:
     """
     search for music by album, artist, title, or genre allowing up to two qualifiers.
@@ -139,17 +299,44 @@ class MpcClient():
     track: int = 0
     """
     LOG.info(f"MpcClient.search_music(): command: {command} type1: {type1} name1: {name1}, type2: {type2} name2: {name2}")
-    cmd = ["mpc", command, "--format", "%artist%\t%album%\t%title%\t%time%\t%file%\t%genre%"]
+    command, args = self.search_args(command, type1, name1, type2, name2)
+    try:
+      songs = self.catalog.query(command, *args)
+      if songs == None:                    # not answered by the catalog - ask mpd
+        songs = self.mpd.songs(command, *args)
+    except MpdError as e:
+      LOG.error(f"MpcClient.search_music(): {command} {args} failed: {e}")
+      return []
+    return [song.to_fields() for song in songs]
+
+  def search_args(self, command: str, type1: Optional[str]=None, name1: Optional[str]=None,
+                  type2: Optional[str]=None, name2: Optional[str]=None) -> Tuple[str, List[str]]:
+    """ Return: the mpd command and its arguments for a search_music() call """
+    args = []
     if type1 and name1 != None:            # there is a search qualifier
-      cmd.extend([type1, name1])
+      args.extend([type1, name1])
     if type2 and name2 != None:            # there is a second search qualifier
-      cmd.extend([type2, name2])
-    LOG.info(f"MpcClient.search_music(): cmd: {cmd}")  
-    return [
-      line.split("\t")
-      for line in subprocess.check_output(cmd, universal_newlines=True).splitlines()
-      if line.strip()
-    ]
+      args.extend([type2, name2])
+    if command == "listall":               # mpc listall --format needs the tags of every song
+      command = "listallinfo"
+    return command, args
+
+  @traced("mpc.search_fields")
+  def search_fields(self, phrase: str, tags: Iterable[str]) -> Dict[str, FieldMatch]:
+    """
+    Search several tags for a phrase in one pass over the catalog
+    Return: a FieldMatch with all and exact hits per tag, empty if mpd is not available
+    """
+    LOG.info(f"MpcClient.search_fields(): phrase: {phrase} tags: {tags}")
+    try:
+      return self.catalog.search_fields(phrase, tags)
+    except MpdError as e:
+      LOG.error(f"MpcClient.search_fields(): {phrase} failed: {e}")
+      return {}
+
+  def song_to_track(self, song: MpdSong) -> Track:
+    """ Convert a catalog song to a Track with the double quoted path used for queueing """
+    return Track('"'+self.music_dir+song.file+'"', song.title, song.album, song.artist, song.genre, None, song.time_str)
 
   def time_to_seconds(self, time_str: str) -> int:
     """ convert HR:MIN:SEC to number of seconds """
@@ -165,6 +352,7 @@ class MpcClient():
       seconds = int(parts[0])
     return (hours * 60 * 60) + (minutes * 60) + seconds
   
+  @traced("mpc.search_library")
   def search_library(self, phrase):
     """
     Perform "brute force" parsing of a music play request
@@ -300,7 +488,7 @@ class MpcClient():
       LOG.info(f"MpcClient.get_album() found album: {album_name} by artist: {artist_found}")    
       mesg_file = "playing_album"
       mesg_info = {"album_name": album_found, "artist_name": artist_found}
-    self.mpc_cmd("repeat", "off")             # do not keep playing album after last track
+    self.pending_repeat = False            # do not keep playing album after last track
     return Music_info("album", mesg_file, mesg_info, tracks)
 
   def get_artist(self, artist_name):
@@ -332,7 +520,7 @@ class MpcClient():
       LOG.info(f"MpcClient.get_artist() _get() did not find an artist matching {artist_name}")
       return Music_info("none", "artist_not_found", mesg_info, [])
     else:
-      self.mpc_cmd("repeat", "on")         # keep playing artist after last track
+      self.pending_repeat = True           # keep playing artist after last track
       return Music_info("artist", "playing_artist", mesg_info, tracks)
  
   def get_music_info(self, match_type, mesg_file, mesg_info, results): 
@@ -362,7 +550,7 @@ class MpcClient():
     num_hits = len(results)
     LOG.info(f"MpcClient.get_all_music() num_hits: {num_hits}")
     mesg_info = {"num_hits": num_hits}
-    self.mpc_cmd("repeat", "on")           # keep playing random tracks 
+    self.pending_repeat = True             # keep playing random tracks 
     return self.get_music_info("random", "playing_random", mesg_info, results)
     
   def get_genre(self, genre_name):
@@ -377,7 +565,7 @@ class MpcClient():
     random.shuffle(results)                # shuffle tracks found
     results = results[0:self.max_queued]   # prune to max number of tracks
     mesg_info = {"genre_name": genre_name}
-    self.mpc_cmd("repeat", "on")              # keep playing genre
+    self.pending_repeat = True             # keep playing genre
     return self.get_music_info("song", "playing_genre", mesg_info, results)
     
   def get_track(self, track_name, artist_name):
@@ -408,17 +596,17 @@ class MpcClient():
     tracks = []                 
     for artist_found, album_found, track_found, time_str, relative_path, genre in results:
       next_path = '"'+self.music_dir + relative_path+'"'
-      tracks.append(Track(next_path, title, album_found, artist_found, genre, None, time_str))
+      tracks.append(Track(next_path, track_found, album_found, artist_found, genre, None, time_str))
       if track_found.lower() == track_name: # track name matches
         if artist_name != "unknown_artist" and artist_found.lower() == artist_name: # exact match
           # LOG.info(f"MpcClient.get_track() exact match at index: {index}") 
           mesg_file = "playing_track"
           mesg_info = {'track_name': track_name, 'artist_name': artist_found, 'album_name': album_found}
-          return Music_info("track", mesg_file, mesg_info, trackss) # all done
+          return Music_info("track", mesg_file, mesg_info, tracks) # all done
         num_hits += 1
     LOG.info(f"MpcClient.get_track(): num_hits: {num_hits}")    
     if num_hits == 1:                      # one track found
-      self.mpc_cmd("repeat", "off")        # play just once      
+      self.pending_repeat = False          # play just once      
       if artist_name != "unknown_artist" and artist_name != artist_found: # wrong artist _ speak correct artist before playing 
         LOG.info(f"MpcClient.get_track() found track {track_name} by {artist_found} not by {artist_name}")
         mesg_file = "diff_artist"
@@ -427,7 +615,7 @@ class MpcClient():
         mesg_file = "playing_track"
         mesg_info = {'track_name': track_name, 'artist_name': artist_found, 'album_name': album_found}
     else:                                  # multiple hits
-      self.mpc_cmd("repeat", "on")         # allow loop
+      self.pending_repeat = True           # allow loop
       mesg_file = "found_tracks"
       mesg_info = {'track_name': track_name, 'num_hits': num_hits}
     return Music_info("song", mesg_file, mesg_info, tracks) 
@@ -435,45 +623,34 @@ class MpcClient():
   def get_unknown_music(self, music_name, artist_name):
     """
     Search on a music search term - could be album, artist or track
+    All three are matched in one search, then an exact artist wins over an album and an album over a title
     """
     LOG.info(f"MpcClient.get_unknown_music() music_name: {music_name} artist_name: {artist_name}")
-    tracks = []                            # list of tracks to play
-    for music_type in ["artist", "album", "title"]:
-      results = self.search_music("search", music_type, music_name)    
-      num_recs = len(results)
-      if num_recs == 0:                  # no hit
-        continue                         # iterate loop
-      LOG.info(f"MpcClient.get_unknown_music() found {num_recs} hits with music_type: {music_type}")  
-      match music_type:
-        case "artist":                   
-          for artist, album, title, time_str, relative_path, genre in results:
-            if artist.lower() == music_name: # exact match
-              tracks.append(Track(next_path, title, album_found, artist_found, genre, None, time_str))
-          num_exact = len(tracks)
-          if num_exact == 0:
-            continue                     # iterate loop
-          else:      
-            mesg_info = {"artist_name": artist}
-            music_info = Music_info("artist", "playing_artist", mesg_info, tracks)
-        case "album":                    # queue multiple tracks
-          for artist, album, title, time_str, relative_path, genre in results:
-            tracks.append(Track(next_path, title, album_found, artist_found, genre, None, time_str))
-          mesg_info = {"album_name": album, "artist_name": artist}
-          music_info = Music_info("album", "playing_album", mesg_info, tracks)
-        case "title":                    # queue one track
-          index = random.randrange(num_recs) # choose a random track 
-          LOG.info(f"MpcClient.get_unknown_music() random track index: {index}")
-          next_track = '"'+self.music_dir + results[index][4]+'"' 
-          LOG.info(f"MpcClient.get_unknown_music() tracks: {tracks}")
-          mesg_info = {"track_name": results[index][2], "album_name": results[index][1], "artist_name": results[index][0]}
-          music_info = Music_info("song", "playing_track", mesg_info, tracks)
-      return music_info   
+    matches = self.search_fields(music_name, ("artist", "album", "title"))
+    artist = matches.get("artist")
+    album = matches.get("album")
+    title = matches.get("title")
+    if artist and artist.exact:            # queue the artist's tracks
+      LOG.info(f"MpcClient.get_unknown_music() found {len(artist.exact)} tracks by artist {music_name}")
+      tracks = [self.song_to_track(song) for song in artist.exact]
+      mesg_info = {"artist_name": artist.exact[0].artist}
+      return Music_info("artist", "playing_artist", mesg_info, tracks)
+    if album and album.songs:              # queue multiple tracks
+      LOG.info(f"MpcClient.get_unknown_music() found {len(album.songs)} tracks on album {music_name}")
+      tracks = [self.song_to_track(song) for song in album.songs]
+      mesg_info = {"album_name": album.songs[-1].album, "artist_name": album.songs[-1].artist}
+      return Music_info("album", "playing_album", mesg_info, tracks)
+    if title and title.songs:              # queue one track - an exact title if there is one
+      song = random.choice(title.exact or title.songs)
+      LOG.info(f"MpcClient.get_unknown_music() random track: {song.file}")
+      mesg_info = {"track_name": song.title, "album_name": song.album, "artist_name": song.artist}
+      return Music_info("song", "playing_track", mesg_info, [self.song_to_track(song)])
 
     # if we fall through, no music was found 
     LOG.info(f"MpcClient.get_unknown_music(): did not find music matching {music_name}") 
     return Music_info("none", "music_not_found", {"music_name": music_name}, None)
     
-  def get_music(self, intent, music_name, artist_name):
+  def get_music(self, intent, music_name, artist_name, fuzzy=True):
     """
     Search for tracks with one search terms and an optional artist name
     intent can be: album, album_artist, artist, music, track, track_artist, unknown_artist or unknown
@@ -485,6 +662,8 @@ class MpcClient():
       get_playlist()      play a saved playlist
       get_track()         play a specific track
       get_unknown_music() play something that might be an album, an artist or a track 
+    If nothing is found, names that may have been misheard are replaced by the closest names in the catalog
+    and the search is run once more
     Return: Music_info object  
     """
     LOG.info(f"MpcClient.get_music() intent: {intent} music_name: {music_name} artist_name: {artist_name}") 
@@ -512,8 +691,42 @@ class MpcClient():
       case _:                            # unexpected
         LOG.info(f"MpcClient.get_music() INTERNAL ERROR: intent is not supposed to be: {intent}")
         music_info = Music_info("none", None, None, None)      
+    if music_info.match_type == "none" and fuzzy:
+      match intent:
+        case "album" | "album_artist":
+          music_tags = ("album",)
+        case "track" | "track_artist":
+          music_tags = ("title",)
+        case "unknown" | "unknown_artist":
+          music_tags = self.catalog.fuzzy_tags
+        case _:
+          music_tags = ()
+      new_music = self.correct_name(music_name, music_tags) if music_tags else None
+      new_artist = None
+      if artist_name != "unknown_artist" and intent in ("album_artist", "artist", "track_artist", "unknown_artist"):
+        new_artist = self.correct_name(artist_name, ("artist",))
+      if new_music or new_artist:
+        LOG.info(f"MpcClient.get_music() nothing found - retrying with music_name: {new_music} artist_name: {new_artist}")
+        retry = self.get_music(intent, new_music or music_name, new_artist or artist_name, fuzzy=False)
+        if retry.match_type != "none":
+          return retry
     return music_info
 
+  def correct_name(self, name: str, tags: Iterable[str]) -> Optional[str]:
+    """
+    Return the catalog name closest to a possibly misheard name, or None if there is no better one
+    """
+    try:
+      matches = self.catalog.fuzzy_lookup(name, tags, limit=1)
+    except MpdError as e:
+      LOG.error(f"MpcClient.correct_name(): {name} failed: {e}")
+      return None
+    if not matches or matches[0].name == name.casefold():
+      return None
+    LOG.info(f"MpcClient.correct_name(): {name} might be {matches[0].tag} {matches[0].name} score: {matches[0].score}")
+    return matches[0].name
+
+  @traced("mpc.manipulate_playlists")
   def manipulate_playlists(self, utterance):
     """
     List, create, add to, remove from and delete playlists
@@ -554,6 +767,7 @@ class MpcClient():
     LOG.info(f"MpcClient.manipulate_playlists() returned mesg_file: {mesg_file} and mesg_info: {mesg_info}")
     return Music_info("playlist_op", mesg_file, mesg_info, [])
 
+  @traced("mpc.get_playlist")
   def get_playlist(self, playlist_name):
     """
     Load file names of tracks in playlist and return a Music_info object
@@ -568,34 +782,34 @@ class MpcClient():
     # clear the queue then load the playlist
     self.mpc_cmd("clear")
     LOG.info(f"MpcClient.get_playlist(): playlist_name: {playlist_name}")
-    cmd = f"/usr/bin/mpc load {playlist_name}"
     try:
-      p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE, close_fds=True)
-      stdout, stderr = p.communicate()
-    except subprocess.CalledProcessError as e:          
-      LOG.error(f"MpcClient.get_playlist(): e.returncode: {e.returncode}")
+      self.mpd.command("load", playlist_name)
+    except MpdError as e:          
+      LOG.error(f"MpcClient.get_playlist(): load {playlist_name} failed: {e}")
       mesg_info = {"playlist_name": playlist_name}
       mesg_file = "playlists_not_found" 
       return Music_info("none", mesg_file, mesg_info, tracks) 
          
     # get file names not track names of playlist
-    cmd = f'mpc -f "%file%" playlist' 
     try:
-      p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE, close_fds=True)
-      stdout, stderr = p.communicate()
-      track_files = str(stdout.decode('utf-8'))
+      track_files = [song.file for song in self.mpd.songs("playlistinfo")]
       LOG.info(f"MpcClient.get_playlist(): track_files = {track_files}")
-    except subprocess.CalledProcessError as e: # not expected        
-      LOG.error(f"MpcClient.get_playlist(): cmd: {cmd.split(' ', 1)[1]} e.returncode: {e.returncode}")
-      mesg_info = {"cmd": "playlist", "rc": e.returncode}
+    except MpdError as e:                  # not expected        
+      LOG.error(f"MpcClient.get_playlist(): cmd: playlist failed: {e}")
+      mesg_info = {"cmd": "playlist", "rc": 1}
       mesg_file = "mpc_failed"
       return Music_info("none", mesg_file, mesg_info, tracks)   
+    return self.playlist_music_info(playlist_name, track_files)
+
+  def playlist_music_info(self, playlist_name: str, track_files: List[str]) -> Music_info:
+    """ Return: Music_info object with the tracks of a loaded playlist """
+    tracks = []
     if len(track_files) == 0:              # empty playlist
       mesg_info = {"playlist_name": playlist_name}
       mesg_file = "empty_playlist" 
       return Music_info("empty_playlist", mesg_file, mesg_info, tracks)  
     else:                                  # track(s) found  
-      for next_track in track_files.splitlines(): # add track files to list
+      for next_track in track_files:       # add track files to list
         LOG.info(f"MpcClient.get_playlist(): adding file {next_track}")
         tracks.append(next_track)
       mesg_file = "playing_playlist"
@@ -619,14 +833,13 @@ class MpcClient():
       return "playlist_exists", mesg_info
         
     # create the playlist
-    cmd = f"/usr/bin/mpc save {playlist_name}" 
-    LOG.info(f"MpcClient.create_playlist(): calling cmd: {cmd}")
+    LOG.info(f"MpcClient.create_playlist(): saving playlist: {playlist_name}")
     try:
-      result = subprocess.check_output(cmd, shell=True) 
-    except subprocess.CalledProcessError as e:     
-      LOG.error(f"MpcClient.create_playlist(): mpc return code: {e.returncode}")     
+      self.mpd.command("save", playlist_name)
+    except MpdError as e:     
+      LOG.error(f"MpcClient.create_playlist(): save failed: {e}")     
       mesg_file = "mpc_failed"
-      mesg_info = {'cmd': "save", 'rc': e.returncode}
+      mesg_info = {'cmd': "save", 'rc': 1}
       return mesg_file, mesg_info
     mesg_info = {"playlist_name": phrase}
     mesg_file = "created_playlist"
@@ -640,13 +853,11 @@ class MpcClient():
     """
     LOG.info(f"MpcClient.delete_playlist() called with playlist_name: {playlist_name}")
     playlist_name = playlist_name.rstrip(' ').replace(' ', '_').replace("'", "") # replace spaces with underscores
-    cmd = f"/usr/bin/mpc rm {playlist_name}"      # delete the playlist
-    LOG.info(f"MpcClient.delete_playlist(): calling cmd: {cmd}")
+    LOG.info(f"MpcClient.delete_playlist(): removing playlist: {playlist_name}")
     try:
-      p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE, close_fds=True)
-      stdout, stderr = p.communicate()
-    except subprocess.CalledProcessError as e:          
-      LOG.error(f"MpcClient.delete_playlist(): unexpected: e.returncode: {e.returncode}")
+      self.mpd.command("rm", playlist_name) # delete the playlist
+    except MpdError as e:          
+      LOG.error(f"MpcClient.delete_playlist(): unexpected: {e}")
     mesg_info = {"playlist_name": playlist_name}  
     self.mpc_cmd("clear")                  # clear playlist in memory
     return "deleted_playlist", mesg_info
@@ -691,34 +902,22 @@ class MpcClient():
     LOG.info(f"MpcClient.add_to_playlist() new_music_info.tracks {new_music_info.tracks}")
     # TODO: should check for duplicates here because mpc will add them
     # However, files found are fully qaulified, with those in mpc are relative to the mount point (usually /media)
-    for next_file in new_music_info.tracks:
-      LOG.info(f"MpcClient.add_to_playlist() next_file: {next_file}")
-      if self.mpc_cmd("add", next_file) != 0:
-        LOG.error(f"MpcClient.add_to_playlist() unexpected: 'mpc add {next_file}' failed")
-        mesg_file = "mpc_failed"
-        mesg_info = {"cmd": "add", "rc": 1}
-        return mesg_file, mesg_info   
-    
-    # to save a playlist, it first must be deleted - go figure
-    cmd = f"/usr/bin/mpc rm {playlist_name}" 
-    LOG.info(f"MpcClient.add_to_playlist(): calling cmd: {cmd}")
-    try:
-      result = subprocess.check_output(cmd, shell=True) 
-    except subprocess.CalledProcessError as e: 
-      LOG.error(f"MpcClient.add_to_playlist(): cmd: {cmd} e.returncode: {e.returncode}")
+    result = self.enqueue(new_music_info.tracks, clear=False, play=False) # append to the loaded playlist
+    if result.failed:
+      LOG.error(f"MpcClient.add_to_playlist() unexpected: mpd refused {result.failed}")
       mesg_file = "mpc_failed"
-      mesg_info = {"cmd": "remove", "rc": e.returncode}
+      mesg_info = {"cmd": "add", "rc": 1}
       return mesg_file, mesg_info   
-
-    # now save it  
-    cmd = f"/usr/bin/mpc save {playlist_name}"  
-    LOG.info(f"MpcClient.add_to_playlist(): calling cmd: {cmd}")
+    
+    # to save a playlist, it first must be deleted - go figure - both in one round trip
+    LOG.info(f"MpcClient.add_to_playlist(): replacing playlist: {playlist_name}")
     try:
-      result = subprocess.check_output(cmd, shell=True) 
-    except subprocess.CalledProcessError as e: 
-      LOG.error(f"MpcClient.add_to_playlist(): cmd: {cmd} e.returncode: {e.returncode}")
+      self.mpd.command_list([("rm", playlist_name), ("save", playlist_name)])
+    except MpdError as e: 
+      LOG.error(f"MpcClient.add_to_playlist(): replacing {playlist_name} failed: {e}")
       mesg_file = "mpc_failed"
-      mesg_info = {"cmd": "save", "rc": e.returncode}
+      failed_cmd = "save" if isinstance(e, MpdCommandError) and e.index == 1 else "remove"
+      mesg_info = {"cmd": failed_cmd, "rc": 1}
       return mesg_file, mesg_info   
     mesg_file = "added_to_playlist"  
     mesg_info = {'music_name': music_name, 'playlist_name': playlist_name}
@@ -761,26 +960,27 @@ class MpcClient():
     # TODO: finish code
     return "ok_its_done", {}
 
+  @traced("mpc.list_playlists")
   def list_playlists(self):
     """
     Speak all saved playlists
     Return: Music_info object  
     """
+    names = []
+    try:
+      names = self.mpd.values("listplaylists", "playlist")
+      LOG.info(f"MpcClient.list_playlists(): playlists: {names}")
+    except MpdError as e:          
+      LOG.error(f"MpcClient.list_playlists(): listplaylists failed: {e}")
+    return self.playlists_message(names)
+
+  def playlists_message(self, names: List[str]):
+    """ Return: the message file and info speaking the names of the playlists """
     mesg_file = ""
     mesg_info = {}
-    cmd = "/usr/bin/mpc lsplaylists"
-    LOG.info(f"MpcClient.list_playlists(): cmd: {cmd}")
-    rc = 0
-    try:
-      p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE, close_fds=True)
-      stdout, stderr = p.communicate()
-      playlists = str(stdout.decode('utf-8')).replace("\n", " ").strip()
-      rc = p.returncode 
-      LOG.info(f"MpcClient.list_playlists(): playlists: {playlists} rc: {rc}")
-    except subprocess.CalledProcessError as e:          
-      LOG.error(f"MpcClient.list_playlists(): e.returncode: {e.returncode}")
+    playlists = " ".join(names)
     if len(playlists) == 0:                # no playlists found
-      LOG.info(f"MpcClient.list_playlists(): cmd: {cmd}")
+      LOG.info(f"MpcClient.list_playlists(): no playlists found")
       mesg_info = {}
       mesg_file = "playlists_not_found"
     else:                                  # found - add "and" before the last playlist name
@@ -794,40 +994,43 @@ class MpcClient():
       mesg_info = {"playlists": playlists}  
     return mesg_file, mesg_info 
 
-  def get_matching_stations(self, field_index, search_name):
+  def get_matching_stations(self, field, search_name):
     """
-    Search for radio stations by genre, country, or language
-    param: field_index: field number to search on 
+    Search for radio stations by name, genre, country, or language
+    param: field: "name", "genre", "country" or "language"
            search_name: station, genre, language or country to search for
-    Sample line from radio.stations.csv:
-      "radio paradise", "pop|top 40", "the united states", "english", "no ads", "http://stream.radioparadise.com/flac"
-    Return: list of URLs of station or None when not found   
+    Return: up to max_queued URLs of matching stations in random order or None when not found   
     """
-    LOG.info(f"MpcClient.get_matching_stations() field_index: {field_index} search_name: {search_name}")
-    station_urls = []                      # reset list of station indexes that match
-    num_hits = 0
-    index = 0
-    for next_line in self.list_lines:
-      if search_name in next_line[field_index].strip():
-        station_urls.append(next_line[5])  # append URL to list
-        LOG.info(f"MpcClient.get_matching_stations() matching URL: {next_line[5]}") 
-        num_hits += 1
-        if num_hits == 1:                  # first station is what will be playing
-          self.station_name = next_line[0].strip()
-          self.station_genre = next_line[1].strip()
-          self.station_country = next_line[2].strip()
-          self.station_language = next_line[3].strip()
-          self.station_ads = next_line[4].strip()
-          self.station_url = next_line[5].strip()
-        elif num_hits == self.max_queued:  # that's enough URLs
-          LOG.info(f"MpcClient.get_matching_stations() reached max_queued: {max_queued}")  
-          break
-      index += 1  
-    if num_hits == 0:                      # music not found
-      LOG.info(f"MpcClient.get_matching_stations() did not find {self.request_type} {search_name} in field number {field_index}") 
+    LOG.info(f"MpcClient.get_matching_stations() field: {field} search_name: {search_name}")
+    stations = self.pick_stations(field, search_name)
+    if not stations:                       # music not found
+      LOG.info(f"MpcClient.get_matching_stations() did not find {self.request_type} {search_name} in field {field}") 
       return None
-    random.shuffle(station_urls)           # shuffle URLs
-    return station_urls                    # list of matching station URLs
+    self.set_station(stations[0])          # first station is what will be playing
+    return [station.url for station in stations] # list of matching station URLs
+
+  def pick_stations(self, field: Optional[str]=None, search_name: Optional[str]=None) -> List[Station]:
+    """
+    Pick up to max_queued random stations, all or those matching search_name in field
+    A larger pool is drawn so that streams known to be alive - fastest first - can be preferred and
+    streams known to be dead left out. Streams of the pool not probed recently are probed in the background
+    """
+    pool = self.stations.sample(self.max_queued * 3, field, search_name)
+    by_url = {station.url: station for station in pool}
+    urls = self.prober.rank(by_url)
+    self.prober.probe_in_background(urls)
+    playable = [url for url in urls if (result := self.prober.get(url)) is None or result.alive]
+    LOG.info(f"MpcClient.pick_stations() pool: {len(pool)} not known to be dead: {len(playable)}")
+    return [by_url[url] for url in (playable or urls)[:self.max_queued]]
+
+  def set_station(self, station: Station):
+    """ Remember the station that is playing """
+    self.station_name = station.name
+    self.station_genre = station.genre
+    self.station_country = station.country
+    self.station_language = station.language
+    self.station_ads = station.ads
+    self.station_URL = station.url
 
   def get_stations(self, search_name):
     """
@@ -839,27 +1042,22 @@ class MpcClient():
     mesg_info = {}
     tracks = []
 
-    # check that the radio station file exists
-    if not os.path.exists("/home/pi/minimy/skills/user_skills/mpc/radio.stations.csv"):
-      LOG.info("MpcClient.get_stations() file /home/pi/minimy/skills/user_skills/mpc/radio.stations.csv not found")
-      return Music_info("none", "file_not_found", {"file": "radio.stations.csv"}, None) 
-
-    input_file = open("/home/pi/minimy/skills/user_skills/mpc/radio.stations.csv", "r+")
-    reader_file = csv.reader(input_file)
-    self.list_lines = list(reader_file)    # convert to list
-    num_lines = len(self.list_lines)       # number of saved radio stations
-    LOG.info(f"MpcClient.get_stations() num_lines: {num_lines}")
+    # check that the radio station file exists - it is read again only if it changed
+    if not self.stations.load():
+      LOG.info(f"MpcClient.get_stations() file {self.stations.path} not found")
+      return Music_info("none", "file_not_found", {"file": os.path.basename(self.stations.path)}, None) 
+    LOG.info(f"MpcClient.get_stations() num_stations: {len(self.stations)}")
     match self.request_type:
       case "random":
-      #  if num_lines <= self.max_queued:   # all stations can be queued 
-        indices = random.sample(range(1, num_lines), self.max_queued)
-        for next_index in indices:
-          tracks.append(self.list_lines[next_index])
+        stations = self.pick_stations()
+        tracks = [station.url for station in stations]
+        if stations:
+          self.set_station(stations[0])
         mesg_file = "playing_radio"  
         mesg_info = {"station_name": self.station_name, "station_genre": self.station_genre.replace("|", " or " )}
       case "genre":
         LOG.info(f"MpcClient.get_stations() searching for station by genre: {search_name}") 
-        tracks = self.get_matching_stations(1, search_name)
+        tracks = self.get_matching_stations("genre", search_name)
         if tracks == None:         # station not found
           LOG.info(f"MpcClient.get_stations() did not find genre: {search_name}") 
           mesg_file = "radio_not_found"
@@ -869,7 +1067,7 @@ class MpcClient():
           mesg_info = {"genre_name": search_name} 
       case "country":
         LOG.info(f"MpcClient.get_stations() searching for station from country {search_name}") 
-        tracks = self.get_matching_stations(2, search_name)
+        tracks = self.get_matching_stations("country", search_name)
         if tracks == None:         # country not found
           LOG.info(f"MpcClient.get_stations() did not find country: {search_name}") 
           mesg_file = "country_not_found"
@@ -879,7 +1077,7 @@ class MpcClient():
           mesg_info = {"station_name": self.station_name, "country": search_name}
       case "language":
         LOG.info(f"MpcClient.get_stations() searching for station in language: {search_name}") 
-        tracks = self.get_matching_stations(3, search_name)
+        tracks = self.get_matching_stations("language", search_name)
         if tracks == None:         # language not found
           LOG.info(f"MpcClient.get_stations() did not find language: {search_name}") 
           mesg_file = "language_not_found"
@@ -889,7 +1087,7 @@ class MpcClient():
           mesg_info = {"station_name": self.station_name, "language": search_name}
       case "station":
         LOG.info(f"MpcClient.get_stations() searching for station named: {search_name}") 
-        tracks = self.get_matching_stations(0, search_name)
+        tracks = self.get_matching_stations("name", search_name)
         if tracks == None:         # station not found
           LOG.info(f"MpcClient.get_stations() did not find station named: {search_name}") 
           mesg_file = "station_not_found"
@@ -903,6 +1101,7 @@ class MpcClient():
         mesg_file = "internal_error"
     return Music_info("radio", mesg_file, mesg_info, tracks)  
 
+  @traced("mpc.parse_radio")
   def parse_radio(self, utterance):
     """
     Parse the request to play a radio station
@@ -919,7 +1118,7 @@ class MpcClient():
       (different|next) (radio|) station
     Return: Music_info object 
     """
-    self.mpc_cmd("repeat", "on")              # never stop playing the radio
+    self.pending_repeat = True             # never stop playing the radio
     LOG.info(f"MpcClient.parse_radio() utterance: {utterance}")  
     utterance = utterance.replace('on the ', '') # remove unnecessary words
     utterance = utterance.replace('on my ', '')
@@ -977,6 +1176,7 @@ class MpcClient():
     music_info = self.get_stations(search_name) 
     return music_info
      
+  @traced("mpc.search_internet")
   def search_internet(self, utterance):
     """
     Search for music on the internet and if found, return all URLs in Music_info object 
@@ -985,10 +1185,14 @@ class MpcClient():
     Vocabulary:
       play (track|artist|album|) {music} (from|on) (the|) internet
     """
-    mesg_file = "" 
-    mesg_info = {}
-    tracks = []
     LOG.info(f"MpcClient.search_internet() utterance: {utterance}")
+    phrase = self.internet_phrase(utterance)
+    # resolving a URL takes around 5 seconds - they are resolved concurrently, the first one starts playing
+    results = self.search_youtube(phrase, max_results=self.max_internet_results)
+    return self.internet_music_info(utterance, results)
+
+  def internet_phrase(self, utterance: str) -> str:
+    """ Strip 'play' and the words asking for the internet from an utterance """
     phrase = utterance.split(' ', 1)[1]    # remove first word (always 'play'?)
     phrase = phrase.lower()                # fold to lower case
     phrase = phrase.replace('on youtube', '') # remove unnecessary words
@@ -998,9 +1202,13 @@ class MpcClient():
     phrase = phrase.replace('from internet', '')
     phrase = phrase.replace('on the internet', '') 
     LOG.info(f"MpcClient.search_internet() searching for phrase: {phrase}")
+    return phrase
 
-    # the ytadd script takes around 5 seconds to add a URL - so limit results to 3
-    results = YoutubeSearch(phrase, max_results=3).to_dict() # return a dictionary
+  def internet_music_info(self, utterance: str, results: List[dict]) -> Music_info:
+    """ Turn YouTube search results into a Music_info object with their URLs in random order """
+    mesg_file = "" 
+    mesg_info = {}
+    tracks = []
     num_hits = len(results)
     if num_hits == 0:
       LOG.info("MpcClient.search_internet() did not find any music on the internet")
@@ -1017,58 +1225,120 @@ class MpcClient():
       mesg_info = None 
     return Music_info("internet", mesg_file, mesg_info, tracks)
 
+  @traced("mpc.search_youtube")
+  def search_youtube(self, phrase: str, max_results: int=3) -> List[dict]:
+    """
+    Search YouTube - answered from the search cache when the phrase was searched before
+    Stale results are returned at once and refreshed in the background, and kept while offline
+    Return: list of dictionaries with 'title' and 'url_suffix', empty when nothing was found
+    """
+    def fetch():
+      with TRACER.span("youtube.search"):  # only on a cache miss or a revalidation
+        return [{"title": result.get("title"), "url_suffix": result["url_suffix"]}
+                for result in YoutubeSearch(phrase, max_results=max_results).to_dict()]
+    results = self.search_cache.get_or_fetch(self.youtube_key(phrase, max_results), fetch, keep=bool)
+    LOG.info(f"MpcClient.search_youtube() phrase: {phrase} hits: {len(results or [])} cache: {self.search_cache.stats}")
+    return list(results or [])
+
+  def youtube_key(self, phrase: str, max_results: int) -> str:
+    """ Key of a YouTube search in the search cache """
+    return f"{max_results}:{normalize(phrase)}"
+
+  @traced("mpc.stream_internet_music")
   def stream_internet_music(self, music_info):
     """
     Stream music from the Internet using mpc 
+    All URLs are resolved and queued concurrently - through the stream cache, or by ytadd processes without one:
+    the first stream added starts playing, the others are appended as they finish.
+    Resolving for a previous request is stopped
     param: Music_info object 
+    Return: True if a stream is playing
     """
     LOG.info("MpcClient.stream_internet_music() streaming all tracks from the Internet")
-    for next_url in music_info.tracks: # queue up tracks in mpc
-      LOG.info(f"MpcClient.stream_internet_music() streaming from URL: {next_url}")
-      cmd = "/usr/local/sbin/ytadd "+next_url # add URL to mpc queue
+    with self._ytadd_lock:                 # a new request replaces the streams still being resolved
+      self._ytadd_request += 1
+      request = self._ytadd_request
+      for proc in self._ytadd_procs:
+        proc.terminate()
+      self._ytadd_procs = set()
+    self.mpc_cmd("clear")
+    add = self.run_ytadd if self.stream_cache is None else self.add_stream
+    futures = [self._ytadd_pool.submit(add, url, request) for url in music_info.tracks or []]
+    for future in as_completed(futures):   # the rest keep running in the pool
+      if future.result():
+        if self.mpc_cmd("play") != 0:      # Now play the first queued up track
+          LOG.info("MpcClient.stream_internet_music(): mpc_cmd(play) failed")
+          return False
+        return True
+    LOG.info("MpcClient.stream_internet_music(): no URL could be added")
+    return False
+
+  @traced("mpc.add_stream")
+  def add_stream(self, url: str, request: int) -> bool:
+    """
+    Resolve one URL - skipped when it was resolved recently - and add its audio stream to the mpd queue
+    param: request - the stream_internet_music() call it belongs to; not added if a newer one was made
+    Return: True on success
+    """
+    if request != self._ytadd_request:
+      return False
+    try:
+      stream_url = self.stream_cache.resolve(url)
+    except ResolveError as e:
+      LOG.error(f"MpcClient.add_stream() {e}")
+      return False
+    with self._ytadd_lock:                 # the stream stays cached for the next request
+      if request != self._ytadd_request:
+        return False
       try:
-        LOG.info(f"MpcClient.stream_internet_music(): running command: {cmd}")
-        result = subprocess.check_output(cmd, shell=True)
-        LOG.info(f"MpcClient.stream_internet_music(): result: {result}")
-      except subprocess.CalledProcessError as e:
-        LOG.error(f"MpcClient.stream_internet_music() e.returncode: {e.returncode}")
+        self.mpd.command("add", stream_url)
+      except MpdError as e:
+        LOG.error(f"MpcClient.add_stream() cannot add the stream of {url}: {e}")
         return False
-    if self.mpc_cmd("play") != True:        # Now play the queued up tracks
-        LOG.info("MpcClient.start_music(): mpc_cmd(play) failed")
-        return False 
+    LOG.info(f"MpcClient.add_stream(): added {url} cache hits: {self.stream_cache.hits} misses: {self.stream_cache.misses}")
+    return True
 
+  @traced("mpc.ytadd")
+  def run_ytadd(self, url: str, request: int) -> bool:
+    """
+    Resolve one URL and add it to the mpd queue with ytadd
+    param: request - the stream_internet_music() call it belongs to; skipped if a newer one was made
+    Return: True on success
+    """
+    with self._ytadd_lock:
+      if request != self._ytadd_request:
+        return False
+      LOG.info(f"MpcClient.run_ytadd(): running command: {self.ytadd} {url}")
+      try:
+        proc = Popen([self.ytadd, url], stdout=PIPE, stderr=STDOUT)
+      except OSError as e:
+        LOG.error(f"MpcClient.run_ytadd() cannot run {self.ytadd}: {e}")
+        return False
+      self._ytadd_procs.add(proc)
+    try:
+      output, _ = proc.communicate(timeout=self.ytadd_timeout)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+      output, _ = proc.communicate()
+    finally:
+      with self._ytadd_lock:
+        self._ytadd_procs.discard(proc)
+    LOG.info(f"MpcClient.run_ytadd(): {url} returncode: {proc.returncode} result: {output}")
+    return proc.returncode == 0
+
+  @traced("mpc.search_news")
   def search_news(self, utterance):
     """
     search for NPR news 
+    The current episode is fetched by self.news - usually already downloaded by its prefetch thread
     param: text of the request
     return: Music_info object
     """
-    url = "https://www.npr.org/podcasts/500005/npr-news-now"
-    LOG.info(f"MpcClient.search_news() utterance: {utterance} url: {url}") 
-    mesg_info = {}
-    mesg_file = "playing_npr"
-    res = requests.get(url)
-    page = res.text
-    start_indx = page.find('audioUrl')
-    if start_indx == -1:
-      LOG.info(f"MpcClient.search_news() cannot find NPR news URL") 
-      mesg_file = "cannot_play_npr"
-      return Music_info("none", mesg_file, {}, [])
-    end_indx = start_indx + len('audioUrl')
-    page = page[end_indx + 3:]
-    end_indx = page.find('?')
-    if end_indx == -1:
-      LOG.info(f"MpcClient.search_news() Parse error")
-      mesg_file = "cannot_parse_npr"
-      return Music_info("none", mesg_file, {}, [])
-    LOG.info(f"MpcClient.search_news() start_indx: {start_indx} end_indx: {end_indx} ")       
-    new_url = page[:end_indx]
-    new_url = new_url.replace("\\","")
-    os.chdir(self.temp_dir)                # change to the logs directory which should be a tmpfs
-    LOG.info(f"MpcClient.search_news() current directory is: {os.getcwd()}")
-    cmd = f"wget {new_url}"
-    os.system(cmd)                         # get the file with wget
-    file_names = glob.glob("*.mp3")        # find the downloaded file
-    file_name = f"{self.temp_dir}/{file_names[0]}" # fully qualify file name
+    LOG.info(f"MpcClient.search_news() utterance: {utterance} url: {self.news.page_url}") 
+    try:
+      file_name = self.news.fetch()        # local file or episode URL
+    except NewsError as e:
+      LOG.info(f"MpcClient.search_news() {e}") 
+      return Music_info("none", "cannot_play_npr", {}, [])
     LOG.info(f"MpcClient.search_news() news file_name: {file_name}")
-    return Music_info("news", mesg_file, mesg_info, [file_name])
+    return Music_info("news", "playing_npr", {}, [file_name])
@@ -0,0 +1,242 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import threading
+from dataclasses import dataclass, field
+from ovos_utils.log import LOG
+from mpd_connection import MpdConnection, MpdError, MpdSong, parse_songs
+from util.fuzzy_index import FuzzyIndex, FuzzyMatch
+from typing import Dict, Iterable, List, Optional
+
+@dataclass
+class FieldMatch:
+  """ Songs whose tag contains a search phrase, as returned by MpdCatalog.search_fields() """
+  tag: str
+  songs: List[MpdSong] = field(default_factory=list) # every match, in database order
+  exact: List[MpdSong] = field(default_factory=list) # songs whose whole tag equals the phrase
+
+class MpdCatalog():
+  """
+  In-memory copy of the songs in the mpd database
+  It is read with one listing per top level directory - a single listallinfo of a large library
+  can exceed mpd's max_output_buffer_size - and read again when mpd reports a database change,
+  so searches are answered without a round trip to mpd
+  While the catalog is stale it is loaded in the background, once at a time, and queries are left to mpd
+  """
+  tags = ("artist", "album", "title", "genre", "file") # tags answered locally, as MpdSong attributes
+  fuzzy_tags = ("artist", "album", "title") # tags whose names can be looked up approximately
+
+  def __init__(self, mpd: MpdConnection, watch: bool=True):
+    """
+    Param: mpd   - connection used to read the database
+           watch - reload when mpd reports a database change, through a second connection waiting in idle
+    """
+    self.mpd = mpd
+    self.watch = watch
+    self._songs: List[MpdSong] = []
+    self._index: Dict[str, Dict[str, List[int]]] = {} # tag -> case folded value -> positions in _songs
+    self._stale = True                     # load before the next query
+    self._lock = threading.Lock()          # serializes refreshes
+    self._loading = False                  # a refresh is running
+    self._load_lock = threading.Lock()     # guards starting the loader and fuzzy threads
+    self._loader: Optional[threading.Thread] = None
+    self._stopping = threading.Event()
+    self._idle_mpd: Optional[MpdConnection] = None
+    self._watcher: Optional[threading.Thread] = None
+    self._fuzzy = (None, None)             # (_index it was built from, FuzzyIndex)
+    self._fuzzy_lock = threading.Lock()
+    self._fuzzy_builder: Optional[threading.Thread] = None
+
+  def __len__(self):
+    return len(self._songs)
+
+  @property
+  def stale(self) -> bool:
+    """ True until the database is loaded and after mpd reported a change """
+    return self._stale or not self._index
+
+  def invalidate(self):
+    """ Read the database again before the next query """
+    self._stale = True
+
+  def refresh(self, mpd: Optional[MpdConnection]=None):
+    """
+    Read the whole database now and swap it in when complete - queries meanwhile see the old copy
+    Param: mpd - connection to read with, default the catalog's own
+    Raise: MpdError when mpd cannot be reached
+    """
+    mpd = mpd or self.mpd
+    with self._lock:
+      self._loading = True
+      self._stale = False                  # a change reported while listing marks it stale again
+      try:
+        pairs = mpd.command("lsinfo")
+        songs = parse_songs(pairs)         # songs in the root directory
+        for key, directory in pairs:
+          if key == "directory":
+            songs.extend(mpd.songs("listallinfo", directory))
+        index = {tag: {} for tag in self.tags}
+        for pos, song in enumerate(songs):
+          for tag in self.tags:
+            value = getattr(song, tag)
+            if value:
+              index[tag].setdefault(value.casefold(), []).append(pos)
+        self._songs, self._index = songs, index # one assignment each, readers never see a mix
+      except MpdError:
+        self._stale = True
+        raise
+      finally:
+        self._loading = False
+      LOG.info(f"MpdCatalog.refresh(): loaded {len(songs)} songs")
+    # build the fuzzy index ahead of the first misheard name - one thread catches up with every refresh
+    with self._load_lock:
+      if self._fuzzy_builder is None or not self._fuzzy_builder.is_alive():
+        self._fuzzy_builder = threading.Thread(target=self._build_fuzzy, name="MpdCatalogFuzzy", daemon=True)
+        self._fuzzy_builder.start()
+    if self.watch and self._watcher is None:
+      self._idle_mpd = self.mpd.clone(timeout=None)
+      self._watcher = threading.Thread(target=self._watch_database, name="MpdCatalog", daemon=True)
+      self._watcher.start()
+
+  def load(self):
+    """ Start reading the database in a background thread unless it is being read already """
+    with self._load_lock:
+      if self._loading or (self._loader and self._loader.is_alive()):
+        return
+      self._loader = threading.Thread(target=self._load, name="MpdCatalogLoad", daemon=True)
+      self._loader.start()
+
+  def query(self, command: str, *args) -> Optional[List[MpdSong]]:
+    """
+    Answer an mpd 'listallinfo', 'search' or 'find' command from the catalog
+    search matches a case insensitive substring of the tag, find matches the whole tag
+    Param: args - tag/value pairs, 'any' matches any tag
+    Return: songs in database order, or None when the command or a tag cannot be answered locally or the
+            catalog is stale - it is loaded for the next query meanwhile
+    """
+    if command not in ("listallinfo", "search", "find") or len(args) % 2:
+      return None
+    if command == "listallinfo" and args:  # listing of one directory
+      return None
+    pairs = list(zip(args[0::2], args[1::2]))
+    if any(tag.lower() not in self.tags + ("any",) for tag, _ in pairs):
+      return None
+    if self.stale:
+      self.load()
+      return None
+    songs, index = self._songs, self._index
+    matches = None
+    for tag, value in pairs:
+      tag_matches = self._match(index, tag.lower(), str(value).casefold(), command == "search")
+      matches = tag_matches if matches is None else matches & tag_matches
+      if not matches:
+        return []
+    if matches is None:                    # no qualifier - all songs
+      return list(songs)
+    return [songs[pos] for pos in sorted(matches)]
+
+  def search_fields(self, phrase: str, tags: Iterable[str]=("artist", "album", "title")) -> Dict[str, FieldMatch]:
+    """
+    Match a phrase against several tags at once, so the caller can rank the fields without a search per tag
+    Matching is a case insensitive substring match as with 'search'
+    Return: a FieldMatch for each tag
+    Raise: MpdError when the catalog is stale and mpd cannot be reached
+    """
+    if self.stale:                         # ask mpd while the catalog is loaded
+      self.load()
+      return self._search_mpd(phrase, tags)
+    songs, index = self._songs, self._index
+    needle = phrase.casefold()
+    results = {}
+    for tag in tags:
+      found = []
+      exact = index[tag].get(needle, [])
+      for value, positions in index[tag].items():
+        if needle in value:
+          found.extend(positions)
+      results[tag] = FieldMatch(tag, [songs[pos] for pos in sorted(found)], [songs[pos] for pos in exact])
+    return results
+
+  def fuzzy_lookup(self, phrase: str, tags: Optional[Iterable[str]]=None, limit: int=5) -> List[FuzzyMatch]:
+    """
+    Find artist, album or title names that are spelled or sound like the phrase, for names misheard by
+    speech recognition
+    Param: tags - only return names of these tags (default fuzzy_tags)
+    Return: matches with case folded names, best first - the names of the old copy while the catalog is
+            loaded, none before it was loaded once
+    """
+    if self.stale:
+      self.load()
+      if not self._index:
+        return []
+    return self._fuzzy_index().lookup(phrase, tags, limit)
+
+  def close(self):
+    """ Stop waiting for database changes """
+    self._stopping.set()
+    if self._idle_mpd:
+      self._idle_mpd.interrupt()
+    if self._watcher:
+      self._watcher.join(5)
+
+  def _match(self, index: Dict[str, Dict[str, List[int]]], tag: str, needle: str, substring: bool) -> set:
+    """ Positions of the songs whose tag matches - distinct values are scanned, not songs """
+    matches = set()
+    for name in (self.tags if tag == "any" else (tag,)):
+      values = index[name]
+      if not substring:
+        matches.update(values.get(needle, ()))
+        continue
+      for value, positions in values.items():
+        if needle in value:
+          matches.update(positions)
+    return matches
+
+  def _search_mpd(self, phrase: str, tags: Iterable[str]) -> Dict[str, FieldMatch]:
+    """ search_fields() answered by mpd, with one search per tag in one round trip """
+    tags = list(tags)
+    needle = phrase.casefold()
+    results = {}
+    responses = self.mpd.command_list([("search", tag, phrase) for tag in tags]) if tags else []
+    for tag, pairs in zip(tags, responses):
+      songs = parse_songs(pairs)
+      results[tag] = FieldMatch(tag, songs, [song for song in songs if (getattr(song, tag) or "").casefold() == needle])
+    return results
+
+  def _load(self):
+    """ Read the database on a connection of its own, so mpd keeps answering queries meanwhile """
+    mpd = self.mpd.clone(self.mpd.timeout)
+    try:
+      self.refresh(mpd)
+    except MpdError as e:                  # tried again by the next query
+      LOG.info(f"MpdCatalog._load(): {e}")
+    finally:
+      mpd.close()
+
+  def _build_fuzzy(self):
+    """ Build fuzzy indexes until the one of the current catalog is built """
+    while self._fuzzy[0] is not self._index:
+      self._fuzzy_index()
+
+  def _fuzzy_index(self) -> FuzzyIndex:
+    """ Return the fuzzy index of the current catalog, building it if needed """
+    with self._fuzzy_lock:
+      index = self._index
+      if self._fuzzy[0] is not index:
+        self._fuzzy = (index, FuzzyIndex({tag: index[tag] for tag in self.fuzzy_tags if tag in index}))
+      return self._fuzzy[1]
+
+  def _watch_database(self):
+    """ Wait in idle on a second connection and reload on a third whenever the database changed """
+    while not self._stopping.is_set():
+      try:
+        if "database" in self._idle_mpd.idle("database"):
+          LOG.info("MpdCatalog._watch_database(): mpd database changed - reloading")
+          self._load()                     # not on the connection of the voice requests
+      except MpdError as e:
+        if self._stopping.is_set():
+          break
+        LOG.info(f"MpdCatalog._watch_database(): {e} - reloading before the next query")
+        self._stale = True                 # changes may have been missed
+        self._stopping.wait(5)
+    self._idle_mpd.close()
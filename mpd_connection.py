@@ -0,0 +1,457 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import asyncio
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from typing import Dict, List, Optional, Tuple
+
+from tracing import traced
+
+DEFAULT_SOCKET = "/run/mpd/socket"         # default UNIX socket of a Debian mpd
+DEFAULT_PORT = 6600
+
+class MpdError(Exception):
+  """ Base class of all errors raised while talking to mpd """
+
+class MpdConnectionError(MpdError):
+  """ mpd could not be reached or the connection dropped """
+
+class MpdCommandError(MpdError):
+  """
+  mpd answered a command with an ACK line such as:
+    ACK [50@0] {load} No such playlist
+  """
+  def __init__(self, code: int, index: int, command: str, message: str):
+    self.code = code
+    self.index = index                     # position of the failing command in a command list
+    self.command = command
+    self.message = message
+    super().__init__(f"[{code}@{index}] {{{command}}} {message}")
+
+  @classmethod
+  def from_ack(cls, line: str):
+    """ Parse an 'ACK [code@index] {command} message' line """
+    try:
+      error, rest = line[5:].split("]", 1)
+      code, index = error.split("@", 1)
+      command, message = rest.strip()[1:].split("}", 1)
+      return cls(int(code), int(index), command, message.strip())
+    except ValueError:                     # not the expected format
+      return cls(0, 0, "", line)
+
+@dataclass
+class MpdSong:
+  """ One song record as returned by search, listallinfo or playlistinfo """
+  file: str
+  artist: str = ""
+  album: str = ""
+  title: str = ""
+  genre: str = ""
+  duration: float = 0.0                    # seconds
+  track: int = 0
+
+  @property
+  def time_str(self) -> str:
+    """ Duration formatted the way 'mpc --format %time%' does: [H:]MM:SS """
+    if not self.duration:
+      return ""
+    minutes, seconds = divmod(int(round(self.duration)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+      return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+  def to_fields(self) -> List[str]:
+    """ Return the fields in the order of '%artist%\t%album%\t%title%\t%time%\t%file%\t%genre%' """
+    return [self.artist, self.album, self.title, self.time_str, self.file, self.genre]
+
+  @classmethod
+  def from_pairs(cls, pairs: List[Tuple[str, str]]):
+    """ Build a song from the key/value pairs of one 'file:' record """
+    song = cls(file=pairs[0][1])
+    for key, value in pairs[1:]:
+      match key:
+        case "Artist":
+          if not song.artist:              # keep the first of multi-valued tags
+            song.artist = value
+        case "Album":
+          if not song.album:
+            song.album = value
+        case "Title":
+          song.title = value
+        case "Genre":
+          if not song.genre:
+            song.genre = value
+        case "duration":                   # high resolution duration
+          song.duration = float(value)
+        case "Time":                       # deprecated, integer seconds
+          if not song.duration:
+            song.duration = float(value)
+        case "Track":                      # can be "3" or "3/12"
+          number = value.split("/", 1)[0]
+          song.track = int(number) if number.isdigit() else 0
+    return song
+
+def quote(arg) -> str:
+  """ Quote one argument of an mpd protocol command """
+  arg = str(arg).replace("\\", "\\\\").replace('"', '\\"')
+  return f'"{arg}"'
+
+def parse_songs(pairs: List[Tuple[str, str]]) -> List[MpdSong]:
+  """ Split a response into song records - each one starts with a 'file' key """
+  songs = []
+  record = None
+  for key, value in pairs:
+    if key == "file":
+      if record:
+        songs.append(MpdSong.from_pairs(record))
+      record = [(key, value)]
+    elif key in ("directory", "playlist"): # not a song - end the current record
+      if record:
+        songs.append(MpdSong.from_pairs(record))
+      record = None
+    elif record is not None:
+      record.append((key, value))
+  if record:
+    songs.append(MpdSong.from_pairs(record))
+  return songs
+
+class MpdConnection():
+  """
+  One long-lived connection to mpd over TCP or a UNIX socket
+  Commands are serialized with a lock, every socket operation is bounded by a timeout,
+  and a dropped connection is re-established transparently on the next command
+  """
+  def __init__(self, host: Optional[str]=None, port: Optional[int]=None, timeout: float=5.0):
+    host = host or os.getenv("MPD_HOST")
+    self.password = None
+    if host and "@" in host and not host.startswith("@"): # MPD_HOST=password@host as with mpc
+      self.password, host = host.split("@", 1)
+    if not host:
+      host = DEFAULT_SOCKET if os.path.exists(DEFAULT_SOCKET) else "localhost"
+    self.host = host
+    self.port = int(port or os.getenv("MPD_PORT") or DEFAULT_PORT)
+    self.timeout = timeout
+    self.mpd_version = None
+    self._sock = None
+    self._rfile = None
+    self._lock = threading.RLock()
+
+  @property
+  def connected(self) -> bool:
+    return self._sock is not None
+
+  def connect(self):
+    """
+    Open the connection and read the 'OK MPD <version>' greeting
+    """
+    with self._lock:
+      if self._sock is not None:
+        return
+      try:
+        if self.host.startswith("/") or self.host.startswith("@"): # UNIX or abstract socket
+          sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+          sock.settimeout(self.timeout)
+          sock.connect(self.host.replace("@", "\0", 1) if self.host.startswith("@") else self.host)
+        else:
+          sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+          sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      except OSError as e:
+        raise MpdConnectionError(f"cannot connect to mpd at {self.host}:{self.port}: {e}") from e
+      self._sock = sock
+      self._rfile = sock.makefile("rb")
+      greeting = self._read_line()
+      if not greeting.startswith("OK MPD "):
+        self.close()
+        raise MpdConnectionError(f"unexpected greeting from mpd: {greeting}")
+      self.mpd_version = greeting[7:]
+      LOG.info(f"MpdConnection.connect(): connected to mpd {self.mpd_version} at {self.host}")
+      if self.password:
+        self._send(f"password {quote(self.password)}")
+        self._read_response()
+
+  def close(self):
+    """ Close the connection - the next command reconnects """
+    with self._lock:
+      for closeable in (self._rfile, self._sock):
+        if closeable is not None:
+          try:
+            closeable.close()
+          except OSError:
+            pass
+      self._sock = None
+      self._rfile = None
+
+  def clone(self, timeout: Optional[float]=None):
+    """ Return a new connection to the same mpd, e.g. for a thread that waits in idle """
+    conn = MpdConnection(self.host, self.port, timeout)
+    conn.password = self.password
+    return conn
+
+  def idle(self, *subsystems: str) -> List[str]:
+    """
+    Wait until mpd reports a change, such as 'database' after an update
+    Blocks for as long as the connection timeout allows - use a connection without timeout and
+    call interrupt() from another thread to stop waiting
+    Return: the names of the changed subsystems
+    Raise: MpdConnectionError when mpd cannot be reached or the wait was interrupted
+    """
+    line = " ".join(["idle"] + list(subsystems))
+    with self._lock:
+      self.connect()
+      try:
+        self._send(line)
+        return [value for key, value in self._read_response() if key == "changed"]
+      except OSError as e:                 # not retried - changes may have been missed meanwhile
+        self.close()
+        raise MpdConnectionError(str(e)) from e
+      except MpdConnectionError:
+        self.close()
+        raise
+
+  def interrupt(self):
+    """ Make a command blocked in another thread, such as idle(), fail with MpdConnectionError """
+    sock = self._sock
+    if sock is not None:
+      try:
+        sock.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+
+  def command(self, name: str, *args) -> List[Tuple[str, str]]:
+    """
+    Run one command and return the key/value pairs of its response
+    Arguments that are None are dropped
+    Raise: MpdCommandError when mpd answers ACK, MpdConnectionError when mpd cannot be reached
+    """
+    line = " ".join([name] + [quote(arg) for arg in args if arg is not None])
+    return self._execute([line])[0]
+
+  def command_list(self, commands: List[Tuple]) -> List[List[Tuple[str, str]]]:
+    """
+    Run several commands in one round trip with command_list_ok_begin
+    mpd runs the list without interleaving other clients and stops at the first failure
+    Param: commands - list of tuples (name, arg, ...)
+    Return: one list of key/value pairs per command
+    Raise: MpdCommandError whose index is the position of the failing command - those before it were run
+    """
+    lines = [" ".join([cmd[0]] + [quote(arg) for arg in cmd[1:] if arg is not None]) for cmd in commands]
+    return self._execute(lines)
+
+  def command_dict(self, name: str, *args) -> Dict[str, str]:
+    """ Run a command whose response is a flat mapping, such as 'status' or 'stats' """
+    return dict(self.command(name, *args))
+
+  def songs(self, name: str, *args) -> List[MpdSong]:
+    """ Run a command whose response is a list of songs, such as 'search' or 'playlistinfo' """
+    return parse_songs(self.command(name, *args))
+
+  def values(self, name: str, key: str, *args) -> List[str]:
+    """ Run a command and return the values of every pair with the given key """
+    return [v for k, v in self.command(name, *args) if k == key]
+
+  @traced("mpd.round_trip")
+  def _execute(self, lines: List[str]) -> List[List[Tuple[str, str]]]:
+    """ Send the command lines, reconnecting once if the connection went stale """
+    with self._lock:
+      for attempt in (1, 2):
+        try:
+          self.connect()
+          if len(lines) == 1:
+            self._send(lines[0])
+            return [self._read_response()]
+          self._send("\n".join(["command_list_ok_begin"] + lines + ["command_list_end"]))
+          return self._read_list_response()
+        except socket.timeout as e:        # mpd may still run it - do not send it twice
+          self.close()
+          raise MpdConnectionError(f"mpd did not answer within {self.timeout} seconds") from e
+        except (OSError, MpdConnectionError) as e:
+          self.close()
+          if attempt == 2:
+            raise e if isinstance(e, MpdConnectionError) else MpdConnectionError(str(e)) from e
+          LOG.info(f"MpdConnection._execute(): connection lost ({e}) - reconnecting")
+
+  def _send(self, text: str):
+    self._sock.sendall((text + "\n").encode("utf-8"))
+
+  def _read_line(self) -> str:
+    line = self._rfile.readline()
+    if not line:                           # mpd closed the connection, e.g. connection_timeout
+      raise MpdConnectionError("connection closed by mpd")
+    return line.decode("utf-8", errors="replace").rstrip("\n")
+
+  def _read_response(self) -> List[Tuple[str, str]]:
+    """ Read pairs up to OK - or raise on ACK """
+    pairs = []
+    while True:
+      line = self._read_line()
+      if line == "OK":
+        return pairs
+      if line.startswith("ACK "):
+        raise MpdCommandError.from_ack(line)
+      key, _, value = line.partition(": ")
+      pairs.append((key, value))
+
+  def _read_list_response(self) -> List[List[Tuple[str, str]]]:
+    """ Read the list_OK separated responses of a command list """
+    results = []
+    pairs = []
+    while True:
+      line = self._read_line()
+      if line == "list_OK":
+        results.append(pairs)
+        pairs = []
+      elif line == "OK":
+        return results
+      elif line.startswith("ACK "):
+        raise MpdCommandError.from_ack(line)
+      else:
+        key, _, value = line.partition(": ")
+        pairs.append((key, value))
+
+class AsyncMpdConnection():
+  """
+  The asyncio counterpart of MpdConnection - same commands, coroutines instead of blocking calls
+  Commands are serialized with an asyncio lock, so many tasks can share one connection
+  """
+  def __init__(self, host: Optional[str]=None, port: Optional[int]=None, timeout: float=5.0):
+    settings = MpdConnection(host, port, timeout) # resolves MPD_HOST, MPD_PORT, the socket and the password
+    self.host = settings.host
+    self.port = settings.port
+    self.password = settings.password
+    self.timeout = timeout
+    self.mpd_version = None
+    self._reader: Optional[asyncio.StreamReader] = None
+    self._writer: Optional[asyncio.StreamWriter] = None
+    self._lock: Optional[asyncio.Lock] = None # made in the loop that uses it
+
+  @classmethod
+  def from_connection(cls, mpd: MpdConnection):
+    """ Return an async connection to the same mpd as a blocking one """
+    conn = cls(mpd.host, mpd.port, mpd.timeout)
+    conn.password = mpd.password
+    return conn
+
+  @property
+  def connected(self) -> bool:
+    return self._writer is not None
+
+  async def connect(self):
+    """ Open the connection and read the 'OK MPD <version>' greeting """
+    if self._writer is not None:
+      return
+    try:
+      if self.host.startswith("/") or self.host.startswith("@"): # UNIX or abstract socket
+        path = self.host.replace("@", "\0", 1) if self.host.startswith("@") else self.host
+        opening = asyncio.open_unix_connection(path)
+      else:
+        opening = asyncio.open_connection(self.host, self.port)
+      self._reader, self._writer = await asyncio.wait_for(opening, self.timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+      raise MpdConnectionError(f"cannot connect to mpd at {self.host}:{self.port}: {e}") from e
+    greeting = await self._read_line()
+    if not greeting.startswith("OK MPD "):
+      await self.close()
+      raise MpdConnectionError(f"unexpected greeting from mpd: {greeting}")
+    self.mpd_version = greeting[7:]
+    LOG.info(f"AsyncMpdConnection.connect(): connected to mpd {self.mpd_version} at {self.host}")
+    if self.password:
+      await self._send(f"password {quote(self.password)}")
+      await self._read_response()
+
+  async def close(self):
+    """ Close the connection - the next command reconnects """
+    writer, self._reader, self._writer = self._writer, None, None
+    if writer is not None:
+      writer.close()
+      try:
+        await writer.wait_closed()
+      except OSError:
+        pass
+
+  async def command(self, name: str, *args) -> List[Tuple[str, str]]:
+    """
+    Run one command and return the key/value pairs of its response
+    Raise: MpdCommandError when mpd answers ACK, MpdConnectionError when mpd cannot be reached
+    """
+    line = " ".join([name] + [quote(arg) for arg in args if arg is not None])
+    return (await self._execute([line]))[0]
+
+  async def command_list(self, commands: List[Tuple]) -> List[List[Tuple[str, str]]]:
+    """ Run several commands in one round trip - see MpdConnection.command_list() """
+    lines = [" ".join([cmd[0]] + [quote(arg) for arg in cmd[1:] if arg is not None]) for cmd in commands]
+    return await self._execute(lines)
+
+  async def command_dict(self, name: str, *args) -> Dict[str, str]:
+    return dict(await self.command(name, *args))
+
+  async def songs(self, name: str, *args) -> List[MpdSong]:
+    return parse_songs(await self.command(name, *args))
+
+  async def values(self, name: str, key: str, *args) -> List[str]:
+    return [v for k, v in await self.command(name, *args) if k == key]
+
+  async def _execute(self, lines: List[str]) -> List[List[Tuple[str, str]]]:
+    """ Send the command lines, reconnecting once if the connection went stale """
+    if self._lock is None:
+      self._lock = asyncio.Lock()
+    async with self._lock:
+      for attempt in (1, 2):
+        try:
+          await self.connect()
+          if len(lines) == 1:
+            await self._send(lines[0])
+            return [await self._read_response()]
+          await self._send("\n".join(["command_list_ok_begin"] + lines + ["command_list_end"]))
+          return await self._read_list_response()
+        except asyncio.TimeoutError as e:  # mpd may still run it - do not send it twice
+          await self.close()
+          raise MpdConnectionError(f"mpd did not answer within {self.timeout} seconds") from e
+        except (OSError, MpdConnectionError) as e:
+          await self.close()
+          if attempt == 2:
+            raise e if isinstance(e, MpdConnectionError) else MpdConnectionError(str(e)) from e
+          LOG.info(f"AsyncMpdConnection._execute(): connection lost ({e}) - reconnecting")
+
+  async def _send(self, text: str):
+    self._writer.write((text + "\n").encode("utf-8"))
+    await asyncio.wait_for(self._writer.drain(), self.timeout)
+
+  async def _read_line(self) -> str:
+    line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+    if not line:
+      raise MpdConnectionError("connection closed by mpd")
+    return line.decode("utf-8", errors="replace").rstrip("\n")
+
+  async def _read_response(self) -> List[Tuple[str, str]]:
+    """ Read pairs up to OK - or raise on ACK """
+    pairs = []
+    while True:
+      line = await self._read_line()
+      if line == "OK":
+        return pairs
+      if line.startswith("ACK "):
+        raise MpdCommandError.from_ack(line)
+      key, _, value = line.partition(": ")
+      pairs.append((key, value))
+
+  async def _read_list_response(self) -> List[List[Tuple[str, str]]]:
+    """ Read the list_OK separated responses of a command list """
+    results = []
+    pairs = []
+    while True:
+      line = await self._read_line()
+      if line == "list_OK":
+        results.append(pairs)
+        pairs = []
+      elif line == "OK":
+        return results
+      elif line.startswith("ACK "):
+        raise MpdCommandError.from_ack(line)
+      else:
+        key, _, value = line.partition(": ")
+        pairs.append((key, value))
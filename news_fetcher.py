@@ -0,0 +1,157 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import hashlib
+import json
+import os
+import re
+import threading
+from ovos_utils.log import LOG
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NPR_NEWS_URL = "https://www.npr.org/podcasts/500005/npr-news-now"
+
+# "audioUrl":"https:\/\/play.podtrac.com\/...\/npr-news-now.mp3?..." in the JSON embedded in the podcast page
+AUDIO_URL = re.compile(r'"audioUrl"\s*:\s*"([^"?]+)')
+
+class NewsError(Exception):
+  """ The current news episode could not be found or downloaded """
+
+class NewsFetcher():
+  """
+  Find the current episode of a news podcast and keep a copy of it
+  The podcast page is requested with If-None-Match and If-Modified-Since, so an unchanged page costs one
+  short round trip. Each episode is downloaded once, straight into the cache directory, and older episodes
+  are removed. A background thread can refresh the episode on a schedule so playing the news starts at once
+  """
+  def __init__(self, cache_dir: str, page_url: str=NPR_NEWS_URL, download: bool=True, timeout: float=10.0,
+               session: Optional[requests.Session]=None):
+    """
+    Param: cache_dir - where episodes are downloaded to
+           download  - False to return the episode URL for mpd to stream instead of a local file
+           session   - HTTP session to reuse, one with a connection pool is made if None
+    """
+    self.cache_dir = cache_dir
+    self.page_url = page_url
+    self.download = download
+    self.timeout = timeout
+    if session is None:
+      session = requests.Session()
+      session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=1))
+      session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=1))
+    self.session = session
+    self.episode_url: Optional[str] = None # from the last page that was parsed
+    self._validators = {}                  # ETag and Last-Modified of that page
+    self._lock = threading.Lock()          # one fetch at a time
+    self._stop = threading.Event()
+    self._prefetcher: Optional[threading.Thread] = None
+    self._state_file = os.path.join(cache_dir, "news.json")
+    os.makedirs(cache_dir, exist_ok=True)
+    self._load_state()
+
+  def fetch(self) -> str:
+    """
+    Return the local file of the current episode - or its URL if not downloading
+    Raise: NewsError
+    """
+    with self._lock:
+      episode_url = self._current_episode_url()
+      if not self.download:
+        return episode_url
+      return self._download(episode_url)
+
+  def start_prefetch(self, interval: float=1800.0):
+    """ Fetch the current episode now and then every interval seconds in a background thread """
+    if self._prefetcher:
+      return
+    self._prefetcher = threading.Thread(target=self._prefetch, args=(interval,), name="NewsFetcher", daemon=True)
+    self._prefetcher.start()
+
+  def close(self):
+    self._stop.set()
+    self.session.close()
+
+  def _prefetch(self, interval: float):
+    while not self._stop.is_set():
+      try:
+        LOG.info(f"NewsFetcher._prefetch() current episode: {self.fetch()}")
+      except NewsError as e:
+        LOG.info(f"NewsFetcher._prefetch() {e}")
+      self._stop.wait(interval)
+
+  def _current_episode_url(self) -> str:
+    """ Request the podcast page if it changed and find the episode in it """
+    headers = {}
+    if self.episode_url:                   # validators are only useful with a parsed page
+      if "etag" in self._validators:
+        headers["If-None-Match"] = self._validators["etag"]
+      if "last_modified" in self._validators:
+        headers["If-Modified-Since"] = self._validators["last_modified"]
+    try:
+      res = self.session.get(self.page_url, headers=headers, timeout=self.timeout)
+    except requests.RequestException as e:
+      if self.episode_url:                 # offline - the last episode is better than none
+        LOG.info(f"NewsFetcher._current_episode_url() {self.page_url} failed ({e}) - using the last episode")
+        return self.episode_url
+      raise NewsError(f"cannot get {self.page_url}: {e}") from e
+    if res.status_code == 304:
+      LOG.info(f"NewsFetcher._current_episode_url() {self.page_url} not modified")
+      return self.episode_url
+    if res.status_code != 200:
+      raise NewsError(f"{self.page_url} returned HTTP {res.status_code}")
+    match = AUDIO_URL.search(res.text)
+    if match is None:
+      raise NewsError(f"no audioUrl in {self.page_url}")
+    self.episode_url = match.group(1).replace("\\", "")
+    self._validators = {key: res.headers[header] for key, header in (("etag", "ETag"),
+                                                                     ("last_modified", "Last-Modified"))
+                        if header in res.headers}
+    self._save_state()
+    LOG.info(f"NewsFetcher._current_episode_url() current episode: {self.episode_url}")
+    return self.episode_url
+
+  def _download(self, episode_url: str) -> str:
+    """ Download an episode into the cache directory unless it is there already """
+    # feeds like NPR News Now reuse the file name for every episode - only the full URL tells them apart
+    extension = os.path.splitext(urlsplit(episode_url).path)[1] or ".mp3"
+    name = hashlib.sha1(episode_url.encode()).hexdigest()[:16] + extension
+    file_name = os.path.join(self.cache_dir, name)
+    if not os.path.exists(file_name):
+      part_name = file_name + ".part"
+      try:
+        with self.session.get(episode_url, stream=True, timeout=self.timeout) as res:
+          res.raise_for_status()
+          with open(part_name, "wb") as f:
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+              f.write(chunk)
+      except (requests.RequestException, OSError) as e:
+        if os.path.exists(part_name):
+          os.remove(part_name)
+        raise NewsError(f"cannot download {episode_url}: {e}") from e
+      os.replace(part_name, file_name)     # never play a partial episode
+      LOG.info(f"NewsFetcher._download() downloaded {episode_url} to {file_name}")
+    for old_name in os.listdir(self.cache_dir): # keep only the current episode
+      if old_name != name and old_name.endswith((extension, ".mp3", ".part")):
+        os.remove(os.path.join(self.cache_dir, old_name))
+    return file_name
+
+  def _load_state(self):
+    """ Remember the last episode across restarts, so the first request can be conditional too """
+    try:
+      with open(self._state_file) as f:
+        state = json.load(f)
+      self.episode_url = state["episode_url"]
+      self._validators = state["validators"]
+    except (OSError, ValueError, KeyError):
+      pass
+
+  def _save_state(self):
+    try:
+      with open(self._state_file, "w") as f:
+        json.dump({"episode_url": self.episode_url, "validators": self._validators}, f)
+    except OSError as e:
+      LOG.info(f"NewsFetcher._save_state() cannot write {self._state_file}: {e}")
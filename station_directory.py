@@ -0,0 +1,128 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import csv
+import os
+import random
+import threading
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_STATIONS_FILE = "/home/pi/minimy/skills/user_skills/mpc/radio.stations.csv"
+
+@dataclass
+class Station:
+  """
+  One line of radio.stations.csv such as:
+    "radio paradise", "pop|top 40", "the united states", "english", "no ads", "http://stream.radioparadise.com/flac"
+  """
+  name: str
+  genre: str                               # one or more genres separated by "|"
+  country: str
+  language: str
+  ads: str
+  url: str
+
+  @property
+  def genres(self) -> List[str]:
+    return [genre.strip() for genre in self.genre.split("|") if genre.strip()]
+
+  @classmethod
+  def from_row(cls, row: List[str]):
+    """ Build a station from a CSV row - None if the row is not a station """
+    fields = [field.strip() for field in row]
+    if len(fields) < 6 or "://" not in fields[5]: # short line or header
+      return None
+    return cls(*fields[:6])
+
+class StationDirectory():
+  """
+  The radio stations of radio.stations.csv, read once and indexed by name, genre, country and language
+  The file is read again only when its modification time or size changes
+  """
+  fields = ("name", "genre", "country", "language") # indexed fields
+
+  def __init__(self, path: str=DEFAULT_STATIONS_FILE):
+    self.path = path
+    # stations and their indexes - field -> case folded value -> positions - are swapped together
+    self._loaded: Tuple[List[Station], Dict[str, Dict[str, List[int]]]] = ([], {field: {} for field in self.fields})
+    self._signature: Optional[Tuple[int, int]] = None # (mtime_ns, size) of the loaded file
+    self._lock = threading.Lock()
+
+  @property
+  def stations(self) -> List[Station]:
+    return self._loaded[0]
+
+  def __len__(self):
+    return len(self.stations)
+
+  def load(self) -> bool:
+    """
+    Read the station file if it changed since it was last read
+    Return: False if the file does not exist
+    """
+    try:
+      st = os.stat(self.path)
+    except OSError:
+      LOG.info(f"StationDirectory.load() {self.path} not found")
+      return False
+    signature = (st.st_mtime_ns, st.st_size)
+    if signature == self._signature:
+      return True
+    with self._lock:
+      if signature != self._signature:
+        self._read(signature)
+    return True
+
+  def find(self, field: str, name: str) -> List[Station]:
+    """
+    Find the stations whose field equals name - or, if there are none, contains it
+    Genres are matched one at a time, so "top 40" finds a station with the genre "pop|top 40"
+    Return: stations in file order
+    """
+    stations, index = self._loaded
+    return [stations[pos] for pos in self._positions(index[field], name)]
+
+  def sample(self, count: int, field: Optional[str]=None, name: Optional[str]=None) -> List[Station]:
+    """
+    Pick up to count stations at random - from all stations or from those matching find(field, name)
+    Positions are sampled straight from the index, only the chosen stations are looked up
+    """
+    stations, index = self._loaded
+    if field is None:
+      return random.sample(stations, min(count, len(stations)))
+    positions = self._positions(index[field], name)
+    return [stations[pos] for pos in random.sample(positions, min(count, len(positions)))]
+
+  def _positions(self, values: Dict[str, List[int]], name: str) -> List[int]:
+    """ Positions of the stations with the value name, or of those whose value contains it """
+    name = name.strip().casefold()
+    positions = values.get(name)
+    if positions is not None:
+      return positions
+    found = set()                          # not a whole value - scan the distinct values, not the stations
+    for value, value_positions in values.items():
+      if name in value:
+        found.update(value_positions)
+    return sorted(found)
+
+  def _read(self, signature: Tuple[int, int]):
+    """ Parse the file and swap in the new stations and indexes """
+    stations = []
+    index = {field: {} for field in self.fields}
+    with open(self.path, newline="") as f:
+      for row in csv.reader(f, skipinitialspace=True):
+        station = Station.from_row(row)
+        if station is None:
+          continue
+        pos = len(stations)
+        stations.append(station)
+        index["name"].setdefault(station.name.casefold(), []).append(pos)
+        index["country"].setdefault(station.country.casefold(), []).append(pos)
+        index["language"].setdefault(station.language.casefold(), []).append(pos)
+        for genre in station.genres:
+          index["genre"].setdefault(genre.casefold(), []).append(pos)
+    self._loaded = (stations, index)
+    self._signature = signature
+    LOG.info(f"StationDirectory._read() read {len(stations)} stations from {self.path}")
@@ -0,0 +1,356 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+# Import large internet radio directories - such as a radio-browser.info JSON dump - into an indexed SQLite
+# station store that MpcClient.get_stations() queries directly:
+#   python station_store.py stations.json [--db radio.stations.sqlite]
+#
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from station_directory import DEFAULT_STATIONS_FILE, Station
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from util.search_index import normalize
+
+DEFAULT_STATIONS_DB = os.path.join(os.path.dirname(DEFAULT_STATIONS_FILE), "radio.stations.sqlite")
+
+SCHEMA = """
+CREATE TABLE stations (
+  id INTEGER PRIMARY KEY,
+  name TEXT,
+  genre TEXT,                              -- normalized genres joined with "|"
+  country TEXT,
+  language TEXT,
+  ads TEXT,
+  url TEXT,
+  url_key TEXT UNIQUE,                     -- duplicate streams are dropped
+  name_key TEXT
+);
+CREATE TABLE station_genres (
+  genre TEXT,
+  station_id INTEGER,
+  PRIMARY KEY (genre, station_id)
+) WITHOUT ROWID;
+"""
+
+# created after the bulk insert, which is faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX stations_name ON stations (name_key);
+CREATE INDEX stations_country ON stations (country);
+CREATE INDEX stations_language ON stations (language);
+"""
+
+GENRE_ALIASES = {
+  "hiphop": "hip hop", "rap hip hop": "hip hop", "r b": "rnb", "rhythm and blues": "rnb",
+  "rock n roll": "rock and roll", "rock roll": "rock and roll", "top40": "top 40",
+  "electronica": "electronic", "edm": "electronic", "classic": "classical",
+  "news talk": "news", "talk radio": "talk", "oldie": "oldies",
+}
+COUNTRY_ALIASES = {
+  "us": "united states", "usa": "united states", "united states of america": "united states",
+  "uk": "united kingdom", "gb": "united kingdom", "great britain": "united kingdom",
+  "the united kingdom of great britain and northern ireland": "united kingdom",
+  "de": "germany", "deutschland": "germany", "fr": "france", "ca": "canada", "au": "australia",
+  "russian federation": "russia", "the russian federation": "russia",
+}
+LANGUAGE_ALIASES = {
+  "en": "english", "eng": "english", "de": "german", "deutsch": "german", "fr": "french",
+  "francais": "french", "es": "spanish", "espanol": "spanish", "it": "italian", "pt": "portuguese",
+}
+MAX_GENRES = 8                             # radio-browser tags can be long lists
+
+def normalize_genres(value) -> List[str]:
+  """ Split a genre list such as "Pop|Top 40" or "hip-hop,rnb" and normalize each genre """
+  if isinstance(value, str):
+    for sep in ",;/":
+      value = value.replace(sep, "|")
+    value = value.split("|")
+  genres = []
+  for genre in value or []:
+    genre = normalize(genre)
+    genre = GENRE_ALIASES.get(genre, genre)
+    if genre and genre not in genres:
+      genres.append(genre)
+  return genres[:MAX_GENRES]
+
+def normalize_country(value: str) -> str:
+  """ "The United States" -> "united states" """
+  country = normalize(value)
+  country = COUNTRY_ALIASES.get(country, country)
+  if country.startswith("the "):
+    country = country[4:]
+  return country
+
+def normalize_language(value) -> str:
+  """ The first of a language list such as "English,Spanish" or ["en"] """
+  if isinstance(value, list):
+    value = value[0] if value else ""
+  language = normalize(str(value or "").split(",")[0])
+  return LANGUAGE_ALIASES.get(language, language)
+
+def url_key(url: str) -> str:
+  """ Stream URL in a form where trivially different spellings of the same stream are equal """
+  parts = urlsplit(url.strip())
+  return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+@dataclass
+class ImportStats:
+  """ Outcome of import_stations() """
+  read: int = 0                            # records read from the dump
+  imported: int = 0                        # stations written to the store
+  duplicates: int = 0                      # records with the stream URL of an imported station
+  invalid: int = 0                         # records without a name or a stream URL
+  seconds: float = 0.0
+
+def iter_json_objects(f: TextIO, chunk_size: int=1 << 16) -> Iterator[dict]:
+  """
+  Stream the objects of a JSON array - or of JSON lines - holding at most one object and one chunk in memory
+  """
+  decoder = json.JSONDecoder()
+  incomplete = object()
+  buffer = ""
+  pos = 0
+  eof = False
+  while True:
+    while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+      pos += 1
+    if pos < len(buffer) and buffer[pos] == "]":
+      return
+    if pos < len(buffer):
+      try:
+        obj, end = decoder.raw_decode(buffer, pos)
+      except json.JSONDecodeError:
+        if eof:
+          raise
+        obj = incomplete                   # read more
+      if obj is not incomplete:
+        pos = end
+        if isinstance(obj, dict):
+          yield obj
+        continue
+    elif eof:
+      return
+    chunk = f.read(chunk_size)
+    eof = not chunk
+    buffer = buffer[pos:] + chunk
+    pos = 0
+
+def iter_csv_records(f: TextIO) -> Iterator[dict]:
+  """
+  Stream a CSV dump with a header naming its columns, or the six columns of radio.stations.csv:
+    name, genre, country, language, ads, url
+  """
+  reader = csv.reader(f, skipinitialspace=True)
+  header = next(reader, None)
+  if header is None:
+    return
+  columns = [column.strip().lower() for column in header]
+  if "url" not in columns and "url_resolved" not in columns: # no header - first row is a station
+    columns = ["name", "genre", "country", "language", "ads", "url"]
+    yield dict(zip(columns, header))
+  for row in reader:
+    yield dict(zip(columns, row))
+
+def record_to_station(record: dict) -> Optional[Station]:
+  """ Map the fields of radio-browser or CSV records to a Station with normalized values """
+  name = str(record.get("name") or "").strip()
+  url = str(record.get("url_resolved") or record.get("url") or record.get("stream") or "").strip()
+  if not name or "://" not in url:
+    return None
+  genres = normalize_genres(record.get("tags") or record.get("genre") or record.get("genres") or "")
+  country = normalize_country(str(record.get("country") or record.get("countrycode") or ""))
+  language = normalize_language(record.get("language") or record.get("languagecodes") or "")
+  ads = str(record.get("ads") or "unknown").strip()
+  return Station(name, "|".join(genres), country, language, ads, url)
+
+def import_stations(source: str, db_file: str=DEFAULT_STATIONS_DB, batch_size: int=1000) -> ImportStats:
+  """
+  Stream a JSON or CSV station dump into a new station store that replaces db_file when complete
+  Stations are deduplicated by stream URL - the first one wins
+  Param: source - .json, .jsonl or .csv file
+  Return: ImportStats
+  """
+  start = time.monotonic()
+  stats = ImportStats()
+  tmp_file = f"{db_file}.{os.getpid()}.tmp"
+  if os.path.exists(tmp_file):
+    os.remove(tmp_file)
+  conn = sqlite3.connect(tmp_file)
+  try:
+    conn.execute("PRAGMA journal_mode=OFF") # the store is replaced only by a complete import
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+    with open(source, newline="", encoding="utf-8") as f:
+      if source.lower().endswith(".csv"):
+        records = iter_csv_records(f)
+      else:
+        records = iter_json_objects(f)
+      for record in records:
+        stats.read += 1
+        station = record_to_station(record)
+        if station is None:
+          stats.invalid += 1
+          continue
+        cursor = conn.execute(
+          "INSERT OR IGNORE INTO stations (name, genre, country, language, ads, url, url_key, name_key) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+          (station.name, station.genre, station.country, station.language, station.ads, station.url,
+           url_key(station.url), normalize(station.name)))
+        if not cursor.rowcount:
+          stats.duplicates += 1
+          continue
+        stats.imported += 1
+        conn.executemany("INSERT OR IGNORE INTO station_genres VALUES (?, ?)",
+                         [(genre, cursor.lastrowid) for genre in station.genres])
+        if stats.imported % batch_size == 0:
+          conn.commit()
+    conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+    conn.commit()
+  except BaseException:
+    conn.close()
+    os.remove(tmp_file)
+    raise
+  conn.close()
+  os.replace(tmp_file, db_file)
+  stats.seconds = time.monotonic() - start
+  LOG.info(f"import_stations(): {stats}")
+  return stats
+
+class StationStore():
+  """
+  Query side of the station store written by import_stations()
+  Offers the same lookups as StationDirectory; the database is opened again when an import replaced it
+  """
+  fields = ("name", "genre", "country", "language")
+  columns = "name, genre, country, language, ads, url"
+
+  def __init__(self, db_file: str=DEFAULT_STATIONS_DB):
+    self.path = db_file
+    self._conn: Optional[sqlite3.Connection] = None
+    self._signature: Optional[Tuple[int, int]] = None # (mtime_ns, inode) of the open database
+    self._count = 0
+    self._values: Dict[str, List[str]] = {} # distinct genres, countries and languages for partial matches
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return self._count
+
+  def load(self) -> bool:
+    """
+    Open the store, or open it again if it was replaced by an import
+    Return: False if the store does not exist
+    """
+    try:
+      st = os.stat(self.path)
+    except OSError:
+      LOG.info(f"StationStore.load() {self.path} not found")
+      return False
+    signature = (st.st_mtime_ns, st.st_ino)
+    with self._lock:
+      if signature != self._signature:
+        if self._conn:
+          self._conn.close()
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._count = self._conn.execute("SELECT COUNT(*) FROM stations").fetchone()[0]
+        self._values = {
+          "genre": [row[0] for row in self._conn.execute("SELECT DISTINCT genre FROM station_genres")],
+          "country": [row[0] for row in self._conn.execute("SELECT DISTINCT country FROM stations")],
+          "language": [row[0] for row in self._conn.execute("SELECT DISTINCT language FROM stations")]}
+        self._signature = signature
+        LOG.info(f"StationStore.load() opened {self.path} with {self._count} stations")
+    return True
+
+  def find(self, field: str, name: str) -> List[Station]:
+    """
+    Find the stations whose field equals name - or, if there are none, contains it
+    Return: stations in import order - none if the store does not exist
+    """
+    if not self._open():
+      return []
+    return self._stations(self._ids(field, name))
+
+  def sample(self, count: int, field: Optional[str]=None, name: Optional[str]=None) -> List[Station]:
+    """
+    Pick up to count stations at random - from all stations or from those matching find(field, name)
+    Only the ids of the matches are read, then the chosen stations
+    Return: none if the store does not exist
+    """
+    if not self._open():
+      return []
+    if field is None:                      # ids need not be contiguous - let SQLite pick existing ones
+      with self._lock:
+        rows = self._conn.execute(f"SELECT {self.columns} FROM stations ORDER BY random() LIMIT ?", (count,))
+        return [Station(*row) for row in rows]
+    ids = self._ids(field, name)
+    return self._stations(random.sample(ids, min(count, len(ids))))
+
+  def _open(self) -> bool:
+    """ Load the store on first use, for callers that did not load() it """
+    return self._conn is not None or self.load()
+
+  def _ids(self, field: str, name: str) -> List[int]:
+    """
+    Ids of the stations with the value name, or of those whose value contains it
+    Genres, countries and languages have few distinct values - those containing name are found in memory
+    """
+    match field:
+      case "genre":
+        genres = normalize_genres(name)
+        key = genres[0] if genres else ""
+        query = "SELECT DISTINCT station_id FROM station_genres WHERE genre IN ({}) ORDER BY station_id"
+      case "country" | "language":
+        key = normalize_country(name) if field == "country" else normalize_language(name)
+        query = f"SELECT id FROM stations WHERE {field} IN ({{}}) ORDER BY id"
+      case "name":
+        key = normalize(name)
+      case _:
+        raise ValueError(f"unknown station field: {field}")
+    if not key:
+      return []
+    with self._lock:
+      if field == "name":
+        ids = [row[0] for row in self._conn.execute("SELECT id FROM stations WHERE name_key = ? ORDER BY id", (key,))]
+        if not ids:
+          pattern = "%" + key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+          ids = [row[0] for row in self._conn.execute(
+            "SELECT id FROM stations WHERE name_key LIKE ? ESCAPE '\\' ORDER BY id", (pattern,))]
+        return ids
+      values = [key] if key in self._values[field] else [value for value in self._values[field] if key in value]
+      ids = []
+      for start in range(0, len(values), 500): # stay below SQLite's limit of host parameters
+        batch = values[start:start + 500]
+        ids.extend(row[0] for row in self._conn.execute(query.format(",".join("?" * len(batch))), batch))
+    return sorted(set(ids)) if len(values) > 500 else ids
+
+  def _stations(self, ids: Iterable[int]) -> List[Station]:
+    ids = list(ids)
+    stations: Dict[int, Station] = {}
+    with self._lock:
+      for start in range(0, len(ids), 500): # stay below SQLite's limit of host parameters
+        batch = ids[start:start + 500]
+        rows = self._conn.execute(
+          f"SELECT id, {self.columns} FROM stations WHERE id IN ({','.join('?' * len(batch))})", batch)
+        for row in rows:
+          stations[row[0]] = Station(*row[1:])
+    return [stations[id] for id in ids if id in stations]
+
+def main():
+  parser = argparse.ArgumentParser(description="Import a radio station directory dump into the station store")
+  parser.add_argument("source", help="JSON array, JSON lines or CSV file")
+  parser.add_argument("--db", default=DEFAULT_STATIONS_DB, help=f"station store to write (default {DEFAULT_STATIONS_DB})")
+  args = parser.parse_args()
+  stats = import_stations(args.source, args.db)
+  print(f"read {stats.read} imported {stats.imported} duplicates {stats.duplicates} invalid {stats.invalid} "
+        f"in {stats.seconds:.1f} s")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,179 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import asyncio
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+# Content-Type of a stream -> codec hint
+CODECS = {
+  "audio/mpeg": "mp3", "audio/mp3": "mp3", "audio/aac": "aac", "audio/aacp": "aac", "audio/x-aac": "aac",
+  "audio/mp4": "aac", "audio/ogg": "ogg", "application/ogg": "ogg", "audio/opus": "opus", "audio/flac": "flac",
+  "audio/x-flac": "flac", "application/vnd.apple.mpegurl": "hls", "application/x-mpegurl": "hls",
+  "audio/x-mpegurl": "m3u", "audio/mpegurl": "m3u", "audio/x-scpls": "pls",
+}
+
+@dataclass
+class ProbeResult:
+  """ Liveness of one stream URL """
+  url: str
+  alive: bool
+  latency: float = 0.0                     # seconds until the first audio bytes arrived
+  codec: str = ""                          # from the Content-Type, i.e. "mp3" or "aac"
+  bitrate: int = 0                         # kbit/s from the icy-br header, 0 if unknown
+  error: str = ""
+  checked: float = 0.0                     # time.monotonic() of the probe
+
+class StreamProber():
+  """
+  Check radio stream URLs concurrently with asyncio and remember the results for a while
+  A stream is alive when it answers with a 2xx status - following redirects - and sends audio data
+  within the timeout. Probes run in a background thread with its own event loop
+  """
+  def __init__(self, timeout: float=3.0, concurrency: int=32, ttl: float=3600.0, dead_ttl: float=600.0):
+    """
+    Param: timeout     - seconds a probe may take in total
+           concurrency - streams probed at the same time
+           ttl         - seconds a live result stays valid
+           dead_ttl    - seconds a dead result stays valid - shorter, streams come back
+    """
+    self.timeout = timeout
+    self.concurrency = concurrency
+    self.ttl = ttl
+    self.dead_ttl = dead_ttl
+    self.max_redirects = 3
+    self.max_results = 10000               # cached results before expired ones are dropped
+    self._results: Dict[str, ProbeResult] = {}
+    self._pending = set()                  # URLs queued or being probed
+    self._lock = threading.Lock()
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+  def get(self, url: str) -> Optional[ProbeResult]:
+    """ Return the cached result of a URL, None if it was not probed or the result expired """
+    result = self._results.get(url)
+    if result is None:
+      return None
+    ttl = self.ttl if result.alive else self.dead_ttl
+    if time.monotonic() - result.checked > ttl:
+      return None
+    return result
+
+  def rank(self, urls: Iterable[str]) -> List[str]:
+    """
+    Order URLs for queueing: live streams by latency, then streams not probed yet - in the order given -
+    and known dead streams last
+    """
+    alive, unknown, dead = [], [], []
+    for url in urls:
+      result = self.get(url)
+      if result is None:
+        unknown.append(url)
+      elif result.alive:
+        alive.append((result.latency, url))
+      else:
+        dead.append(url)
+    return [url for _, url in sorted(alive)] + unknown + dead
+
+  def probe(self, urls: Iterable[str]) -> Dict[str, ProbeResult]:
+    """ Probe URLs now, waiting at most about timeout seconds, and return their results """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+      return {}
+    future = asyncio.run_coroutine_threadsafe(self._probe_all(urls), self._event_loop())
+    return future.result()
+
+  def probe_in_background(self, urls: Iterable[str]):
+    """ Probe the URLs without a fresh result in the background - URLs already being probed are skipped """
+    with self._lock:
+      if len(self._results) > self.max_results: # forget expired results
+        self._results = {url: result for url, result in self._results.items() if self.get(url)}
+      urls = [url for url in dict.fromkeys(urls) if url not in self._pending and self.get(url) is None]
+      self._pending.update(urls)
+    if urls:
+      asyncio.run_coroutine_threadsafe(self._probe_all(urls), self._event_loop())
+
+  def close(self):
+    """ Stop the background event loop """
+    if self._loop:
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._loop = None
+
+  def _event_loop(self) -> asyncio.AbstractEventLoop:
+    with self._lock:
+      if self._loop is None:
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="StreamProber", daemon=True).start()
+      return self._loop
+
+  async def _probe_all(self, urls: List[str]) -> Dict[str, ProbeResult]:
+    semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def probe_one(url: str) -> ProbeResult:
+      async with semaphore:
+        start = time.monotonic()
+        try:
+          result = await asyncio.wait_for(self._probe_url(url), self.timeout)
+          result.latency = time.monotonic() - start
+        except asyncio.TimeoutError:
+          result = ProbeResult(url, False, error=f"no audio within {self.timeout} seconds")
+        except (OSError, ValueError, ssl.SSLError) as e:
+          result = ProbeResult(url, False, error=str(e) or type(e).__name__)
+        result.checked = time.monotonic()
+        with self._lock:
+          self._results[url] = result
+          self._pending.discard(url)
+        return result
+
+    results = await asyncio.gather(*(probe_one(url) for url in urls))
+    alive = sum(1 for result in results if result.alive)
+    LOG.info(f"StreamProber._probe_all(): {alive} of {len(results)} streams alive")
+    return {result.url: result for result in results}
+
+  async def _probe_url(self, url: str) -> ProbeResult:
+    """ GET the stream, follow redirects and wait for the first bytes of audio """
+    target = url
+    for _ in range(self.max_redirects + 1):
+      parts = urlsplit(target)
+      if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"not an http stream: {target}")
+      port = parts.port or (443 if parts.scheme == "https" else 80)
+      reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                     ssl=ssl.create_default_context() if parts.scheme == "https" else None)
+      try:
+        path = parts.path or "/"
+        if parts.query:
+          path += "?" + parts.query
+        writer.write((f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\nUser-Agent: skill-local_music\r\n"
+                      f"Icy-MetaData: 0\r\nAccept: */*\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        status_line = (await reader.readline()).decode("latin-1").strip()
+        fields = status_line.split(" ", 2)
+        if len(fields) < 2 or not fields[1].isdigit():
+          raise ValueError(f"not an HTTP response: {status_line[:40]}")
+        status = int(fields[1])            # ICY 200 OK from old shoutcast servers parses too
+        headers = {}
+        while True:
+          line = (await reader.readline()).decode("latin-1").strip()
+          if not line:
+            break
+          key, _, value = line.partition(":")
+          headers[key.strip().lower()] = value.strip()
+        if status in (301, 302, 303, 307, 308) and "location" in headers:
+          target = urljoin(target, headers["location"])
+          continue
+        if status // 100 != 2:
+          return ProbeResult(url, False, error=f"HTTP {status}")
+        if not await reader.read(1024):   # headers only - nothing to play
+          return ProbeResult(url, False, error="no data")
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        bitrate = headers.get("icy-br", "").split(",")[0]
+        return ProbeResult(url, True, codec=CODECS.get(content_type, content_type),
+                           bitrate=int(bitrate) if bitrate.isdigit() else 0)
+      finally:
+        writer.close()
+    return ProbeResult(url, False, error="too many redirects")
@@ -0,0 +1,127 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import calendar
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from typing import Callable, Dict, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+class ResolveError(Exception):
+  """ A page URL could not be resolved to a stream URL """
+
+class YtDlpResolver():
+  """ Resolve a video page URL to the URL of its best audio stream with 'yt-dlp -g' """
+  def __init__(self, command: Sequence[str]=("yt-dlp", "-g", "-f", "bestaudio/best"), timeout: float=60.0):
+    self.command = list(command)
+    self.timeout = timeout
+
+  @classmethod
+  def available(cls) -> bool:
+    return shutil.which("yt-dlp") is not None
+
+  def __call__(self, page_url: str) -> str:
+    try:
+      result = subprocess.run(self.command + [page_url], capture_output=True, text=True, timeout=self.timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+      raise ResolveError(f"{self.command[0]} {page_url} failed: {e}") from e
+    lines = result.stdout.split()
+    if result.returncode != 0 or not lines:
+      raise ResolveError(f"{self.command[0]} {page_url} failed: {result.stderr.strip()[-200:]}")
+    return lines[0]
+
+def stream_expiry(url: str) -> Optional[float]:
+  """
+  Return when a signed stream URL stops working as a time.time() value, None if it carries no expiry
+  Understands 'expire=<epoch>' (googlevideo), 'Expires=<epoch>' (CloudFront), 'exp=<epoch>' and
+  'X-Amz-Date' with 'X-Amz-Expires' (S3)
+  """
+  query = {key.lower(): values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+  for key in ("expire", "expires", "exp"):
+    if query.get(key, "").isdigit():
+      return float(query[key])
+  if query.get("x-amz-date") and query.get("x-amz-expires", "").isdigit():
+    try:
+      signed = calendar.timegm(time.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ"))
+    except ValueError:
+      return None
+    return signed + int(query["x-amz-expires"])
+  return None
+
+@dataclass
+class ResolvedStream:
+  stream_url: str
+  expires: float                           # time.time() after which the stream URL no longer works
+
+class StreamUrlCache():
+  """
+  Remember the stream URL each page URL resolved to, until shortly before the stream URL expires
+  Entries within refresh_ahead seconds of expiring are resolved again in the background when used,
+  so replaying a recent track does not wait for the resolver
+  """
+  def __init__(self, resolver: Callable[[str], str], default_ttl: float=3600.0, margin: float=60.0,
+               refresh_ahead: float=900.0, max_entries: int=200):
+    """
+    Param: resolver      - callable page URL -> stream URL, raising ResolveError
+           default_ttl   - seconds to keep stream URLs without an expiry
+           margin        - seconds before the expiry an entry is no longer used
+           refresh_ahead - seconds before the expiry an entry is resolved again in the background
+    """
+    self.resolver = resolver
+    self.default_ttl = default_ttl
+    self.margin = margin
+    self.refresh_ahead = refresh_ahead
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self._entries: Dict[str, ResolvedStream] = {}
+    self._refreshing = set()
+    self._lock = threading.Lock()
+
+  def resolve(self, page_url: str) -> str:
+    """
+    Return the stream URL of a page, from the cache if it is still valid
+    Raise: ResolveError
+    """
+    now = time.time()
+    with self._lock:
+      entry = self._entries.get(page_url)
+      if entry and entry.expires - self.margin > now:
+        self.hits += 1
+        self._entries[page_url] = self._entries.pop(page_url) # most recently used last
+        refresh = entry.expires - self.refresh_ahead <= now and page_url not in self._refreshing
+        if refresh:
+          self._refreshing.add(page_url)
+      else:
+        self.misses += 1
+        entry = None
+    if entry is None:
+      return self._resolve(page_url).stream_url
+    if refresh:
+      threading.Thread(target=self._refresh, args=(page_url,), name="StreamUrlCache", daemon=True).start()
+    return entry.stream_url
+
+  def _resolve(self, page_url: str) -> ResolvedStream:
+    stream_url = self.resolver(page_url)
+    expires = stream_expiry(stream_url) or time.time() + self.default_ttl
+    entry = ResolvedStream(stream_url, expires)
+    with self._lock:
+      self._entries.pop(page_url, None)
+      self._entries[page_url] = entry
+      while len(self._entries) > self.max_entries: # drop the least recently used
+        self._entries.pop(next(iter(self._entries)))
+    LOG.info(f"StreamUrlCache._resolve() {page_url} valid for {expires - time.time():.0f} seconds")
+    return entry
+
+  def _refresh(self, page_url: str):
+    try:
+      self._resolve(page_url)
+    except ResolveError as e:              # the cached URL stays until it expires
+      LOG.info(f"StreamUrlCache._refresh() {e}")
+    finally:
+      with self._lock:
+        self._refreshing.discard(page_url)
@@ -0,0 +1,393 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, \
+    Union
+
+VERSION = "0.23.5"
+TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+# mpd error codes
+ACK_ARG, ACK_PASSWORD, ACK_PERMISSION, ACK_UNKNOWN, ACK_NO_EXIST = \
+    2, 3, 4, 5, 50
+
+
+class Ack(Exception):
+    """
+    A command failed; sent as 'ACK [code@index] {command} message'
+    """
+    def __init__(self, code: int, message: str):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+
+class Dropped(Exception):
+    """
+    Close the connection without answering
+    """
+
+
+class _Indexed(Exception):
+    """
+    An Ack with the position of the failing command in its command list
+    """
+    def __init__(self, index: int, command: str, ack: Ack,
+                 results: Optional[list] = None):
+        Exception.__init__(self, ack.message)
+        self.index = index
+        self.command = command
+        self.ack = ack
+        # Responses of the commands that ran before the failing one
+        self.results = results or []
+
+    def line(self) -> str:
+        return f"ACK [{self.ack.code}@{self.index}] {{{self.command}}} " \
+               f"{self.ack.message}\n"
+
+
+def parse_line(line: str) -> Tuple[str, List[str]]:
+    """
+    Split a command line into the command and its unquoted arguments
+    """
+    args = [re.sub(r"\\(.)", r"\1", m.group(1)) if m.group(1) is not None
+            else m.group(2) for m in TOKEN.finditer(line)]
+    return (args[0].lower(), args[1:]) if args else ("", [])
+
+
+Answer = Union[str, List[Tuple[str, str]], Ack, Callable]
+
+
+class FakeMpdServer:
+    """
+    A scriptable mpd server for tests and benchmarks. It speaks the mpd
+    protocol with command lists, indexed ACKs, idle and passwords, and
+    serves every connection in its own thread.
+
+    A command is answered by `answers[name]` if given, else by a `cmd_<name>`
+    method of a subclass, else with a plain OK (or an ACK when `strict`).
+    An answer is the response text, a list of (key, value) pairs, an Ack to
+    fail with, or a callable taking the command arguments and returning or
+    raising one of those.
+
+    Faults are injected per round trip - one command or a whole list:
+    `latency` and `jitter` delay the answer, `failure_rate` answers with an
+    ACK, `drop_rate` closes the connection, `fail_commands` always fail and
+    `hang_up` closes the connection after every answer.
+    """
+    def __init__(self, answers: Optional[Dict[str, Answer]] = None,
+                 host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, drop_rate: float = 0.0,
+                 fail_commands: Iterable[str] = (), hang_up: bool = False,
+                 strict: bool = False, password: Optional[str] = None,
+                 record: bool = True, seed: int = 1):
+        """
+        :param answers: command name -> answer, see above
+        :param record: keep every command line in `commands`; benchmarks
+            only count them in `counts`
+        """
+        self.answers = dict(answers or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.fail_commands = set(fail_commands)
+        self.hang_up = hang_up
+        self.strict = strict
+        self.password = password
+        self.record = record
+        self.commands: List[str] = list()  # command lines, idle excluded
+        self.counts = Counter()            # commands by name
+        self.round_trips = 0               # requests answered, idle excluded
+        self.connections = 0               # connections accepted
+        self.injected = Counter()          # failures and drops injected
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._clients: Set[_Connection] = set()
+        self._server = socketserver.ThreadingTCPServer(
+            (host, port), _Connection, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        """
+        Listen and answer in background threads
+        """
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,), name="FakeMpd",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.commands = list()
+            self.counts = Counter()
+            self.round_trips = 0
+            self.injected = Counter()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"round_trips": self.round_trips,
+                    "commands": dict(self.counts),
+                    "injected": dict(self.injected)}
+
+    def notify(self, *subsystems: str):
+        """
+        Report changed subsystems to every client, as mpd does; a client
+        waiting in idle is woken up, the others get them with their next idle
+        """
+        with self._lock:
+            for client in self._clients:
+                client.changed.update(subsystems)
+
+    def execute(self, commands: List[Tuple[str, List[str], str]]) -> list:
+        """
+        Answer one round trip of commands after the injected latency
+        :param commands: (name, arguments, line) of each command
+        :returns: the response of each command
+        :raises _Indexed: for the failing command
+        :raises Dropped: when the connection should close
+        """
+        with self._lock:
+            self.round_trips += 1
+            self.counts.update(name for name, _, _ in commands)
+            if self.record:
+                self.commands.extend(line for _, _, line in commands)
+            delay = self.latency + (self._rng.uniform(0, self.jitter)
+                                    if self.jitter else 0.0)
+            drop = self.drop_rate and self._rng.random() < self.drop_rate
+            fail = self.failure_rate and \
+                self._rng.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if drop:
+            self.injected["drop"] += 1
+            raise Dropped()
+        if fail:
+            self.injected["failure"] += 1
+            raise _Indexed(0, commands[0][0],
+                           Ack(ACK_UNKNOWN, "injected failure"))
+        results = list()
+        for index, (name, args, _) in enumerate(commands):
+            try:
+                with self._lock:
+                    results.append(self._answer(name, args))
+            except TypeError:  # Wrong number of arguments
+                raise _Indexed(index, name,
+                               Ack(ACK_ARG, "wrong number of arguments"),
+                               results)
+            except Ack as e:  # The commands before it were run
+                raise _Indexed(index, name, e, results)
+        return results
+
+    def _answer(self, name: str, args: List[str]):
+        if name in self.fail_commands:
+            raise Ack(ACK_NO_EXIST, "injected failure")
+        answer = self.answers.get(name)
+        if answer is None:
+            answer = getattr(self, f"cmd_{name}", None)
+        if answer is None:
+            if self.strict:
+                raise Ack(ACK_UNKNOWN, f'unknown command "{name}"')
+            return []
+        if isinstance(answer, Ack):
+            raise answer
+        if callable(answer):
+            answer = answer(*args)
+        return answer
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    """
+    One client connection: the greeting, then commands, command lists and
+    idle until it closes
+    """
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.fake: FakeMpdServer = self.server.fake
+        self.changed: Set[str] = set()
+        self.authorized = self.fake.password is None
+        with self.fake._lock:
+            self.fake.connections += 1
+            self.fake._clients.add(self)
+
+    def finish(self):
+        with self.fake._lock:
+            self.fake._clients.discard(self)
+        socketserver.StreamRequestHandler.finish(self)
+
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._write(f"OK MPD {VERSION}\n")
+        while True:
+            line = self._read()
+            if line is None:
+                return
+            name, args = parse_line(line)
+            try:
+                if name in ("command_list_begin", "command_list_ok_begin"):
+                    if not self._command_list(
+                            name == "command_list_ok_begin"):
+                        return
+                elif name == "idle":
+                    if not self._idle(set(args)):
+                        return
+                    continue
+                elif name == "noidle":  # Not idle - nothing to stop
+                    self._write("OK\n")
+                    continue
+                elif name == "close":
+                    return
+                elif name == "password":
+                    if args != [self.fake.password]:
+                        raise _Indexed(0, name, Ack(ACK_PASSWORD,
+                                                    "incorrect password"))
+                    self.authorized = True
+                    self._write("OK\n")
+                    continue
+                else:
+                    self._check_permission(name)
+                    self._write(self._response(
+                        self.fake.execute([(name, args, line)]), False))
+            except _Indexed as e:
+                self._write(e.line())
+            except Dropped:
+                return
+            if self.fake.hang_up:
+                return
+
+    def _command_list(self, list_ok: bool) -> bool:
+        """
+        Read the commands up to command_list_end and answer them at once
+        """
+        commands = list()
+        while True:
+            line = self._read()
+            if line is None:
+                return False
+            name, args = parse_line(line)
+            if name == "command_list_end":
+                break
+            commands.append((name, args, line))
+        self._check_permission(commands[0][0] if commands else "")
+        if not commands:
+            self._write("OK\n")
+            return True
+        try:
+            self._write(self._response(self.fake.execute(commands), list_ok))
+        except _Indexed as e:  # mpd answers what ran, then the ACK
+            self._write(self._response(e.results, list_ok, end="") +
+                        e.line())
+        return True
+
+    def _idle(self, subsystems: Set[str]) -> bool:
+        """
+        Wait for a change or noidle; False when the client went away
+        """
+        while True:
+            with self.fake._lock:
+                changed = self.changed & subsystems if subsystems \
+                    else set(self.changed)
+                self.changed -= changed
+            if changed:
+                self._write("".join(f"changed: {name}\n"
+                                    for name in sorted(changed)) + "OK\n")
+                return True
+            readable, _, _ = select.select([self.request], [], [], 0.05)
+            if readable:
+                if self._read() is None:
+                    return False
+                self._write("OK\n")  # noidle or any command ends the wait
+                return True
+
+    def _check_permission(self, name: str):
+        if not self.authorized:
+            raise _Indexed(0, name, Ack(ACK_PERMISSION,
+                                        f'you don\'t have permission for '
+                                        f'"{name}"'))
+
+    @staticmethod
+    def _response(results: list, list_ok: bool, end: str = "OK\n") -> str:
+        lines = list()
+        for result in results:
+            if isinstance(result, str):
+                lines.append(result if not result or result.endswith("\n")
+                             else result + "\n")
+            else:
+                lines.extend(f"{key}: {value}\n" for key, value in result)
+            if list_ok:
+                lines.append("list_OK\n")
+        lines.append(end)
+        return "".join(lines)
+
+    def _read(self) -> Optional[str]:
+        try:
+            line = self.rfile.readline()
+        except OSError:
+            return None
+        return line.decode("utf-8", errors="replace").rstrip("\r\n") \
+            if line else None
+
+    def _write(self, text: str):
+        try:
+            self.wfile.write(text.encode("utf-8"))
+            self.wfile.flush()
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import unittest
+import pytest
+
+from io import BytesIO
+from os import chmod, listdir, stat, utime
+from os.path import dirname, isfile, join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+sys.path.append(dirname(dirname(__file__)))
+from util import MusicLibrary, Track
+from util.album_art import EMBEDDED_ART, AlbumArtCache
+
+COVER = b"cover 1" * 100
+
+
+class TestAlbumArtCache(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def test_add_and_evict(self):
+        cache = AlbumArtCache(self.make_tmp_dir(), max_bytes=2500)
+        path = cache.add(COVER, "/music/artist/album")
+        self.assertTrue(isfile(path))
+        self.assertEqual(cache.add(COVER, "/music/artist/album"), path)
+        # The same picture in another album is stored once
+        self.assertEqual(cache.add(COVER, "/music/other/album"), path)
+        self.assertNotEqual(cache.add(b"cover 2" * 100, "/music/artist/album"),
+                            path)
+        self.assertEqual(cache.used_bytes, 1400)
+
+        # Beyond the byte budget the least recently used art is evicted
+        utime(path, (0, 0))
+        path_3 = cache.add(b"cover 3" * 100, "/music/third/album")
+        path_4 = cache.add(b"cover 4" * 100, "/music/fourth/album")
+        self.assertIsNone(cache.get(path))
+        self.assertEqual(cache.get(path_4), path_4)
+        self.assertLessEqual(cache.used_bytes, 2500)
+        self.assertTrue(isfile(path_3))
+
+    def test_failed_write(self):
+        cache = AlbumArtCache(self.make_tmp_dir())
+        cache.add(COVER, "/music/artist/album")
+        # A failed write leaves no temporary file behind
+        with patch("util.album_art.replace", side_effect=OSError("full")):
+            with self.assertRaises(OSError):
+                cache.add(b"cover 5" * 100, "/music/fifth/album")
+        self.assertTrue(all(name.endswith(".jpg")
+                            for name in listdir(cache.art_path)))
+
+    def test_folder_jpg(self):
+        cache = AlbumArtCache(self.make_tmp_dir())
+        # A Folder.jpg in the music directory is used as is, never touched
+        folder_jpg = join(self.make_tmp_dir(), "Folder.jpg")
+        with open(folder_jpg, "wb") as f:
+            f.write(COVER)
+        utime(folder_jpg, (0, 0))
+        chmod(folder_jpg, 0o444)
+        self.assertEqual(cache.get(folder_jpg), folder_jpg)
+        self.assertEqual(stat(folder_jpg).st_mtime, 0)
+        self.assertIsNone(cache.get(join(dirname(folder_jpg), "gone.jpg")))
+
+    def test_thumbnail(self):
+        from PIL import Image
+        cache = AlbumArtCache(self.make_tmp_dir(), thumbnail_size=100)
+        output = BytesIO()
+        Image.new("RGB", (800, 400), "red").save(output, "PNG")
+        path = cache.add(output.getvalue(), "/music/artist/album")
+        with Image.open(path) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (100, 50))
+
+    def test_library_artwork(self):
+        # Art in the cache directory of older versions is removed
+        cache_dir = self.make_tmp_dir()
+        legacy = join(cache_dir, "0123456789abcdef0123456789abcdef.jpg")
+        with open(legacy, "wb") as f:
+            f.write(COVER)
+        lib = MusicLibrary(join(dirname(__file__), "test_music"), cache_dir)
+        self.assertFalse(isfile(legacy))
+        self.assertIsNone(lib.get_artwork(Track("/a.mp3", "Title")))
+
+        # Embedded art is extracted once, when it is first asked for
+        meta = MagicMock(pictures=[MagicMock(data=COVER)])
+        track = Track("/music/a.mp3", "Title", artwork=EMBEDDED_ART)
+        with patch("util.ovos_ocp_files_plugin.load",
+                   return_value=meta) as load:
+            artworks = lib.get_artworks([track, Track("/b.mp3", "B")],
+                                        timeout=5)
+            self.assertTrue(isfile(artworks[0]))
+            self.assertIsNone(artworks[1])
+            self.assertEqual(lib.get_artwork(track), artworks[0])
+            self.assertEqual(load.call_count, 1)
+
+
+if __name__ == '__main__':
+    pytest.main()
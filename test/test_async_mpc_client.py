@@ -0,0 +1,140 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import asyncio
+import sys
+import time
+import unittest
+import pytest
+
+from os.path import dirname
+from tempfile import TemporaryDirectory
+
+sys.path.append(dirname(dirname(__file__)))
+from fake_mpd_server import Ack, FakeMpdServer
+from async_mpc_client import AsyncMpcClient
+from mpc_client import MpcClient
+from mpd_connection import AsyncMpdConnection, MpdCommandError
+
+
+class TestAsyncMpdConnection(unittest.TestCase):
+    def test_commands(self):
+        server = FakeMpdServer({
+            "status": "volume: 50\nstate: play",
+            "load": Ack(50, "No such playlist"),
+            "add": Ack(50, "No such directory")}).start()
+        self.addCleanup(server.stop)
+
+        async def talk():
+            mpd = AsyncMpdConnection("127.0.0.1", server.port, timeout=2)
+            status = await mpd.command_dict("status")
+            with self.assertRaises(MpdCommandError):
+                await mpd.command("load", 'my "best" songs')
+            with self.assertRaises(MpdCommandError) as ctx:
+                await mpd.command_list([("clear",), ("add", "a.mp3")])
+            self.assertEqual(ctx.exception.index, 1)
+            # The connection is still usable after the errors
+            self.assertEqual(await mpd.command_dict("status"), status)
+            await mpd.close()
+            return status
+
+        self.assertEqual(asyncio.run(talk()),
+                         {"volume": "50", "state": "play"})
+        self.assertEqual(server.commands[1], 'load "my \\"best\\" songs"')
+
+
+class TestAsyncMpcClient(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeMpdServer({
+            "search": "file: a.mp3\nTitle: A\nTime: 60",
+            "listplaylists": "playlist: one\nplaylist: two",
+            "playlistinfo": "file: x.mp3\nfile: y.mp3",
+            "add": self.add},
+            latency=0.2).start()
+        self.addCleanup(self.server.stop)
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.client = MpcClient("/music/", "127.0.0.1", self.server.port,
+                                timeout=2, cache_dir=tmp_dir.name,
+                                resolver=lambda url: url)
+        self.client.catalog.watch = False
+        self.aio = AsyncMpcClient(self.client)
+
+    @staticmethod
+    def add(uri):
+        if uri.endswith("b.mp3"):
+            raise Ack(50, "No such directory")
+        return ""
+
+    def tearDown(self):
+        self.aio.close()
+        self.client.close()
+
+    def test_facade(self):
+        self.assertEqual(self.aio.run(self.aio.list_playlists()),
+                         ("list_playlists", {"playlists": "one and two"}))
+        music_info = self.aio.run(self.aio.get_playlist("my list"))
+        self.assertEqual(music_info.match_type, "playlist")
+        self.assertEqual(music_info.tracks, ["x.mp3", "y.mp3"])
+        self.assertIn('load "my_list"', self.server.commands)
+
+    def test_enqueue(self):
+        tracks = ["http://host/a.mp3", "http://host/b.mp3",
+                  "http://host/c.mp3"]
+        result = self.aio.run(self.aio.enqueue(tracks))
+        self.assertEqual(result.queued, [tracks[0], tracks[2]])
+        self.assertEqual(result.failed, [(tracks[1], "No such directory")])
+        self.assertTrue(result.playing)
+        # The rest is sent again without the refused track
+        self.assertEqual(self.server.commands[-2:],
+                         ['add "http://host/c.mp3"', "play"])
+        self.assertEqual(self.server.round_trips, 2)
+
+    def test_cached_youtube_search(self):
+        key = self.client.youtube_key("some song", 5)
+        self.client.search_cache.put(key, [{"title": "Some song",
+                                            "url_suffix": "/watch?v=1"}])
+        music_info = self.aio.run(self.aio.search_internet(
+            "play some song on youtube"))
+        self.assertEqual(music_info.tracks, ["http://youtube.com/watch?v=1"])
+        self.assertEqual(self.client.search_cache.hits, 1)
+
+    def test_concurrent_searches(self):
+        # Each search waits 0.2 seconds for mpd - the catalog is loaded
+        # in the background, so these are answered by mpd
+        futures = [self.aio.submit(self.aio.search_music(
+            "search", "title", str(n))) for n in range(3)]
+        start = time.monotonic()
+        results = [future.result(5) for future in futures]
+        self.assertEqual(results, [[["", "", "A", "1:00", "a.mp3", ""]]] * 3)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+if __name__ == '__main__':
+    pytest.main()
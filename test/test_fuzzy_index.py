@@ -0,0 +1,60 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import unittest
+import pytest
+
+from os.path import dirname
+
+sys.path.append(dirname(dirname(__file__)))
+from util.fuzzy_index import FuzzyIndex, phonetic_key
+
+
+class TestFuzzyIndex(unittest.TestCase):
+    def test_lookup(self):
+        self.assertEqual(phonetic_key("Beyoncé"), phonetic_key("beyonse"))
+        self.assertEqual(phonetic_key("Led Zeppelin"),
+                         phonetic_key("led zepplin"))
+        index = FuzzyIndex({"artist": ["Beyoncé", "Led Zeppelin",
+                                       "Cheap Trick"],
+                            "album": ["Led Zeppelin IV", "Abbey Road"]})
+        self.assertEqual(len(index), 5)
+        matches = index.lookup("led zepplin")
+        self.assertEqual(matches[0].name, "Led Zeppelin")
+        self.assertEqual(matches[1].name, "Led Zeppelin IV")
+        self.assertGreater(matches[0].score, matches[1].score)
+        self.assertEqual(index.lookup("led zepplin", ["album"])[0].tag,
+                         "album")
+        self.assertEqual(index.lookup("beyonse")[0].name, "Beyoncé")
+        self.assertEqual(index.lookup("abby road")[0].name, "Abbey Road")
+        self.assertEqual(index.lookup("mozart"), [])
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,118 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import stat
+import sys
+import time
+import unittest
+import pytest
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.append(dirname(dirname(__file__)))
+from fake_mpd_server import FakeMpdServer
+from mpc_client import MpcClient
+from music_info import Music_info
+from stream_resolver import YtDlpResolver
+
+# Stand-in for ytadd: sleeps for the seconds after "v=", fails for "v=bad"
+YTADD = """#!/bin/sh
+case "$1" in *v=bad) exit 1;; esac
+sleep "${1##*v=}"
+echo "$1" >> "$(dirname "$0")/added"
+"""
+
+
+class TestInternetStreaming(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.mpd = FakeMpdServer().start()
+        self.addCleanup(self.mpd.stop)
+
+    def test_first_stream_plays_first(self):
+        tmp_dir = self.tmp_dir
+        ytadd = join(tmp_dir, "ytadd")
+        with open(ytadd, "w") as f:
+            f.write(YTADD)
+        os.chmod(ytadd, stat.S_IRWXU)
+        mpd = self.mpd
+        # ytadd queues streams unless a resolver is chosen, also when
+        # yt-dlp is installed
+        with patch.object(YtDlpResolver, "available", return_value=True):
+            client = MpcClient("/music/", "127.0.0.1", mpd.port, timeout=2,
+                               cache_dir=tmp_dir)
+        self.addCleanup(client.close)
+        self.assertIsNone(client.stream_cache)
+        client.ytadd = ytadd
+        urls = ["http://youtube.com/watch?v=1.0",
+                "http://youtube.com/watch?v=bad",
+                "http://youtube.com/watch?v=0.2"]
+        start = time.monotonic()
+        self.assertTrue(client.stream_internet_music(
+            Music_info("internet", None, None, urls)))
+        # Playing starts with the fastest stream, not after all of them
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(mpd.commands, ["clear", "play"])
+        with open(join(tmp_dir, "added")) as f:
+            self.assertEqual(f.read().split(), [urls[2]])
+        # The slower stream is appended when it is resolved
+        client._ytadd_pool.shutdown(wait=True)
+        with open(join(tmp_dir, "added")) as f:
+            self.assertEqual(f.read().split(), [urls[2], urls[0]])
+
+    def test_replay_skips_resolution(self):
+        resolved = []
+
+        def resolver(url):
+            resolved.append(url)
+            expire = int(time.time()) + 6 * 3600
+            return f"https://stream.example/{url[-1]}?expire={expire}"
+
+        mpd = self.mpd
+        client = MpcClient("/music/", "127.0.0.1", mpd.port, timeout=2,
+                           cache_dir=self.tmp_dir, resolver=resolver)
+        self.addCleanup(client.close)
+        urls = ["http://youtube.com/watch?v=a"]
+        for _ in range(2):
+            self.assertTrue(client.stream_internet_music(
+                Music_info("internet", None, None, urls)))
+        self.assertEqual(resolved, urls)
+        self.assertEqual(client.stream_cache.hits, 1)
+        added = [command for command in mpd.commands
+                 if command.startswith("add")]
+        self.assertEqual(len(added), 2)
+        self.assertIn("https://stream.example/a?expire=", added[1])
+
+
+if __name__ == '__main__':
+    pytest.main()
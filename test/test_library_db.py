@@ -0,0 +1,150 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sqlite3
+import sys
+import unittest
+import pytest
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest.mock import patch
+
+sys.path.append(dirname(dirname(__file__)))
+from util import Track
+from util.library_db import LibraryDB
+from util.search_index import normalize, phrases
+
+
+def open_files(path: str) -> int:
+    """
+    Count the file descriptors of this process that are open on `path`
+    """
+    count = 0
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}") == path:
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+class TestLibraryDB(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def test_tracks_and_search(self):
+        self.assertEqual(normalize("Beyoncé - Déjà Vu!"), "beyonce deja vu")
+        self.assertEqual(normalize("  AC/DC "), "ac dc")
+        self.assertEqual(phrases("Artist 1 test"),
+                         ["artist", "artist 1", "artist 1 test", "1",
+                          "1 test", "test"])
+        self.assertEqual(phrases("Artist 1 test", 2),
+                         ["artist", "artist 1", "1", "1 test", "test"])
+
+        db = LibraryDB(join(self.make_tmp_dir(), "library.sqlite"))
+        self.addCleanup(db.close)
+        db.put_track(Track("/a.mp3", "Déjà Vu", "B'Day", "Beyoncé", "R&B"),
+                     (1, 2, 3))
+        db.put_track(Track("/b.mp3", "Halo", "I Am... Sasha Fierce",
+                           "Beyoncé", track="2/12"), None)
+        db.put_track(Track("/c.mp3", "Vu", None, "Someone Else"), None)
+        db.commit()
+        self.assertEqual(len(db), 3)
+        self.assertEqual([row[0] for row in
+                          db.search_field("artist", "play beyonce please")],
+                         ["/a.mp3", "/b.mp3"])
+        self.assertEqual([row[0] for row in
+                          db.search_field("title", "deja vu")],
+                         ["/a.mp3", "/c.mp3"])
+        self.assertEqual(db.search_field("artist", "someone"), [])
+        self.assertEqual(db.get_track("/b.mp3")[-1], 2)
+        self.assertEqual([row[0] for row in db.search_text("sasha fier")],
+                         ["/b.mp3"])
+        self.assertEqual(db.dir_fingerprints("/"),
+                         {"/a.mp3": (1, 2, 3), "/b.mp3": (None, None, None),
+                          "/c.mp3": (None, None, None)})
+
+        # Updating a track keeps its position
+        db.put_track(Track("/a.mp3", "Halo", "Halo", "Beyoncé"), None)
+        db.delete_tracks(["/c.mp3"])
+        db.commit()
+        self.assertEqual([row[0] for row in db.search_field("title", "halo")],
+                         ["/a.mp3", "/b.mp3"])
+        self.assertEqual(db.search_text("deja"), [])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs procfs")
+    def test_reader_connections(self):
+        db_file = join(self.make_tmp_dir(), "library.sqlite")
+        db = LibraryDB(db_file)
+        db.put_track(Track("/a.mp3", "Halo", "Halo", "Beyoncé"), None)
+        db.commit()
+        # Each thread reads through its own connection, and those of ended
+        # threads are closed when another one is opened
+        for _ in range(10):
+            thread = Thread(target=db.get_track, args=("/a.mp3",))
+            thread.start()
+            thread.join()
+        self.assertEqual(db.get_track("/a.mp3")[1], "Halo")
+        self.assertLess(open_files(db_file), 10)
+        db.close()
+        self.assertEqual(open_files(db_file), 0)
+
+    def test_search_field_long_query(self):
+        connect = sqlite3.connect
+
+        def old_sqlite_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+            return conn
+
+        # Limit bound parameters like SQLite builds before 3.32 do
+        patcher = patch("sqlite3.connect", old_sqlite_connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        db = LibraryDB(join(self.make_tmp_dir(), "library.sqlite"))
+        self.addCleanup(db.close)
+        db.put_track(Track("/a.mp3", "Halo", "Halo", "Beyoncé"), None)
+        db.put_track(Track("/b.mp3", "Vu", None, "Someone Else"), None)
+        db.commit()
+        # A long utterance has more phrases than SQLite binds in a statement
+        words = [f"word{i}" for i in range(60)]
+        query = " ".join(words[:30] + ["someone", "else"] + words[30:] +
+                         ["beyonce"])
+        self.assertEqual([row[0] for row in
+                          db.search_field("artist", query)],
+                         ["/a.mp3", "/b.mp3"])
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,215 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import unittest
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest.mock import patch
+
+sys.path.append(dirname(dirname(__file__)))
+from fake_mpd_server import FakeMpdServer
+from mpd_catalog import MpdCatalog
+from mpd_connection import MpdConnection
+
+
+class _FakeMpd(FakeMpdServer):
+    """
+    Serve a small database; `notify("database")` wakes up clients in idle
+    """
+    def __init__(self):
+        FakeMpdServer.__init__(self)
+        self.database = {
+            "": "directory: Artist 1\nfile: Test_Track.mp3\n"
+                "Title: Test Track\nGenre: Alternative\n",
+            "Artist 1": "directory: Artist 1/Album 1\n"
+                        "file: Artist 1/Album 1/01 Track one.mp3\n"
+                        "Artist: Artist 1\nAlbum: Album 1\n"
+                        "Title: Track one\nGenre: Rock\n"
+                        "file: Artist 1/Album 1/02 Track 2.mp3\n"
+                        "Artist: Artist 1\nAlbum: Album 1\n"
+                        "Title: Track 2\nGenre: Rock\n"}
+
+    def cmd_lsinfo(self, directory=""):
+        return self.database[directory]
+
+    def cmd_listallinfo(self, directory=""):
+        return self.database[directory]
+
+
+class TestMpdCatalog(unittest.TestCase):
+    def test_query(self):
+        server = _FakeMpd().start()
+        self.addCleanup(server.stop)
+        catalog = MpdCatalog(MpdConnection("127.0.0.1", server.port,
+                                           timeout=2), watch=False)
+        catalog.refresh()
+        songs = catalog.query("listallinfo")
+        self.assertEqual([song.file for song in songs],
+                         ["Test_Track.mp3",
+                          "Artist 1/Album 1/01 Track one.mp3",
+                          "Artist 1/Album 1/02 Track 2.mp3"])
+        self.assertEqual(len(catalog.query("search", "title", "TRACK")), 3)
+        self.assertEqual(len(catalog.query("search", "title", "track",
+                                           "genre", "rock")), 2)
+        self.assertEqual(catalog.query("find", "title", "track"), [])
+        self.assertEqual(catalog.query("find", "title", "track one"),
+                         [songs[1]])
+        self.assertEqual(len(catalog.query("search", "any", "alter")), 1)
+        self.assertIsNone(catalog.query("search", "composer", "x"))
+        self.assertIsNone(catalog.query("playlistinfo"))
+        # Everything was answered from one listing
+        self.assertEqual(server.commands,
+                         ["lsinfo", 'listallinfo "Artist 1"'])
+
+    def test_search_fields(self):
+        server = _FakeMpd().start()
+        self.addCleanup(server.stop)
+        catalog = MpdCatalog(MpdConnection("127.0.0.1", server.port,
+                                           timeout=2), watch=False)
+        catalog.refresh()
+        matches = catalog.search_fields("artist 1")
+        self.assertEqual(set(matches), {"artist", "album", "title"})
+        self.assertEqual(len(matches["artist"].exact), 2)
+        self.assertEqual(matches["album"].songs, [])
+        matches = catalog.search_fields("track")
+        self.assertEqual(len(matches["title"].songs), 3)
+        self.assertEqual(matches["title"].exact, [])
+        self.assertEqual(catalog.search_fields("track 2")["title"].exact,
+                         catalog.query("find", "title", "track 2"))
+
+    def test_stale_catalog_answered_by_mpd(self):
+        server = _FakeMpd()
+        server.latency = 0.5  # Loading takes two round trips
+        server.answers["search"] = "file: Artist 1/Album 1/01 Track one.mp3\n" \
+                                   "Artist: Artist 1\nAlbum: Album 1\n" \
+                                   "Title: Track one\n"
+        server.start()
+        self.addCleanup(server.stop)
+        catalog = MpdCatalog(MpdConnection("127.0.0.1", server.port,
+                                           timeout=2), watch=False)
+        # Concurrent first requests start one load and are left to mpd
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(
+                lambda _: catalog.query("search", "title", "track"),
+                range(4)))
+        self.assertEqual(results, [None] * 4)
+        matches = catalog.search_fields("track one", ("title", "album"))
+        self.assertEqual(len(matches["title"].exact), 1)
+        self.assertEqual(matches["album"].exact, [])
+        self.assertEqual(catalog.fuzzy_lookup("artist won"), [])
+        for _ in range(50):
+            if not catalog.stale:
+                break
+            sleep(0.1)
+        self.assertEqual(len(catalog.query("search", "title", "track")), 3)
+        self.assertEqual(server.commands.count('listallinfo "Artist 1"'), 1)
+        self.assertEqual(catalog.fuzzy_lookup("artist won")[0].name,
+                         "artist 1")
+
+    def test_get_unknown_music(self):
+        from mpc_client import MpcClient
+        server = _FakeMpd().start()
+        self.addCleanup(server.stop)
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        client = MpcClient("/music/", "127.0.0.1", server.port, timeout=2,
+                           cache_dir=tmp_dir.name)
+        self.addCleanup(client.close)
+        client.catalog.watch = False
+        client.catalog.refresh()
+        album = client.get_unknown_music("album 1", "unknown_artist")
+        self.assertEqual(album.match_type, "album")
+        self.assertEqual([track.title for track in album.tracks],
+                         ["Track one", "Track 2"])
+        song = client.get_unknown_music("test track", "unknown_artist")
+        self.assertEqual(song.match_type, "song")
+        self.assertEqual(song.tracks[0].path, '"/music/Test_Track.mp3"')
+        self.assertEqual(client.get_unknown_music("nothing", None).match_type,
+                         "none")
+        # One listing answered all three requests
+        self.assertEqual(server.commands,
+                         ["lsinfo", 'listallinfo "Artist 1"'])
+
+    def test_get_music_fuzzy(self):
+        from mpc_client import MpcClient
+        server = _FakeMpd().start()
+        self.addCleanup(server.stop)
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        client = MpcClient("/music/", "127.0.0.1", server.port, timeout=2,
+                           cache_dir=tmp_dir.name)
+        self.addCleanup(client.close)
+        client.catalog.watch = False
+        client.catalog.refresh()
+        self.assertEqual(client.catalog.fuzzy_lookup("artist won")[0].name,
+                         "artist 1")
+        # Misheard album and artist are corrected
+        album = client.get_music("album_artist", "albun 1", "artist won")
+        self.assertEqual(album.match_type, "album")
+        self.assertEqual(len(album.tracks), 2)
+        self.assertEqual(client.get_music("track", "trak one",
+                                          "unknown_artist").match_type,
+                         "song")
+        self.assertEqual(client.get_music("album", "mozart",
+                                          "unknown_artist").match_type,
+                         "none")
+
+    def test_reload_on_database_change(self):
+        server = _FakeMpd().start()
+        self.addCleanup(server.stop)
+        catalog = MpdCatalog(MpdConnection("127.0.0.1", server.port,
+                                           timeout=2))
+        catalog.refresh()
+        self.assertEqual(len(catalog.query("search", "album", "album")), 2)
+        # Changes are reported to the connections open at the time
+        for _ in range(50):
+            if server.connections == 2:
+                break
+            sleep(0.1)
+        server.database["Artist 1"] = ""
+        # The reload leaves the connection of the requests free
+        with patch.object(catalog.mpd, "command",
+                          side_effect=AssertionError("reloaded on mpd")):
+            server.notify("database")
+            for _ in range(50):
+                if not catalog.query("search", "album", "album"):
+                    break
+                sleep(0.1)
+        self.assertEqual(catalog.query("search", "album", "album"), [])
+        self.assertEqual(len(catalog), 1)
+        catalog.close()
+        self.assertFalse(catalog._watcher.is_alive())
+
+
+if __name__ == '__main__':
+    pytest.main()
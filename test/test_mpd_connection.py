@@ -0,0 +1,125 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import unittest
+import pytest
+
+from os.path import dirname
+from tempfile import TemporaryDirectory
+
+sys.path.append(dirname(dirname(__file__)))
+from fake_mpd_server import Ack, FakeMpdServer
+from mpd_connection import MpdConnection, MpdCommandError, MpdSong, parse_songs
+
+
+class TestMpdConnection(unittest.TestCase):
+    def test_parse_songs(self):
+        pairs = [("directory", "Artist 1"),
+                 ("file", "Artist 1/Album 1/01 Track one.mp3"),
+                 ("Artist", "Artist 1"), ("Album", "Album 1"),
+                 ("Title", "Track one"), ("Track", "1/12"),
+                 ("Time", "65"), ("duration", "65.250"),
+                 ("file", "Test_Track.mp3"), ("Genre", "Alternative"),
+                 ("Time", "3725")]
+        songs = parse_songs(pairs)
+        self.assertEqual(len(songs), 2)
+        self.assertEqual(songs[0], MpdSong("Artist 1/Album 1/01 Track one.mp3",
+                                           "Artist 1", "Album 1", "Track one",
+                                           "", 65.25, 1))
+        self.assertEqual(songs[0].time_str, "1:05")
+        self.assertEqual(songs[1].time_str, "1:02:05")
+        self.assertEqual(songs[1].to_fields(),
+                         ["", "", "", "1:02:05", "Test_Track.mp3",
+                          "Alternative"])
+
+    def test_ack(self):
+        error = MpdCommandError.from_ack(
+            "ACK [50@0] {load} No such playlist")
+        self.assertEqual(error.code, 50)
+        self.assertEqual(error.index, 0)
+        self.assertEqual(error.command, "load")
+        self.assertEqual(error.message, "No such playlist")
+
+    def test_command_and_reconnect(self):
+        server = FakeMpdServer({"status": "volume: 50\nstate: play",
+                                "load": Ack(50, "No such playlist")},
+                               hang_up=True).start()
+        self.addCleanup(server.stop)
+        mpd = MpdConnection("127.0.0.1", server.port, timeout=2)
+        self.addCleanup(mpd.close)
+        self.assertEqual(mpd.command_dict("status"),
+                         {"volume": "50", "state": "play"})
+        # The server hung up - the next command has to reconnect
+        with self.assertRaises(MpdCommandError) as ctx:
+            mpd.command("load", 'my "best" songs')
+        self.assertEqual(ctx.exception.message, "No such playlist")
+        self.assertEqual(server.commands,
+                         ["status", 'load "my \\"best\\" songs"'])
+        self.assertEqual(server.connections, 2)
+
+    def test_command_list(self):
+        def add(uri):
+            if uri == "b.mp3":
+                raise Ack(50, "No such directory")
+            return ""
+
+        server = FakeMpdServer({"add": add}).start()
+        self.addCleanup(server.stop)
+        mpd = MpdConnection("127.0.0.1", server.port, timeout=2)
+        self.addCleanup(mpd.close)
+        with self.assertRaises(MpdCommandError) as ctx:
+            mpd.command_list([("clear",), ("add", "a.mp3"), ("add", "b.mp3"),
+                              ("play",)])
+        self.assertEqual(ctx.exception.index, 2)
+        self.assertEqual(ctx.exception.command, "add")
+        self.assertEqual(server.commands,
+                         ["clear", 'add "a.mp3"', 'add "b.mp3"', "play"])
+        self.assertEqual(server.round_trips, 1)
+
+    def test_mpc_commands_without_mpd(self):
+        from mpc_client import MpcClient
+        server = FakeMpdServer({"status": "state: stop"}).start()
+        self.addCleanup(server.stop)
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        client = MpcClient("/music/", "127.0.0.1", server.port, timeout=2,
+                           cache_dir=tmp_dir.name)
+        self.addCleanup(client.close)
+        self.assertEqual(client.mpc_update(), 0)
+        self.assertEqual(server.commands, ["update", "status"])
+        # mpd is down - failures are reported, not raised
+        server.stop()
+        client = MpcClient("/music/", "127.0.0.1", server.port, timeout=2,
+                           cache_dir=tmp_dir.name)
+        self.addCleanup(client.close)
+        self.assertEqual(client.mpc_update(), 1)
+        self.assertEqual(client.mpc_cmd("play"), 1)
+
+if __name__ == '__main__':
+    pytest.main()
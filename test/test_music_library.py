@@ -0,0 +1,143 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pickle
+import sys
+import unittest
+import pytest
+
+from os import remove, utime
+from os.path import dirname, join
+from shutil import copy, copytree
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.append(dirname(dirname(__file__)))
+from util import MusicLibrary, Track
+
+
+class TestMusicLibrary(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def make_music_dir(self) -> str:
+        """
+        Copy the test music to a temporary directory that tests may change
+        """
+        lib_dir = join(self.make_tmp_dir(), "music")
+        copytree(join(dirname(__file__), "test_music"), lib_dir)
+        return lib_dir
+
+    def test_incremental_update(self):
+        lib_dir = self.make_music_dir()
+        lib = MusicLibrary(lib_dir, self.make_tmp_dir())
+        changes = lib.update_library()
+        self.assertEqual(len(changes.added), 5)
+        self.assertFalse(lib.update_library())
+
+        album_1 = join(lib_dir, "Artist 1", "Album 1")
+        new_file = join(album_1, "03 Track three.mp3")
+        copy(join(lib_dir, "Test_Track.mp3"), new_file)
+        remove(join(album_1, "02 Track 2.wma"))
+        changes = lib.update_library()
+        self.assertEqual(changes.added, [new_file])
+        self.assertEqual(changes.removed, [join(album_1, "02 Track 2.wma")])
+        self.assertEqual(changes.changed, [])
+        self.assertEqual(len(lib), 5)
+
+        # In-place edits do not touch the directory; a full rescan finds them
+        utime(new_file, ns=(1, 1))
+        self.assertFalse(lib.update_library())
+        self.assertEqual(lib.update_library(full=True).changed, [new_file])
+
+    def test_parallel_scan(self):
+        lib_dir = self.make_music_dir()
+        serial = MusicLibrary(lib_dir, self.make_tmp_dir(), scan_workers=1)
+        serial.update_library()
+        expected = list(serial.all_songs)
+        self.assertEqual(len(expected), 5)
+        self.assertEqual((serial.scan_progress.total,
+                          serial.scan_progress.done), (5, 5))
+        self.assertFalse(serial.scan_progress.running)
+
+        # Worker processes only get the cache path, not the tracks; tracks
+        # are merged in the order they were found, whichever worker
+        # finishes first
+        lib = MusicLibrary(lib_dir, self.make_tmp_dir(), scan_workers=3,
+                           scan_processes=True)
+        lib.update_library()
+        self.assertLess(len(pickle.dumps(lib)), len(lib.cache_path) + 200)
+        self.assertEqual(pickle.loads(pickle.dumps(lib)).cache_path,
+                         lib.cache_path)
+        self.assertEqual(list(lib.all_songs), expected)
+        self.assertEqual((lib.scan_progress.total, lib.scan_progress.done),
+                         (5, 5))
+
+        # A file whose parser raises is indexed from its path
+        failing = join(lib_dir, "Test_Track.mp3")
+        parse = MusicLibrary._parse_track_from_file
+
+        def parse_or_fail(library, file_path, album_art=None):
+            if file_path == failing:
+                raise RuntimeError("parser crashed")
+            return parse(library, file_path, album_art)
+
+        lib = MusicLibrary(lib_dir, self.make_tmp_dir(), scan_workers=3)
+        with patch.object(MusicLibrary, "_parse_track_from_file",
+                          parse_or_fail):
+            lib.update_library()
+        self.assertEqual(lib.get_song(failing).title,
+                         MusicLibrary.song_from_file_path(failing).title)
+        self.assertEqual([track.path for track in lib.all_songs],
+                         [track.path for track in expected])
+        self.assertFalse(lib.scan_progress.running)
+
+    def test_track_storage(self):
+        track = Track("/a.mp3", "Title", "Album", "Artist", track=2)
+        self.assertFalse(hasattr(track, "__dict__"))
+        self.assertEqual(pickle.loads(pickle.dumps(track)), track)
+
+        lib = MusicLibrary(self.make_music_dir(), self.make_tmp_dir())
+        lib.update_library()
+        album_1 = lib.search_songs_for_album("album 1")
+        self.assertEqual(len(album_1), 2)
+        # Repeated metadata is shared between tracks
+        self.assertIs(album_1[0].artist, album_1[1].artist)
+        self.assertIs(album_1[0].artist,
+                      lib.search_songs_for_artist("artist 1")[0].artist)
+        self.assertNotIsInstance(lib.all_songs, list)
+        self.assertEqual(len(list(lib.all_songs)), 5)
+        usage = lib.memory_usage()
+        self.assertEqual(usage["tracks"], 5)
+        self.assertGreater(usage["db_bytes"], 0)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,146 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import sys
+import unittest
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import basename, dirname
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+sys.path.append(dirname(dirname(__file__)))
+from news_fetcher import NewsError, NewsFetcher
+
+
+class _Podcast(BaseHTTPRequestHandler):
+    """
+    Podcast page with an ETag pointing at the current episode; like NPR
+    News Now, every episode has the same file name
+    """
+    episode = "ep1"
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        etag = f'"{self.episode}"'
+        if self.path == "/podcast":
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = ('<script>{"audioUrl":"http:\\/\\/%s:%d\\/%s\\/news-now.mp3?x=1"}'
+                    '</script>' % (*self.server.server_address,
+                                   self.episode)).encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+        elif self.path.endswith(".mp3"):
+            body = self.path.encode() * 1000
+            self.send_response(200)
+        else:
+            body = b""
+            self.send_response(404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestNewsFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Podcast)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = "http://%s:%d" % cls.server.server_address
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def setUp(self):
+        _Podcast.episode = "ep1"
+        _Podcast.requests = []
+
+    def test_episode_downloaded_once(self):
+        cache_dir = self.make_tmp_dir()
+        fetcher = NewsFetcher(cache_dir, self.base + "/podcast")
+        file_name = fetcher.fetch()
+        self.assertEqual(dirname(file_name), cache_dir)
+        self.assertTrue(file_name.endswith(".mp3"))
+        with open(file_name, "rb") as f:
+            self.assertEqual(f.read(), b"/ep1/news-now.mp3" * 1000)
+        self.assertEqual(fetcher.fetch(), file_name)
+        # The second page request is conditional and the episode is
+        # not downloaded again
+        self.assertEqual(_Podcast.requests, [("/podcast", None),
+                                             ("/ep1/news-now.mp3", None),
+                                             ("/podcast", '"ep1"')])
+
+        # A new episode with the same file name replaces the old one
+        _Podcast.episode = "ep2"
+        new_file_name = fetcher.fetch()
+        self.assertNotEqual(new_file_name, file_name)
+        with open(new_file_name, "rb") as f:
+            self.assertEqual(f.read(), b"/ep2/news-now.mp3" * 1000)
+        self.assertEqual(sorted(os.listdir(cache_dir)),
+                         sorted([basename(new_file_name),
+                                 "news.json"]))
+        fetcher.close()
+
+        # The validators survive a restart
+        fetcher = NewsFetcher(cache_dir, self.base + "/podcast")
+        _Podcast.requests = []
+        self.assertEqual(fetcher.fetch(), new_file_name)
+        self.assertEqual(_Podcast.requests, [("/podcast", '"ep2"')])
+        fetcher.close()
+
+    def test_stream_url(self):
+        fetcher = NewsFetcher(self.make_tmp_dir(), self.base + "/podcast",
+                              download=False)
+        self.assertEqual(fetcher.fetch(), self.base + "/ep1/news-now.mp3")
+        fetcher.close()
+
+    def test_errors(self):
+        fetcher = NewsFetcher(self.make_tmp_dir(), self.base + "/missing")
+        with self.assertRaises(NewsError):
+            fetcher.fetch()
+        fetcher.close()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -29,6 +29,7 @@
 import pytest
 
 from os.path import dirname, join, isfile, isdir
+from tempfile import TemporaryDirectory
 from neon_minerva.tests.skill_unit_test_base import SkillTestCase
 
 
@@ -39,6 +40,11 @@ class TestSkillMethods(SkillTestCase):
         cls.skill.settings['music_dir'] = join(dirname(__file__), "test_music")
         cls.skill.initialize()
 
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
     def test_00_skill_init(self):
         # Test any parameters expected to be set in init or initialize methods
         from ovos_workshop.skills.common_play import OVOSCommonPlaybackSkill
@@ -48,6 +54,8 @@ class TestSkillMethods(SkillTestCase):
         self.assertIsInstance(self.skill.demo_url, str)
         self.assertIsNotNone(self.skill.music_library)
         self.assertTrue(self.skill.library_update_event.wait())
+        # The warm-up gives up on mpd if it is not running
+        self.assertTrue(self.skill.search_ready.is_set())
         # Ensure library reflects settings overrides
         self.skill.update_library()
         self.assertTrue(self.skill.library_update_event.wait())
@@ -75,6 +83,60 @@ class TestSkillMethods(SkillTestCase):
         self.assertEqual(len(track_1), 1)
         self.assertEqual(track_1[0].title, "Track one")
 
+    def test_music_library_built_once(self):
+        from concurrent.futures import ThreadPoolExecutor
+        built = self.skill._music_library
+        self.addCleanup(setattr, self.skill, "_music_library", built)
+        self.skill._music_library = None
+        # The warm-up and a search asking at the same time share one library
+        with ThreadPoolExecutor(4) as pool:
+            libraries = list(pool.map(lambda _: self.skill.music_library,
+                                      range(8)))
+        self.assertTrue(all(lib is libraries[0] for lib in libraries))
+
+    def test_search_results_artwork(self):
+        from shutil import copytree
+        from unittest.mock import patch
+        from mpd_connection import MpdSong
+        from music_info import Music_info
+        from util import MusicLibrary
+        lib_dir = join(self.make_tmp_dir(), "music")
+        copytree(join(dirname(__file__), "test_music"), lib_dir)
+        cover = join(lib_dir, "Artist 1", "Album 1", "Folder.jpg")
+        with open(cover, "wb") as f:
+            f.write(b"cover" * 100)
+        library = MusicLibrary(lib_dir, self.make_tmp_dir())
+        library.update_library()
+        self.addCleanup(setattr, self.skill, "_music_library",
+                        self.skill._music_library)
+        self.skill._music_library = library
+        self.addCleanup(self.skill.settings.__setitem__, "music_dir",
+                        self.skill.settings["music_dir"])
+        self.skill.settings["music_dir"] = lib_dir
+
+        # mpd results are quoted paths under the MpcClient music directory
+        client = self.skill.mpc_client
+        song = client.song_to_track(MpdSong(
+            "Artist 1/Album 1/01 Track one.mp3", "Artist 1", "Album 1",
+            "Track one"))
+        music_info = Music_info("song", "playing_song", {}, [song])
+        with patch.object(client, "search_library", return_value=music_info):
+            results = self.skill.search_music("play track one")
+        self.assertEqual(results[0]["uri"], song.path)
+        self.assertEqual(results[0]["image"], cover)
+
+    def test_warm_up_full_scan(self):
+        from unittest.mock import patch
+        self.assertTrue(self.skill.library_update_event.wait(30))
+        self.addCleanup(self.skill.settings.__setitem__, "watch_library",
+                        self.skill.settings.get("watch_library", True))
+        self.skill.settings["watch_library"] = False
+        # Tags may have been edited while the skill was not running
+        with patch.object(self.skill.music_library,
+                          "update_library") as update_library:
+            self.skill.warm_up()
+        update_library.assert_called_once_with(full=True)
+
     def test_parse_track_from_file_path(self):
         method = self.skill.music_library._parse_track_from_file
 
@@ -104,16 +166,16 @@ class TestSkillMethods(SkillTestCase):
         self.assertTrue(isdir(test_dir))
 
     def test_update_library(self):
-        real_songs = self.skill.music_library._songs
-        mock_songs = dict()
-        self.skill.music_library._songs = mock_songs
+        from util import MusicLibrary
         test_dir = join(dirname(__file__), "test_music")
-        self.skill.music_library.update_library(test_dir)
-        self.assertGreaterEqual(len(mock_songs.keys()), 1)
-        self.assertIsNone(mock_songs.get(join(test_dir, ".ds_store")))
-        self.assertIsNone(mock_songs.get(join(test_dir, "desktop")))
+        library = MusicLibrary(test_dir, self.make_tmp_dir())
+        library.update_library(test_dir)
+        indexed = [track.path for track in library.all_songs]
+        self.assertGreaterEqual(len(indexed), 1)
+        self.assertNotIn(join(test_dir, ".ds_store"), indexed)
+        self.assertNotIn(join(test_dir, "desktop"), indexed)
         id3_tested = False
-        for file in mock_songs.keys():
+        for file in indexed:
             track = self.skill.music_library._parse_track_from_file(file)
             # self.assertIsInstance(track, Track)
             self.assertIsInstance(track.path, str)
@@ -134,20 +196,17 @@ class TestSkillMethods(SkillTestCase):
                 self.assertEqual(track_2.genre, track.genre)
                 # self.assertEqual(track_2.duration_ms, track.duration_ms)
         self.assertTrue(id3_tested)
-        self.skill.music_library._songs = real_songs
 
     def test_demo_music(self):
-        real_songs = self.skill.music_library._songs
-        real_paths = self.skill.music_library.library_paths
-        self.skill.music_library.library_paths = []
-        self.skill.music_library._songs = dict()
-        self.assertEqual(self.skill.music_library._songs, dict())
-        self.assertEqual(self.skill.music_library.all_songs, [])
+        from util import MusicLibrary
         test_dir = join(dirname(__file__), "demo_test")
-        self.skill.music_library.update_library(test_dir)
+        library = MusicLibrary(test_dir, self.make_tmp_dir())
+        self.assertEqual(len(library), 0)
+        self.assertEqual(list(library.all_songs), [])
+        library.update_library(test_dir)
 
-        self.assertEqual(len(self.skill.music_library._songs), 30)
-        for track in self.skill.music_library.all_songs:
+        self.assertEqual(len(library), 30)
+        for track in library.all_songs:
             # self.assertIsInstance(track.album, str, track.path)
             self.assertIsInstance(track.artist, str, track.path)
             # self.assertIsInstance(track.artwork, str, track.path)
@@ -158,9 +217,6 @@ class TestSkillMethods(SkillTestCase):
             # self.assertIsInstance(track.track, int, track.path)
             # self.assertTrue(isfile(track.artwork), track.path)
             self.assertTrue(isfile(track.path), track.path)
-
-        self.skill.music_library.library_paths = real_paths
-        self.skill.music_library._songs = real_songs
     # TODO: OCP Search method tests
 
 
@@ -0,0 +1,92 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import unittest
+import pytest
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+sys.path.append(dirname(dirname(__file__)))
+from station_directory import StationDirectory
+
+STATIONS = '''"name", "genre", "country", "language", "ads", "url"
+"radio paradise", "pop|top 40", "the united states", "english", "no ads", "http://stream.radioparadise.com/flac"
+"fip", "jazz|eclectic", "france", "french", "no ads", "https://icecast.radiofrance.fr/fip-hifi.aac"
+"kexp", "alternative rock", "the united states", "english", "no ads", "https://kexp.streamguys1.com/kexp160.aac"
+'''
+
+
+class TestStationDirectory(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def test_find_and_sample(self):
+        path = join(self.make_tmp_dir(), "radio.stations.csv")
+        directory = StationDirectory(path)
+        self.assertFalse(directory.load())
+        with open(path, "w") as f:
+            f.write(STATIONS)
+        self.assertTrue(directory.load())
+        self.assertEqual(len(directory), 3)
+        self.assertEqual(directory.stations[0].genres, ["pop", "top 40"])
+        self.assertEqual([s.name for s in directory.find("genre", "top 40")],
+                         ["radio paradise"])
+        self.assertEqual([s.name for s in directory.find("genre", "rock")],
+                         ["kexp"])
+        self.assertEqual(len(directory.find("country", "united")), 2)
+        self.assertEqual(directory.find("language", "german"), [])
+        self.assertEqual(len(directory.sample(10)), 3)
+        self.assertEqual(len(directory.sample(1, "language", "english")), 1)
+        self.assertEqual(directory.sample(5, "name", "fip")[0].url,
+                         "https://icecast.radiofrance.fr/fip-hifi.aac")
+
+    def test_reload_on_change(self):
+        path = join(self.make_tmp_dir(), "radio.stations.csv")
+        with open(path, "w") as f:
+            f.write(STATIONS)
+        directory = StationDirectory(path)
+        directory.load()
+        stations = directory.stations
+        directory.load()
+        self.assertIs(directory.stations, stations)
+        with open(path, "a") as f:
+            f.write('"bbc radio 3", "classical", "the united kingdom", '
+                    '"english", "no ads", "http://stream.live.vc.bbcmedia.co.uk/bbc_radio_three"\n')
+        os.utime(path, ns=(1, 1))
+        directory.load()
+        self.assertEqual(len(directory), 4)
+        self.assertEqual(len(directory.find("genre", "classical")), 1)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,140 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import json
+import sqlite3
+import sys
+import unittest
+import pytest
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+sys.path.append(dirname(dirname(__file__)))
+from station_store import StationStore, import_stations, \
+    iter_json_objects, normalize_country, normalize_genres
+
+DUMP = [
+    {"name": "Radio Paradise", "url": "http://stream.radioparadise.com/flac",
+     "tags": "Pop,Top 40,eclectic", "country": "The United States Of America",
+     "language": "english"},
+    {"name": "RP duplicate", "url": "HTTP://Stream.RadioParadise.com/flac/",
+     "tags": "rock", "country": "USA", "language": "english"},
+    {"name": "FIP", "url": "x", "url_resolved": "https://icecast.radiofrance.fr/fip.aac",
+     "tags": "jazz,Hip-Hop", "countrycode": "FR", "language": "french,english"},
+    {"name": "", "url": "http://no.name/stream"},
+    None,
+    {"name": "KEXP", "url": "https://kexp.streamguys1.com/kexp160.aac",
+     "tags": ["Alternative Rock"], "country": "United States", "language": "en"},
+]
+
+
+class TestStationStore(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def test_normalize(self):
+        self.assertEqual(normalize_genres("Pop|Top 40,hip-hop;R&B"),
+                         ["pop", "top 40", "hip hop", "rnb"])
+        self.assertEqual(normalize_country("The United Kingdom"),
+                         "united kingdom")
+        self.assertEqual(normalize_country("USA"), "united states")
+
+    def test_iter_json_objects(self):
+        text = json.dumps(DUMP)
+        self.assertEqual(len(list(iter_json_objects(io.StringIO(text),
+                                                    chunk_size=7))), 5)
+        lines = "\n".join(json.dumps(record) for record in DUMP if record)
+        self.assertEqual(len(list(iter_json_objects(io.StringIO(lines)))), 5)
+
+    def test_import_and_query(self):
+        tmp_dir = self.make_tmp_dir()
+        source = join(tmp_dir, "stations.json")
+        with open(source, "w") as f:
+            json.dump(DUMP, f)
+        db_file = join(tmp_dir, "stations.sqlite")
+        stats = import_stations(source, db_file)
+        self.assertEqual((stats.read, stats.imported, stats.duplicates,
+                          stats.invalid), (5, 3, 1, 1))
+
+        store = StationStore(db_file)
+        self.assertTrue(store.load())
+        self.assertEqual(len(store), 3)
+        self.assertEqual([s.name for s in store.find("genre", "top 40")],
+                         ["Radio Paradise"])
+        self.assertEqual([s.name for s in store.find("genre", "hip hop")],
+                         ["FIP"])
+        self.assertEqual([s.name for s in store.find("genre", "rock")],
+                         ["KEXP"])
+        self.assertEqual(len(store.find("country", "united")), 2)
+        self.assertEqual(store.find("country", "france")[0].url,
+                         "https://icecast.radiofrance.fr/fip.aac")
+        self.assertEqual(len(store.find("language", "english")), 2)
+        self.assertEqual(store.find("name", "fip")[0].genre, "jazz|hip hop")
+        self.assertEqual(len(store.sample(10)), 3)
+        self.assertEqual(len(store.sample(1, "country", "united states")), 1)
+
+        # A new import replaces the store under a running reader
+        with open(join(tmp_dir, "stations.csv"), "w") as f:
+            f.write('"bbc radio 3", "classical", "the united kingdom", '
+                    '"english", "no ads", "http://bbc.co.uk/radio3"\n')
+        import_stations(join(tmp_dir, "stations.csv"), db_file)
+        store.load()
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.find("country", "united kingdom")[0].name,
+                         "bbc radio 3")
+
+    def test_query_without_load(self):
+        tmp_dir = self.make_tmp_dir()
+        source = join(tmp_dir, "stations.json")
+        with open(source, "w") as f:
+            json.dump(DUMP, f)
+        db_file = join(tmp_dir, "stations.sqlite")
+        self.assertEqual(StationStore(db_file).find("name", "fip"), [])
+        self.assertEqual(StationStore(db_file).sample(10), [])
+        import_stations(source, db_file)
+        # Ids with a gap, as left by deleting a station
+        conn = sqlite3.connect(db_file)
+        conn.execute("DELETE FROM stations WHERE name = 'FIP'")
+        conn.commit()
+        conn.close()
+
+        store = StationStore(db_file)
+        self.assertEqual(store.find("name", "kexp")[0].country,
+                         "united states")
+        self.assertEqual(len(store), 2)
+        stations = StationStore(db_file).sample(10)
+        self.assertEqual(sorted(s.name for s in stations),
+                         ["KEXP", "Radio Paradise"])
+
+
+if __name__ == '__main__':
+    pytest.main()
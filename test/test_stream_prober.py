@@ -0,0 +1,132 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import socket
+import sys
+import time
+import unittest
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import dirname
+from threading import Thread
+
+sys.path.append(dirname(dirname(__file__)))
+from stream_prober import StreamProber
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for radio stream servers: live, slow, dead, empty and
+    redirected streams
+    """
+    def do_GET(self):
+        match self.path:
+            case "/live" | "/fast":
+                if self.path == "/live":
+                    time.sleep(0.2)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("icy-br", "128")
+                self.end_headers()
+                self.wfile.write(b"\xff\xfb" * 1024)
+            case "/slow":
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/aacp")
+                self.end_headers()
+                self.wfile.flush()
+                time.sleep(2)
+            case "/empty":
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/ogg")
+                self.end_headers()
+            case "/moved":
+                self.send_response(302)
+                self.send_header("Location", "/fast")
+                self.end_headers()
+            case _:
+                self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestStreamProber(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+        cls.server.daemon_threads = True
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            cls.refused = f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_probe(self):
+        prober = StreamProber(timeout=1)
+        urls = [f"{self.base}/{path}" for path in
+                ("live", "fast", "slow", "empty", "moved", "gone")]
+        urls.append(self.refused)
+        start = time.monotonic()
+        results = prober.probe(urls)
+        # Probes run concurrently - the slow stream bounds the total time
+        self.assertLess(time.monotonic() - start, 1.8)
+        alive = {url for url, result in results.items() if result.alive}
+        self.assertEqual(alive, {urls[0], urls[1], urls[4]})
+        self.assertEqual(results[urls[0]].codec, "mp3")
+        self.assertEqual(results[urls[0]].bitrate, 128)
+        self.assertEqual(results[urls[5]].error, "HTTP 404")
+        self.assertFalse(results[self.refused].alive)
+
+        # Live streams first, fastest first; unknown next; dead last
+        unknown = f"{self.base}/unknown"
+        self.assertEqual(prober.rank([urls[3], unknown, urls[0], urls[1]]),
+                         [urls[1], urls[0], unknown, urls[3]])
+        prober.close()
+
+    def test_ttl(self):
+        prober = StreamProber(timeout=1, ttl=60, dead_ttl=0)
+        live, dead = f"{self.base}/fast", f"{self.base}/gone"
+        prober.probe_in_background([live, dead])
+        for _ in range(50):
+            if prober.get(live):
+                break
+            time.sleep(0.05)
+        self.assertTrue(prober.get(live).alive)
+        # Dead results expire immediately with dead_ttl=0
+        time.sleep(0.01)
+        self.assertIsNone(prober.get(dead))
+        prober.close()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,117 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import sys
+import time
+import unittest
+import pytest
+
+from os.path import dirname
+from threading import Event
+
+sys.path.append(dirname(dirname(__file__)))
+from stream_resolver import ResolveError, StreamUrlCache, stream_expiry
+
+
+class TestStreamExpiry(unittest.TestCase):
+    def test_stream_expiry(self):
+        self.assertEqual(stream_expiry(
+            "https://rr1.googlevideo.com/videoplayback?expire=1700000000"
+            "&itag=251"), 1700000000)
+        self.assertEqual(stream_expiry(
+            "https://d1.cloudfront.net/a.mp3?Expires=1700000100"), 1700000100)
+        self.assertEqual(stream_expiry(
+            "https://bucket.s3.amazonaws.com/a.m4a?X-Amz-Date=20231114T221320Z"
+            "&X-Amz-Expires=3600"), 1700003600)
+        self.assertIsNone(stream_expiry("http://stream.example/live.mp3"))
+
+
+class TestStreamUrlCache(unittest.TestCase):
+    def test_cached_until_expiry(self):
+        calls = []
+        expires = {"value": time.time() + 3600}
+
+        def resolver(url):
+            calls.append(url)
+            return f"{url}/stream?expire={int(expires['value'])}"
+
+        cache = StreamUrlCache(resolver, margin=60, refresh_ahead=120)
+        first = cache.resolve("page")
+        self.assertEqual(cache.resolve("page"), first)
+        self.assertEqual(calls, ["page"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Too close to the expiry to start playing - resolved again
+        expires["value"] = time.time() + 30
+        cache.resolve("other")
+        self.assertEqual(cache.resolve("other"), cache.resolve("other"))
+        self.assertEqual(calls, ["page", "other", "other", "other"])
+
+    def test_refresh_ahead(self):
+        refreshed = Event()
+        calls = []
+
+        def resolver(url):
+            calls.append(url)
+            if len(calls) > 1:
+                refreshed.set()
+                return f"{url}/new?expire={int(time.time()) + 3600}"
+            return f"{url}/old?expire={int(time.time()) + 300}"
+
+        cache = StreamUrlCache(resolver, margin=60, refresh_ahead=600)
+        self.assertIn("/old", cache.resolve("page"))
+        # Still valid: served at once and resolved again in the background
+        self.assertIn("/old", cache.resolve("page"))
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(100):
+            if "/new" in cache.resolve("page"):
+                break
+            time.sleep(0.01)
+        self.assertIn("/new", cache.resolve("page"))
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_refresh_keeps_entry(self):
+        def resolver(url):
+            if resolver.failing:
+                raise ResolveError("offline")
+            return f"{url}?expire={int(time.time()) + 300}"
+        resolver.failing = False
+
+        cache = StreamUrlCache(resolver, margin=60, refresh_ahead=600)
+        stream_url = cache.resolve("page")
+        resolver.failing = True
+        self.assertEqual(cache.resolve("page"), stream_url)
+        time.sleep(0.1)
+        self.assertEqual(cache.resolve("page"), stream_url)
+        with self.assertRaises(ResolveError):
+            cache.resolve("unknown")
+
+
+if __name__ == '__main__':
+    pytest.main()
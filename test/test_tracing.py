@@ -0,0 +1,142 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import sys
+import time
+import unittest
+import pytest
+
+from os.path import dirname
+from threading import Thread
+
+sys.path.append(dirname(dirname(__file__)))
+from tracing import BUCKETS, NO_SPAN, TRACER, StageStats, Tracer, traced
+
+
+class TestTracer(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        tracer = Tracer()
+        self.assertIs(tracer.span("stage"), NO_SPAN)
+        with tracer.request("request"):
+            with tracer.span("stage"):
+                pass
+        self.assertEqual(tracer.snapshot()["stages"], {})
+
+    def test_nested_spans(self):
+        tracer = Tracer(enabled=True)
+        with tracer.request("search_music"):
+            with tracer.span("mpc.search_library"):
+                with tracer.span("mpd.round_trip"):
+                    time.sleep(0.01)
+            with self.assertRaises(ValueError):
+                with tracer.span("tts"):
+                    raise ValueError()
+        # Spans outside a request are aggregated, not kept as a trace
+        with tracer.span("mpd.round_trip"):
+            pass
+        snapshot = tracer.snapshot()
+        stages = snapshot["stages"]
+        self.assertEqual(stages["mpd.round_trip"]["count"], 2)
+        self.assertEqual(stages["tts"]["errors"], 1)
+        self.assertGreaterEqual(stages["search_music"]["max_ms"], 10)
+        self.assertEqual(len(snapshot["traces"]), 1)
+        trace = snapshot["traces"][0]
+        self.assertEqual(trace["stage"], "search_music")
+        self.assertEqual([child["stage"] for child in trace["children"]],
+                         ["mpc.search_library", "tts"])
+        self.assertEqual(trace["children"][0]["children"][0]["stage"],
+                         "mpd.round_trip")
+        self.assertTrue(trace["children"][1]["error"])
+
+    def test_spans_nest_per_thread(self):
+        tracer = Tracer(enabled=True)
+
+        def other():
+            with tracer.span("youtube.search"):
+                pass
+
+        with tracer.request("search_music"):
+            thread = Thread(target=other)
+            thread.start()
+            thread.join()
+        trace = tracer.snapshot()["traces"][0]
+        self.assertNotIn("children", trace)
+        self.assertEqual(tracer.snapshot()["stages"]["youtube.search"]["count"], 1)
+
+    def test_quantiles(self):
+        stats = StageStats()
+        for _ in range(90):
+            stats.add(0.002, False)
+        for _ in range(10):
+            stats.add(0.4, False)
+        self.assertLessEqual(stats.quantile(0.5), 0.0025)
+        self.assertGreater(stats.quantile(0.99), 0.25)
+        self.assertLessEqual(stats.quantile(0.99), 0.4)
+
+    def test_prometheus(self):
+        tracer = Tracer(enabled=True)
+        for seconds in (0.003, 0.2, 100.0):
+            tracer.record("mpc.ytadd", seconds)
+        lines = tracer.prometheus().splitlines()
+        self.assertIn("# TYPE local_music_stage_seconds histogram", lines)
+        self.assertIn('local_music_stage_seconds_bucket{stage="mpc.ytadd",'
+                      'le="0.005"} 1', lines)
+        self.assertIn('local_music_stage_seconds_bucket{stage="mpc.ytadd",'
+                      'le="0.25"} 2', lines)
+        self.assertIn('local_music_stage_seconds_bucket{stage="mpc.ytadd",'
+                      'le="+Inf"} 3', lines)
+        self.assertIn('local_music_stage_seconds_count{stage="mpc.ytadd"} 3',
+                      lines)
+        self.assertIn('local_music_stage_errors_total{stage="mpc.ytadd"} 0',
+                      lines)
+        buckets = [line for line in lines if "_bucket" in line]
+        self.assertEqual(len(buckets), len(BUCKETS) + 1)
+
+    def test_traced(self):
+        @traced("test.function")
+        def function(value):
+            return value * 2
+
+        enabled = TRACER.enabled
+        TRACER.reset()
+        try:
+            TRACER.enabled = False
+            self.assertEqual(function(2), 4)
+            self.assertNotIn("test.function", TRACER.snapshot()["stages"])
+            TRACER.enabled = True
+            self.assertEqual(function(3), 6)
+            self.assertEqual(
+                TRACER.snapshot()["stages"]["test.function"]["count"], 1)
+        finally:
+            TRACER.enabled = enabled
+            TRACER.reset()
+
+
+if __name__ == '__main__':
+    pytest.main()
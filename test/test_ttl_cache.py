@@ -0,0 +1,120 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import time
+import unittest
+import pytest
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+sys.path.append(dirname(dirname(__file__)))
+from ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def test_fresh_stale_offline(self):
+        path = join(self.make_tmp_dir(), "cache.sqlite")
+        cache = TTLCache(path, ttl=60)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return ["result"]
+
+        def offline():
+            raise OSError("network is unreachable")
+
+        self.assertEqual(cache.get_or_fetch("a", fetch), ["result"])
+        self.assertEqual(cache.get_or_fetch("a", fetch), ["result"])
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get_or_fetch("b", offline))
+        self.assertEqual(cache.get_or_fetch("c", list, keep=bool), [])
+        self.assertIsNone(cache.get("c"))
+
+        # Stale values are served at once and refreshed in the background
+        cache.ttl = 0
+        self.assertEqual(cache.get_or_fetch("a", lambda: ["new"]), ["result"])
+        for _ in range(50):
+            if cache.get("a").value == ["new"]:
+                break
+            time.sleep(0.02)
+        self.assertEqual(cache.get("a").value, ["new"])
+
+        # Too old to serve - unless fetching fails
+        cache.max_stale = 0
+        self.assertEqual(cache.get_or_fetch("a", offline), ["new"])
+        self.assertEqual(cache.stats, {"hits": 1, "stale_hits": 1,
+                                       "offline_hits": 1, "misses": 3,
+                                       "entries": 1})
+        cache.close()
+
+        # The cache survives a restart
+        cache = TTLCache(path, ttl=60)
+        self.assertEqual(cache.get_or_fetch("a", offline), ["new"])
+        self.assertEqual(cache.hits, 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(join(self.make_tmp_dir(), "cache.sqlite"), max_entries=2)
+        cache.put("a", 1)
+        time.sleep(0.01)
+        cache.put("b", 2)
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").value, 1)
+        self.assertEqual(cache.get("c").value, 3)
+
+    def test_reads_are_not_written(self):
+        path = join(self.make_tmp_dir(), "cache.sqlite")
+        cache = TTLCache(path, max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        changes = cache._conn.total_changes
+        for _ in range(10):
+            cache.get("a")
+        self.assertEqual(cache._conn.total_changes, changes)
+        # The time of the last read is written on close
+        cache.close()
+        cache = TTLCache(path, max_entries=2)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").value, 1)
+        cache.close()
+
+
+if __name__ == '__main__':
+    pytest.main()
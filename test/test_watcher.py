@@ -0,0 +1,149 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import unittest
+import pytest
+
+from os.path import dirname, join
+from shutil import copy, copytree, rmtree
+from tempfile import TemporaryDirectory
+from threading import Event
+from time import sleep
+
+sys.path.append(dirname(dirname(__file__)))
+from util import MusicLibrary
+from util.watcher import LibraryWatcher
+
+MAX_QUEUED_EVENTS = "/proc/sys/fs/inotify/max_queued_events"
+
+
+class TestLibraryWatcher(unittest.TestCase):
+    def make_tmp_dir(self) -> str:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return tmp_dir.name
+
+    def make_library(self) -> MusicLibrary:
+        lib_dir = join(self.make_tmp_dir(), "music")
+        copytree(join(dirname(__file__), "test_music"), lib_dir)
+        lib = MusicLibrary(lib_dir, self.make_tmp_dir())
+        lib.update_library()
+        return lib
+
+    def start_watcher(self, lib: MusicLibrary, **kwargs) -> LibraryWatcher:
+        watcher = LibraryWatcher(lib, **kwargs)
+        watcher.start()
+        self.addCleanup(watcher.join)
+        self.addCleanup(watcher.stop)
+        return watcher
+
+    def test_changes_applied(self):
+        lib = self.make_library()
+        lib_dir = lib.library_paths[0]
+        self.start_watcher(lib, debounce=0.2, poll_interval=0.2)
+        sleep(0.5)
+
+        new_album = join(lib_dir, "Artist 2", "Album 3")
+        copytree(join(lib_dir, "Artist 1", "Album 1"), new_album)
+        copy(join(lib_dir, "Test_Track.mp3"), join(new_album, "Bonus.mp3"))
+        rmtree(join(lib_dir, "Artist 1", "Album 2"))
+        for _ in range(50):
+            if lib.get_song(join(new_album, "Bonus.mp3")) and len(lib) == 6:
+                break
+            sleep(0.1)
+        self.assertIsNotNone(lib.get_song(join(new_album, "Bonus.mp3")))
+        self.assertEqual(len(lib), 6)
+
+    def test_polling(self):
+        lib = self.make_library()
+        scans = list()
+        update_library = lib.update_library
+        lib.update_library = lambda *args, **kwargs: scans.append(
+            update_library(*args, **kwargs)) or scans[-1]
+        watcher = self.start_watcher(lib, poll_interval=0.1,
+                                     use_inotify=False)
+
+        # Tags edited in place do not change the directory
+        track = join(lib.library_paths[0], "Artist 1", "Album 1",
+                     "01 Track one.mp3")
+        os.utime(track, ns=(1, 1))
+        for _ in range(50):
+            if any(track in changes.changed for changes in scans):
+                break
+            sleep(0.1)
+        self.assertTrue(watcher.polling)
+        self.assertTrue(any(track in changes.changed for changes in scans))
+
+    @unittest.skipUnless(os.path.isfile(MAX_QUEUED_EVENTS), "needs inotify")
+    def test_overflow(self):
+        with open(MAX_QUEUED_EVENTS) as f:
+            max_queued_events = int(f.read())
+        lib = self.make_library()
+        lib_dir = lib.library_paths[0]
+        scratch = join(lib_dir, "scratch")
+        os.mkdir(scratch)
+        updates = list()
+        updating = Event()
+        resume = Event()
+        update_paths = lib.update_paths
+
+        def slow_update_paths(paths, full=False):
+            updates.append((sorted(paths), full))
+            updating.set()
+            resume.wait(10)
+            return update_paths(paths, full)
+
+        lib.update_paths = slow_update_paths
+        watcher = self.start_watcher(lib, debounce=0.1)
+        sleep(0.5)
+        if watcher.polling:
+            self.skipTest("inotify not available")
+
+        # Events pile up while the watcher is busy until the queue overflows
+        open(join(scratch, "start"), "w").close()
+        self.assertTrue(updating.wait(5))
+        for i in range(max_queued_events // 2 + 1):
+            open(join(scratch, str(i)), "w").close()
+        bonus = join(lib_dir, "Artist 1", "Album 1", "Bonus.mp3")
+        copy(join(lib_dir, "Test_Track.mp3"), bonus)
+        resume.set()
+
+        # The events of the bonus track were lost; the overflow rescan
+        # finds it
+        for _ in range(100):
+            if lib.get_song(bonus):
+                break
+            sleep(0.1)
+        self.assertIsNotNone(lib.get_song(bonus))
+        self.assertIn(([lib_dir], True), updates)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,238 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ovos_utils.log import LOG
+from typing import Callable, Dict, List, Optional
+
+# upper bounds in seconds of the latency histogram buckets, +Inf is implied
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_CHILDREN = 100                         # spans kept per parent in a trace, the rest are only counted
+
+class StageStats():
+  """ Count, errors and latency histogram of one stage """
+  __slots__ = ("count", "errors", "total", "max", "buckets")
+
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0.0                       # seconds
+    self.max = 0.0
+    self.buckets = [0] * (len(BUCKETS) + 1) # per bucket, not cumulative - the last one is +Inf
+
+  def add(self, seconds: float, error: bool):
+    self.count += 1
+    self.errors += error
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+    self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1 # the first bound >= seconds
+
+  def quantile(self, q: float) -> float:
+    """ Estimate a quantile in seconds by interpolating within its bucket, as Prometheus does """
+    rank = q * self.count
+    seen = 0
+    lower = 0.0
+    for i, count in enumerate(self.buckets):
+      upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+      if count and seen + count >= rank:
+        return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+      seen += count
+      lower = upper
+    return self.max
+
+  def to_dict(self) -> Dict[str, object]:
+    return {"count": self.count, "errors": self.errors, "total_seconds": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            **{f"p{int(q * 100)}_ms": round(self.quantile(q) * 1000, 3) for q in (0.5, 0.9, 0.99)}}
+
+class Span():
+  """ One timed stage - a context manager that records itself when it ends """
+  __slots__ = ("tracer", "name", "keep", "start", "seconds", "error", "children", "dropped")
+
+  def __init__(self, tracer: "Tracer", name: str, keep: bool):
+    self.tracer = tracer
+    self.name = name
+    self.keep = keep                       # keep the tree of spans when this is the outermost one
+    self.seconds = 0.0
+    self.error = False
+    self.children: List[Span] = []
+    self.dropped = 0
+
+  def __enter__(self):
+    stack = self.tracer._stack()
+    if stack:
+      parent = stack[-1]
+      if len(parent.children) < MAX_CHILDREN:
+        parent.children.append(self)
+      else:
+        parent.dropped += 1
+    stack.append(self)
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.seconds = time.perf_counter() - self.start
+    self.error = exc_type is not None
+    stack = self.tracer._stack()
+    stack.pop()
+    self.tracer.record(self.name, self.seconds, self.error)
+    if not stack and self.keep:
+      self.tracer._traces.append(self)
+    return False
+
+  def to_dict(self, origin: Optional[float]=None) -> Dict[str, object]:
+    """ The span and its children with start offsets relative to the outermost span """
+    origin = self.start if origin is None else origin
+    span = {"stage": self.name, "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.seconds * 1000, 3)}
+    if self.error:
+      span["error"] = True
+    if self.children:
+      span["children"] = [child.to_dict(origin) for child in self.children]
+    if self.dropped:
+      span["dropped"] = self.dropped
+    return span
+
+class _NoSpan():
+  """ What span() returns while tracing is disabled """
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    return False
+
+NO_SPAN = _NoSpan()
+
+class Tracer():
+  """
+  Time the stages of requests and aggregate a count, an error count and a latency histogram per stage
+  Spans nest per thread. The span trees of the last requests are kept, so a slow request shows where its
+  time went. The aggregates are exported as a JSON snapshot or in the Prometheus text format, on demand or
+  over HTTP. While disabled, span() returns a shared object that does nothing
+  """
+  def __init__(self, enabled: bool=False, max_traces: int=20):
+    self.enabled = enabled
+    self._stages: Dict[str, StageStats] = {}
+    self._traces = deque(maxlen=max_traces)
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._started = time.time()
+    self._server: Optional[ThreadingHTTPServer] = None
+
+  def span(self, name: str):
+    """ Time a stage: 'with TRACER.span("mpc.search_library"):' """
+    return Span(self, name, False) if self.enabled else NO_SPAN
+
+  def request(self, name: str):
+    """ Time a stage that handles a whole request and keep its span tree """
+    return Span(self, name, True) if self.enabled else NO_SPAN
+
+  def record(self, name: str, seconds: float, error: bool=False):
+    """ Add one measurement of a stage, e.g. one timed without a span """
+    with self._lock:
+      stats = self._stages.get(name)
+      if stats is None:
+        stats = self._stages[name] = StageStats()
+      stats.add(seconds, error)
+
+  def reset(self):
+    with self._lock:
+      self._stages = {}
+      self._traces.clear()
+      self._started = time.time()
+
+  def snapshot(self) -> Dict[str, object]:
+    """ The aggregates of every stage and the span trees of the last requests """
+    with self._lock:
+      stages = {name: stats.to_dict() for name, stats in sorted(self._stages.items())}
+      traces = [span.to_dict() for span in self._traces]
+    return {"enabled": self.enabled, "since": self._started, "stages": stages, "traces": traces}
+
+  def prometheus(self, prefix: str="local_music") -> str:
+    """ The aggregates in the Prometheus text exposition format """
+    with self._lock:
+      stages = sorted((name, stats.count, stats.errors, stats.total, list(stats.buckets))
+                      for name, stats in self._stages.items())
+    lines = [f"# HELP {prefix}_stage_seconds Time spent in each stage of a request",
+             f"# TYPE {prefix}_stage_seconds histogram"]
+    for name, count, _, total, buckets in stages:
+      cumulative = 0
+      for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+        cumulative += bucket
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+      lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+      lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {count}')
+    lines += [f"# HELP {prefix}_stage_errors_total Stages that ended with an exception",
+              f"# TYPE {prefix}_stage_errors_total counter"]
+    lines += [f'{prefix}_stage_errors_total{{stage="{name}"}} {errors}' for name, _, errors, _, _ in stages]
+    return "\n".join(lines) + "\n"
+
+  def serve(self, port: int, host: str="127.0.0.1"):
+    """ Export /metrics in the Prometheus format and /metrics.json as the snapshot over HTTP """
+    if self._server:
+      return
+    tracer = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        if self.path == "/metrics":
+          body, content_type = tracer.prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+          body, content_type = json.dumps(tracer.snapshot()).encode(), "application/json"
+        else:
+          self.send_error(404)
+          return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    try:
+      self._server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+      LOG.error(f"Tracer.serve() cannot listen on {host}:{port}: {e}")
+      return
+    threading.Thread(target=self._server.serve_forever, name="TracerHTTP", daemon=True).start()
+    LOG.info(f"Tracer.serve() metrics at http://{host}:{self._server.server_address[1]}/metrics")
+
+  def close(self):
+    if self._server:
+      self._server.shutdown()
+      self._server.server_close()
+      self._server = None
+
+  def _stack(self) -> List[Span]:
+    stack = getattr(self._local, "stack", None)
+    if stack is None:
+      stack = self._local.stack = []
+    return stack
+
+# shared by the skill and the clients - enabled by the 'tracing' setting or LOCAL_MUSIC_TRACING=1
+TRACER = Tracer(enabled=os.getenv("LOCAL_MUSIC_TRACING", "") not in ("", "0"))
+
+def traced(name: str) -> Callable:
+  """ Decorator timing every call of a function as the stage name """
+  def decorate(function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if not TRACER.enabled:
+        return function(*args, **kwargs)
+      with Span(TRACER, name, False):
+        return function(*args, **kwargs)
+    return wrapper
+  return decorate
@@ -0,0 +1,161 @@
+#
+# This code is distributed under the Apache License, v2.0
+#
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from ovos_utils.log import LOG
+from typing import Any, Callable, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+  key TEXT PRIMARY KEY,
+  value TEXT,                              -- JSON
+  stored REAL,                             -- time.time() of the fetch
+  used REAL                                -- time.time() of the last read, for LRU eviction
+);
+CREATE INDEX IF NOT EXISTS cache_used ON cache (used);
+"""
+
+@dataclass
+class CacheEntry:
+  value: Any
+  age: float                               # seconds since the value was fetched
+  fresh: bool                              # younger than the TTL
+
+class TTLCache():
+  """
+  Cache of JSON serializable values in SQLite, so it survives restarts
+  Values are fresh for ttl seconds. Stale values up to max_stale seconds old are still served while a
+  background fetch revalidates them, and values of any age are served when fetching fails, i.e. offline.
+  The least recently used entries are evicted beyond max_entries. Reads only note the time of use in memory -
+  it is written with the next put(), so a cache hit costs no write to the SD card
+  """
+  def __init__(self, path: str, ttl: float=86400.0, max_stale: float=30 * 86400.0, max_entries: int=1000):
+    self.path = path
+    self.ttl = ttl
+    self.max_stale = max_stale
+    self.max_entries = max_entries
+    self.hits = 0                          # fresh values served
+    self.stale_hits = 0                    # stale values served while revalidating
+    self.offline_hits = 0                  # values of any age served because fetching failed
+    self.misses = 0                        # values that had to be fetched first
+    self._lock = threading.Lock()
+    self._revalidating = set()             # keys being fetched in the background
+    self._used: Dict[str, float] = {}      # key -> time of the last read, not written yet
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+      self._conn = self._connect()
+    except sqlite3.DatabaseError as e:     # a corrupt cache is not worth keeping
+      LOG.error(f"TTLCache.__init__() {path} is not usable ({e}) - starting a new one")
+      os.remove(path)
+      self._conn = self._connect()
+
+  def _connect(self) -> sqlite3.Connection:
+    conn = sqlite3.connect(self.path, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    return conn
+
+  @property
+  def stats(self) -> Dict[str, int]:
+    """ Hit and miss counters and the number of entries """
+    with self._lock:
+      entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    return {"hits": self.hits, "stale_hits": self.stale_hits, "offline_hits": self.offline_hits,
+            "misses": self.misses, "entries": entries}
+
+  def get(self, key: str) -> Optional[CacheEntry]:
+    """ Return the entry of a key - fresh or not - without counting it, None if there is none """
+    with self._lock:
+      row = self._conn.execute("SELECT value, stored FROM cache WHERE key = ?", (key,)).fetchone()
+      if row is None:
+        return None
+      now = time.time()
+      self._used[key] = now
+    age = max(now - row[1], 0.0)
+    return CacheEntry(json.loads(row[0]), age, age < self.ttl)
+
+  def get_fresh(self, key: str) -> Any:
+    """ Return a fresh value counted as a hit, None if there is none - for callers that fetch elsewhere """
+    entry = self.get(key)
+    if entry and entry.fresh:
+      self.hits += 1
+      return entry.value
+    return None
+
+  def put(self, key: str, value: Any):
+    """ Store a value and evict the least recently used entries beyond max_entries """
+    now = time.time()
+    with self._lock:
+      self._write_used()                   # evict by the latest reads
+      self._used.pop(key, None)
+      self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, json.dumps(value), now, now))
+      self._conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+      self._conn.commit()
+
+  def get_or_fetch(self, key: str, fetch: Callable[[], Any], keep: Callable[[Any], bool]=lambda value: True) -> Any:
+    """
+    Return the cached value of a key, calling fetch() when there is no usable one
+    Param: fetch - returns the current value, may raise when offline
+           keep  - whether a fetched value should be cached, i.e. not empty results
+    Return: the value - or None if there is none and fetch() failed
+    """
+    entry = self.get(key)
+    if entry and entry.fresh:
+      self.hits += 1
+      return entry.value
+    if entry and entry.age < self.max_stale:
+      self.stale_hits += 1
+      self._revalidate(key, fetch, keep)
+      return entry.value
+    try:
+      value = fetch()
+    except Exception as e:
+      if entry:
+        LOG.info(f"TTLCache.get_or_fetch() fetching {key} failed ({e}) - serving a value {entry.age:.0f} seconds old")
+        self.offline_hits += 1
+        return entry.value
+      LOG.error(f"TTLCache.get_or_fetch() fetching {key} failed: {e}")
+      self.misses += 1
+      return None
+    self.misses += 1
+    if keep(value):
+      self.put(key, value)
+    return value
+
+  def _revalidate(self, key: str, fetch: Callable[[], Any], keep: Callable[[Any], bool]):
+    """ Fetch a stale value again in the background - once at a time per key """
+    with self._lock:
+      if key in self._revalidating:
+        return
+      self._revalidating.add(key)
+
+    def refresh():
+      try:
+        value = fetch()
+        if keep(value):
+          self.put(key, value)
+      except Exception as e:             # keep serving the stale value
+        LOG.info(f"TTLCache._revalidate() fetching {key} failed: {e}")
+      finally:
+        with self._lock:
+          self._revalidating.discard(key)
+
+    threading.Thread(target=refresh, name="TTLCache", daemon=True).start()
+
+  def _write_used(self):
+    """ Write the times of use noted by get() - the caller holds the lock and commits """
+    if self._used:
+      self._conn.executemany("UPDATE cache SET used = ? WHERE key = ?",
+                             [(used, key) for key, used in self._used.items()])
+      self._used.clear()
+
+  def close(self):
+    with self._lock:
+      self._write_used()
+      self._conn.commit()
+      self._conn.close()
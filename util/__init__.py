@@ -26,19 +26,25 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import hashlib
 import pickle
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
 from threading import RLock
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import ovos_ocp_files_plugin
 
-from dataclasses import dataclass
-from os import walk, makedirs, remove
+from dataclasses import dataclass, field
+from os import makedirs, remove, replace, cpu_count, getpid, scandir, \
+    stat, sysconf
 from os.path import join, expanduser, isfile, dirname, basename, splitext, isdir
 from ovos_utils.log import LOG
+from .album_art import EMBEDDED_ART, AlbumArtCache
+from .library_db import LibraryDB
 
 
-@dataclass
+@dataclass(slots=True)
 class Track:
     path: str
     title: str
@@ -49,52 +55,211 @@ class Track:
     duration_ms: float = 0
     track: int = 0
 
+    def __setstate__(self, state):
+        # Tracks pickled before Track had slots carry a plain __dict__
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _track_from_row(row: tuple) -> Track:
+    """
+    Build a Track from a LibraryDB row. Album, artist, genre and artwork
+    repeat across tracks, so every distinct value is kept in memory once.
+    """
+    path, title, album, artist, genre, artwork, duration_ms, track = row
+    return Track(path, title, _intern(album), _intern(artist),
+                 _intern(genre), _intern(artwork), duration_ms, track)
+
+
+def _resident_memory() -> Optional[int]:
+    """
+    Get the resident set size of this process in bytes (Linux only)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class ScanProgress:
+    total: int = 0
+    done: int = 0
+
+    @property
+    def running(self) -> bool:
+        return self.done < self.total
+
+
+@dataclass
+class LibraryChanges:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+@dataclass
+class _CachedDir:
+    mtime_ns: int
+    subdirs: Tuple[str, ...]
+    files: Tuple[str, ...]  # Names of the music files in this directory
+    album_art: Optional[str] = None
+
+# (st_mtime_ns, st_size, st_ino) of an indexed file
+Fingerprint = Tuple[int, int, int]
+
 # TODO: Replace w/ https://github.com/OpenVoiceOS/ovos-ocp-audio-plugin/pull/30
 
 
 class MusicLibrary:
-    def __init__(self, library_path: str, cache_path: str):
+    def __init__(self, library_path: str, cache_path: str,
+                 scan_workers: Optional[int] = None,
+                 scan_processes: bool = False,
+                 art_cache_bytes: int = 64 * 1024 * 1024):
         """
         Initialize a Library object for the specified path, optionally loading
         a cached index at the specified `cache_file` path.
         :param library_path: path to scan for music files
         :param cache_path: path to cache directory for library and temp files
+        :param scan_workers: number of parallel tag parsers (default CPU count)
+        :param scan_processes: parse tags in worker processes instead of threads
+        :param art_cache_bytes: byte budget of the album art cache
         """
         # Hidden files (starting with `.`) are always ignored
         self._ignored_files = ("desktop.ini", "desktop", "Attribution.pdf")
         self._update_lock = RLock()
+        self.scan_workers = scan_workers or cpu_count() or 1
+        self.scan_processes = scan_processes
+        self.scan_progress = ScanProgress()
+        self.commit_interval = 500
         self.library_paths = [expanduser(library_path)]
         self.cache_path = expanduser(cache_path)
         if not isdir(self.cache_path):
             makedirs(self.cache_path)
-        self._songs = dict()
-        self._db_file = join(self.cache_path, "library.pickle")
+        self.album_art = AlbumArtCache(self.cache_path, art_cache_bytes)
+        self.art_workers = 2
+        self._art_pool: Optional[ThreadPoolExecutor] = None
+        # Track path -> extraction of its embedded art, done or running
+        self._art_futures: Dict[str, Future] = dict()
+        self._db_file = join(self.cache_path, "library.sqlite")
         with self._update_lock:
-            try:
-                if isfile(self._db_file):
-                    with open(self._db_file, 'rb') as f:
-                        self._songs = pickle.load(f)
-            except Exception as e:
-                LOG.exception(e)
-                remove(self._db_file)
+            self._db = LibraryDB(self._db_file)
+            self._migrate_pickle(join(self.cache_path, "library.pickle"))
+        self._remove_legacy_art()
+
+    def _migrate_pickle(self, pickle_file: str):
+        """
+        Import the tracks of a library cache written by an older version
+        into the database, then remove the pickle file.
+        """
+        if not isfile(pickle_file):
+            return
+        try:
+            with open(pickle_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get("version") == 2:
+                songs = cached["songs"]
+                fingerprints = cached["fingerprints"]
+                for dir_path, cached_dir in cached["dirs"].items():
+                    self._db.put_dir(dir_path, cached_dir.mtime_ns,
+                                     cached_dir.subdirs, cached_dir.files,
+                                     cached_dir.album_art)
+            else:
+                # Unversioned cache of only tracks; without
+                # fingerprints every file is parsed again once
+                songs, fingerprints = cached, dict()
+            for path, track in songs.items():
+                self._db.put_track(track, fingerprints.get(path))
+            self._db.commit()
+            LOG.info(f"Migrated {len(songs)} tracks from {pickle_file}")
+        except Exception as e:
+            LOG.exception(e)
+        remove(pickle_file)
+
+    def _remove_legacy_art(self):
+        """
+        Remove album art files named `<md5>.jpg` that older versions wrote
+        into the cache directory itself. `get_artwork` stores them again in
+        the album art cache when they are needed.
+        """
+        with scandir(self.cache_path) as entries:
+            legacy = [entry.path for entry in entries
+                      if entry.name.endswith(".jpg") and len(entry.name) == 36]
+        for path in legacy:
+            remove(path)
+        if legacy:
+            LOG.info(f"Removed {len(legacy)} album art files of an older "
+                     f"version")
+
+    def __getstate__(self):
+        # Only the state tag parsing needs is sent to scan worker processes
+        return {"cache_path": self.cache_path}
+
+    def __len__(self):
+        return len(self._db)
 
     @property
-    def all_songs(self):
-        return list(self._songs.values())
+    def all_songs(self) -> Iterator[Track]:
+        """
+        Iterate over all indexed tracks. Tracks are read from the database
+        as the iterator is consumed rather than copied into a list.
+        """
+        return map(_track_from_row, self._db.iter_tracks())
+
+    def memory_usage(self) -> Dict[str, Optional[int]]:
+        """
+        Report the footprint of the library
+        :returns: dict of the track count, the size in bytes of the database
+            files on disk and the resident memory of this process in bytes
+            (None where not available)
+        """
+        return {"tracks": len(self),
+                "db_bytes": self._db.size_bytes(),
+                "rss_bytes": _resident_memory()}
+
+    def get_song(self, path: str) -> Optional[Track]:
+        """
+        Get the indexed track for a file path
+        """
+        row = self._db.get_track(path)
+        return _track_from_row(row) if row else None
+
+    def _search(self, field: str, query: str) -> List[Track]:
+        """
+        Get indexed songs whose `field` is contained in `query`
+        """
+        return [_track_from_row(row)
+                for row in self._db.search_field(field, query)]
+
+    def search_songs(self, query: str, limit: int = 50) -> List[Track]:
+        """
+        Full text search of titles, albums, artists and genres; every word
+        of `query` has to match the start of a word of the track metadata.
+        """
+        return [_track_from_row(row)
+                for row in self._db.search_text(query, limit)]
 
     def search_songs_for_artist(self, artist: str) -> List[Track]:
         """
         Get all songs by a particular artist
         """
-        return [song for song in self._songs.values() if song.artist and
-                f" {song.artist.lower()} " in f" {artist.lower()} "]
+        return self._search("artist", artist)
 
     def search_songs_for_album(self, album: str) -> List[Track]:
         """
         Get all songs from a particular album
         """
-        tracks = [song for song in self._songs.values() if song.album and
-                  f" {song.album.lower()} " in f" {album.lower()} "]
+        tracks = self._search("album", album)
         tracks.sort(key=lambda i: i.track)
         return tracks
 
@@ -102,55 +267,224 @@ class MusicLibrary:
         """
         Get all songs or a particular genre
         """
-        return [song for song in self._songs.values() if song.genre and
-                f" {song.genre.lower()} " in f" {genre.lower()} "]
+        return self._search("genre", genre)
 
     def search_songs_for_track(self, track: str) -> List[Track]:
         """
         Search songs for a specific track
         """
-        return [song for song in self._songs.values() if song.title and
-                f" {song.title.lower()} " in f" {track.lower()} "]
+        return self._search("title", track)
 
-    def update_library(self, lib_path: str = None):
+    def update_library(self, lib_path: str = None,
+                       full: bool = False) -> LibraryChanges:
+        """
+        Bring the library up to date with the files under `lib_path`.
+        Directories whose mtime has not changed since the last scan are not
+        listed again; files are parsed only when new or when their mtime,
+        size or inode changed, and tracks of vanished files are removed.
+        :param lib_path: directory to scan (default first library path)
+        :param full: stat every file, also in unchanged directories. Tags
+            edited in place do not change the directory mtime.
+        :returns: LibraryChanges with the added, changed and removed paths
+        """
         lib_path = lib_path or self.library_paths[0]
         LOG.debug(f"Starting library update of: {lib_path}")
-        for root, _, files in walk(lib_path):
-            album_art = None
-            if isfile(join(root, 'Folder.jpg')):
-                album_art = join(root, "Folder.jpg")
-            for file in files:
-                if file == 'Folder.jpg':
-                    continue
-                elif file.startswith('.'):
-                    LOG.debug(f"Ignoring hidden file: {file}")
+        changes = LibraryChanges()
+        to_parse = list()
+        seen_dirs = set()
+        seen_files = set()
+        stack = [lib_path]
+        while stack:
+            root = stack.pop()
+            try:
+                mtime_ns = stat(root).st_mtime_ns
+            except OSError as e:
+                LOG.warning(f"Cannot scan {root}: {e}")
+                continue
+            seen_dirs.add(root)
+            with self._update_lock:
+                cached = self._db.get_dir(root)
+                cached = _CachedDir(*cached) if cached else None
+                listed = full or not cached or cached.mtime_ns != mtime_ns
+                if listed:
+                    cached = self._list_dir(root, mtime_ns)
+                    self._db.put_dir(root, cached.mtime_ns, cached.subdirs,
+                                     cached.files, cached.album_art)
+                indexed_files = self._db.dir_fingerprints(root)
+            for file in cached.files:
+                abs_path = join(root, file)
+                seen_files.add(abs_path)
+                indexed = abs_path in indexed_files
+                old_fingerprint = indexed_files.get(abs_path)
+                if indexed and old_fingerprint[0] is not None and \
+                        not listed:
+                    # Directory unchanged; trust the indexed track
                     continue
-                elif file in self._ignored_files:
-                    LOG.debug(f"Ignoring file: {file}")
+                try:
+                    st = stat(abs_path)
+                except OSError:
                     continue
-                elif not splitext(file)[1]:
-                    LOG.debug(f"Ignoring file with no extension: {file}")
+                fingerprint = (st.st_mtime_ns, st.st_size, st.st_ino)
+                if indexed and fingerprint == old_fingerprint:
                     continue
-                abs_path = join(root, file)
-                with self._update_lock:
-                    if abs_path in self._songs:
-                        LOG.debug(f"Ignoring already indexed track: {abs_path}")
-                        continue
-                    self._songs[abs_path] = \
-                        self._parse_track_from_file(abs_path, album_art)
-        LOG.debug("Updated Library")
+                (changes.changed if indexed else changes.added).append(abs_path)
+                to_parse.append((abs_path, cached.album_art, fingerprint))
+            # Reversed so subdirectories are popped in sorted order
+            stack.extend(join(root, d) for d in reversed(cached.subdirs))
+
+        prefix = join(lib_path, "")
         with self._update_lock:
+            changes.removed = [path for path in self._db.paths_under(prefix)
+                               if path not in seen_files]
+            self._db.delete_tracks(changes.removed)
+            self._db.delete_dirs(d for d in self._db.dirs_under(prefix)
+                                 if d not in seen_dirs)
+            self._db.commit()
+        self._parse_files(to_parse)
+        LOG.debug(f"Updated Library: {len(changes.added)} added, "
+                  f"{len(changes.changed)} changed, "
+                  f"{len(changes.removed)} removed")
+        LOG.info(f"Library memory usage: {self.memory_usage()}")
+        return changes
+
+    def update_paths(self, paths: Iterable[str],
+                     full: bool = False) -> LibraryChanges:
+        """
+        Apply changes of individual files and directories, i.e. as reported
+        by a `LibraryWatcher`, without rescanning the library. New or
+        modified files are parsed, new directories are scanned and tracks
+        of vanished files or directories are removed.
+        :param paths: absolute paths of changed files or directories
+        :param full: stat every file of the directories, see `update_library`
+        :returns: LibraryChanges with the added, changed and removed paths
+        """
+        changes = LibraryChanges()
+        to_parse = list()
+        for path in sorted(set(paths)):
+            if isdir(path):
+                scanned = self.update_library(path, full)
+                changes.added.extend(scanned.added)
+                changes.changed.extend(scanned.changed)
+                changes.removed.extend(scanned.removed)
+                continue
+            with self._update_lock:
+                old_fingerprint = self._db.get_fingerprint(path)
+                # A vanished path may have been a directory of tracks
+                removed = self._db.paths_under(join(path, ""))
             try:
-                with open(self._db_file, 'wb') as f:
-                    pickle.dump(self._songs, f)
-            except Exception as e:
-                LOG.exception(e)
+                st = stat(path)
+            except OSError:
+                st = None
+            if st is None or not self._is_music_file(basename(path)):
+                if old_fingerprint is not None:
+                    removed.append(path)
+                with self._update_lock:
+                    self._db.delete_tracks(removed)
+                    self._db.delete_dirs([path] + self._db.dirs_under(
+                        join(path, "")))
+                    self._db.commit()
+                changes.removed.extend(removed)
+                continue
+            fingerprint = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if fingerprint == old_fingerprint:
+                continue
+            indexed = old_fingerprint is not None
+            (changes.changed if indexed else changes.added).append(path)
+            album_art = join(dirname(path), "Folder.jpg")
+            to_parse.append((path, album_art if isfile(album_art) else None,
+                             fingerprint))
+        self._parse_files(to_parse)
+        if changes:
+            LOG.info(f"Updated Library: {len(changes.added)} added, "
+                     f"{len(changes.changed)} changed, "
+                     f"{len(changes.removed)} removed")
+        return changes
+
+    def _is_music_file(self, file: str) -> bool:
+        """
+        Check if a file name should be indexed
+        """
+        if file == 'Folder.jpg':
+            return False
+        elif file.startswith('.'):
+            LOG.debug(f"Ignoring hidden file: {file}")
+            return False
+        elif file in self._ignored_files:
+            LOG.debug(f"Ignoring file: {file}")
+            return False
+        elif not splitext(file)[1]:
+            LOG.debug(f"Ignoring file with no extension: {file}")
+            return False
+        return True
+
+    def _list_dir(self, root: str, mtime_ns: int) -> _CachedDir:
+        """
+        List the subdirectories and music files of a directory
+        """
+        subdirs = list()
+        files = list()
+        names = set()
+        try:
+            with scandir(root) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError as e:
+            LOG.warning(f"Cannot list {root}: {e}")
+        music_files = [file for file in sorted(files)
+                       if self._is_music_file(file)]
+        album_art = join(root, "Folder.jpg") if "Folder.jpg" in names \
+            else None
+        return _CachedDir(mtime_ns, tuple(sorted(subdirs)),
+                          tuple(music_files), album_art)
+
+    def _parse_files(self, files: List[Tuple[str, Optional[str],
+                                             Fingerprint]]):
+        """
+        Parse tags of the specified files in a pool of `scan_workers` and merge
+        the results into the library in the order the files were specified.
+        At most a few files per worker are in flight at any time; merged
+        tracks are committed in batches of `commit_interval`.
+        :param files: list of (file path, album art path, fingerprint)
+        """
+        self.scan_progress = ScanProgress(total=len(files))
+        if not files:
+            return
+        max_in_flight = self.scan_workers * 4
+        pool_class = ProcessPoolExecutor if self.scan_processes \
+            else ThreadPoolExecutor
+        with pool_class(max_workers=self.scan_workers) as pool:
+            in_flight = deque()
+            for file_path, album_art, fingerprint in files:
+                in_flight.append((file_path, fingerprint, pool.submit(
+                    self._parse_track_from_file, file_path, album_art)))
+                if len(in_flight) >= max_in_flight:
+                    self._merge_parsed_track(*in_flight.popleft())
+            while in_flight:
+                self._merge_parsed_track(*in_flight.popleft())
+        with self._update_lock:
+            self._db.commit()
+
+    def _merge_parsed_track(self, file_path: str, fingerprint: Fingerprint,
+                            future: Future):
+        try:
+            track = future.result()
+        except Exception as e:
+            LOG.exception(f"{file_path} could not be parsed: {e}")
+            track = self.song_from_file_path(file_path)
+        with self._update_lock:
+            self._db.put_track(track, fingerprint)
+            self.scan_progress.done += 1
+            if self.scan_progress.done % self.commit_interval == 0:
+                self._db.commit()
 
     def _parse_track_from_file(self, file_path: str,
                                album_art: Optional[str] = None):
         try:
             meta = ovos_ocp_files_plugin.load(file_path)
-            image_bytes = meta.pictures[0].data if meta.pictures else None
             album = meta.tags['album'][0]
             artist = meta.tags['artist'][0]
             genre = meta.tags['genre'][0] if 'genre' in meta.tags \
@@ -159,10 +493,9 @@ class MusicLibrary:
             track_no = meta.tags['tracknumber'][0]
             duration_seconds = round(meta.streaminfo['duration'])
 
-            if image_bytes:
-                filename = hashlib.md5(image_bytes).hexdigest()
-                album_art = self._write_album_art(image_bytes,
-                                                  filename)
+            if meta.pictures:
+                # Extracted by `get_artwork` once the track is a result
+                album_art = EMBEDDED_ART
 
             if not isinstance(track_no, int):
                 # LOG.debug(f"Handling non-int track_no: {track_no}")
@@ -214,14 +547,89 @@ class MusicLibrary:
                          # duration_ms=round(float(data.get('TLEN') or 0)),
                          track=data.get('TRCK'))
 
-    def _write_album_art(self, image_bytes: bytes, filename: str):
-        output_file = join(self.cache_path, f'{filename}.jpg')
-        if isfile(output_file):
-            return output_file
-        LOG.info(f"Wrote album art to: {output_file}")
-        with open(output_file, 'wb+') as f:
-            f.write(image_bytes)
-        return output_file
+    def get_artwork(self, track: Track) -> Optional[str]:
+        """
+        Get the album art of a track. Embedded art is extracted into the
+        album art cache the first time it is asked for, and again if it was
+        evicted or stored by an older version.
+        :param track: indexed track
+        :returns: path of the picture or None if the track has none
+        """
+        artwork, extract = self._stored_artwork(track)
+        return self._artwork_future(track).result() if extract else artwork
+
+    def get_artworks(self, tracks: List[Track],
+                     timeout: float = 0.5) -> List[Optional[str]]:
+        """
+        Get the album art of several tracks, extracting embedded art in a
+        background pool. Art that takes longer than `timeout` to extract is
+        None here and ready for the next request.
+        :param tracks: indexed tracks
+        :param timeout: seconds to wait for all extractions together
+        :returns: path of the picture or None for each track
+        """
+        artworks = list()
+        futures = dict()
+        for index, track in enumerate(tracks):
+            artwork, extract = self._stored_artwork(track)
+            artworks.append(artwork)
+            if extract:
+                futures[index] = self._artwork_future(track)
+        wait(futures.values(), timeout)
+        for index, future in futures.items():
+            if future.done():
+                artworks[index] = future.result()
+        return artworks
+
+    def _stored_artwork(self, track: Track) -> Tuple[Optional[str], bool]:
+        """
+        Look up the art of a track without extracting it
+        :returns: path of the picture or None, and whether the picture has
+            to be extracted from the track
+        """
+        if not track.artwork:
+            return None, False
+        if track.artwork == EMBEDDED_ART:
+            return None, True
+        if self.album_art.get(track.artwork):
+            return track.artwork, False
+        # Evicted or stored by an older version, unless a Folder.jpg is gone
+        return None, dirname(track.artwork) in (self.album_art.art_path,
+                                                self.cache_path)
+
+    def _artwork_future(self, track: Track) -> Future:
+        """
+        Start extracting the embedded art of a track unless a previous
+        extraction is running or produced art that still exists
+        """
+        with self._update_lock:
+            future = self._art_futures.get(track.path)
+            if future and (not future.done() or (
+                    future.result() and isfile(future.result()))):
+                return future
+            if self._art_pool is None:
+                self._art_pool = ThreadPoolExecutor(
+                    max_workers=self.art_workers,
+                    thread_name_prefix="AlbumArt")
+            future = self._art_pool.submit(self._extract_artwork, track)
+            self._art_futures[track.path] = future
+            return future
+
+    def _extract_artwork(self, track: Track) -> Optional[str]:
+        try:
+            meta = ovos_ocp_files_plugin.load(track.path)
+            if not meta.pictures:
+                return None
+            artwork = self.album_art.add(meta.pictures[0].data,
+                                         dirname(track.path))
+        except Exception as e:
+            LOG.warning(f"Cannot extract album art of {track.path}: {e}")
+            return None
+        if artwork != track.artwork:
+            with self._update_lock:
+                self._db.set_artwork(track.path, artwork)
+                self._db.commit()
+        return artwork
 
     @staticmethod
     def song_from_file_path(file: str, album_art: str = None) -> Track:
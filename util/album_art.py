@@ -0,0 +1,206 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import zlib
+
+from io import BytesIO
+from os import makedirs, remove, replace, scandir, utime, getpid
+from os.path import dirname, join, isfile
+from threading import Lock
+from typing import Dict, Optional, Tuple
+from ovos_utils.log import LOG
+
+try:
+    from PIL import Image
+except ImportError:  # A requirement; without it art is stored full size
+    Image = None
+
+# Artwork of a track whose art is embedded and not extracted yet
+EMBEDDED_ART = "embedded:"
+
+
+class AlbumArtCache:
+    def __init__(self, cache_path: str, max_bytes: int = 64 * 1024 * 1024,
+                 thumbnail_size: int = 300):
+        """
+        Content-addressed store of embedded album art. Each distinct picture
+        is stored once as a thumbnail named by the MD5 of the original image;
+        the least recently used pictures are evicted beyond `max_bytes`.
+        :param cache_path: directory to create the `album_art` directory in
+        :param max_bytes: byte budget of the stored pictures
+        :param thumbnail_size: maximum width and height of thumbnails
+        """
+        self.art_path = join(cache_path, "album_art")
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        makedirs(self.art_path, exist_ok=True)
+        if Image is None:
+            LOG.warning("Pillow is not installed; album art is stored "
+                        "full size")
+        self._init_state()
+
+    def _init_state(self):
+        self._lock = Lock()
+        # album directory -> (size, checksum of head and tail, MD5) of the
+        # last picture stored for it; tracks of an album share their cover
+        self._by_dir: Dict[str, Tuple[int, int, str]] = dict()
+        self._used_bytes: Optional[int] = None
+
+    def __getstate__(self):
+        return {"art_path": self.art_path, "max_bytes": self.max_bytes,
+                "thumbnail_size": self.thumbnail_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def used_bytes(self) -> int:
+        """
+        Bytes of the stored pictures, counted once and then kept up to date
+        """
+        with self._lock:
+            if self._used_bytes is None:
+                self._used_bytes = sum(size for _, size, _ in self._files())
+            return self._used_bytes
+
+    def add(self, image_bytes: bytes, album_dir: str) -> str:
+        """
+        Store an embedded picture unless it is stored already
+        :param image_bytes: picture data as read from the file
+        :param album_dir: directory of the track the picture belongs to
+        :returns: path of the stored picture
+        """
+        # Comparing size and a checksum of both ends is much cheaper than
+        # hashing every copy of the same cover
+        checksum = zlib.crc32(image_bytes[-4096:],
+                              zlib.crc32(image_bytes[:4096]))
+        with self._lock:
+            known = self._by_dir.get(album_dir)
+        if known and known[:2] == (len(image_bytes), checksum):
+            key = known[2]
+        else:
+            key = hashlib.md5(image_bytes).hexdigest()
+            with self._lock:
+                self._by_dir[album_dir] = (len(image_bytes), checksum, key)
+        output_file = join(self.art_path, f"{key}.jpg")
+        if isfile(output_file):
+            return output_file
+        data = self._thumbnail(image_bytes)
+        used_bytes = self.used_bytes  # Counted before the new file exists
+        # Parallel scan workers may write the same art; replace atomically
+        tmp_file = f"{output_file}.{getpid()}.{id(image_bytes)}"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            replace(tmp_file, output_file)
+        finally:
+            if isfile(tmp_file):  # The write or the rename failed
+                remove(tmp_file)
+        LOG.debug(f"Wrote album art to: {output_file}")
+        if used_bytes + len(data) > self.max_bytes:
+            self.evict()
+        else:
+            with self._lock:
+                self._used_bytes += len(data)
+        return output_file
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Mark a stored picture as used. Art outside the store, like a
+        Folder.jpg in the music directory, is only checked, not touched.
+        :param path: path returned by `add` or of an existing picture
+        :returns: `path` or None if it was evicted or does not exist
+        """
+        if dirname(path) != self.art_path:
+            return path if isfile(path) else None
+        try:
+            utime(path)
+        except OSError:
+            return None
+        return path
+
+    def evict(self):
+        """
+        Remove the least recently used pictures until the store is 10%
+        below its byte budget
+        """
+        files = sorted(self._files())
+        used = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in files:
+            if used <= target:
+                break
+            try:
+                remove(path)
+            except OSError:
+                continue
+            used -= size
+            removed += 1
+        with self._lock:
+            self._used_bytes = used
+        if removed:
+            LOG.info(f"Evicted {removed} album art files, {used} bytes left")
+
+    def _files(self):
+        """
+        List (mtime, size, path) of the stored pictures
+        """
+        files = list()
+        with scandir(self.art_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".jpg"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _thumbnail(self, image_bytes: bytes) -> bytes:
+        """
+        Scale a picture down to `thumbnail_size` as JPEG, if Pillow is
+        installed and the picture is larger
+        """
+        if Image is None:
+            return image_bytes
+        try:
+            with Image.open(BytesIO(image_bytes)) as image:
+                if max(image.size) <= self.thumbnail_size and \
+                        image.format == "JPEG":
+                    return image_bytes
+                image = image.convert("RGB")
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                output = BytesIO()
+                image.save(output, "JPEG", quality=85)
+                return output.getvalue()
+        except Exception as e:
+            LOG.warning(f"Cannot make a thumbnail of album art: {e}")
+            return image_bytes
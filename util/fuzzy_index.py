@@ -0,0 +1,155 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import re
+
+from collections import Counter
+from dataclasses import dataclass
+from heapq import nlargest
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from .search_index import normalize
+
+# Spelling to sound rules applied in order, i.e. "ph" -> "f"; "0" is "th"
+_SOUND_RULES = [(re.compile(pattern), sound) for pattern, sound in (
+    (r"^kn|^gn|^pn|^wr", lambda m: m.group()[1]),
+    (r"x", "ks"), (r"sch", "sk"), (r"ph", "f"), (r"ght?", "t"),
+    (r"ch|sh", "x"), (r"th", "0"), (r"dg", "j"), (r"ck|q", "k"),
+    (r"c(?=[eiy])", "s"), (r"c", "k"), (r"g(?=[eiy])", "j"), (r"z", "s"),
+    (r"v", "f"), (r"(?<=.)[aeiouyhw]", ""), (r"(.)\1+", r"\1"))]
+
+
+def phonetic_key(text: str) -> str:
+    """
+    Reduce text to a key of its consonant sounds so names that sound
+    alike get the same key, i.e. "Beyonce" and "Beyonse" -> "bns".
+    Word breaks are dropped as speech recognition often misplaces them.
+    :param text: string to encode
+    :returns: phonetic key
+    """
+    key = normalize(text).replace(" ", "")
+    for pattern, sound in _SOUND_RULES:
+        key = pattern.sub(sound, key)
+    return key
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """
+    Get the character trigrams of normalized text without word breaks,
+    padded so the first and last characters count as much as the others
+    :param text: string to split
+    :returns: set of trigrams
+    """
+    text = f"  {normalize(text).replace(' ', '')} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+@dataclass
+class FuzzyMatch:
+    tag: str
+    name: str
+    score: float
+
+
+class FuzzyIndex:
+    """
+    Approximate name lookup for misheard or misspelled search terms.
+    Candidates share trigrams with the query (found in a trigram index) or
+    sound the same (found in a phonetic key index); they are ranked by the
+    Dice coefficient of their trigrams, with a bonus for sounding alike.
+    """
+    def __init__(self, names: Dict[str, Iterable[str]]):
+        """
+        Index names of several kinds
+        :param names: dict of tag (i.e. "artist") to the names to index
+        """
+        self._tags: List[str] = []
+        self._names: List[str] = []
+        self._sizes: List[int] = []
+        self._keys: List[str] = []
+        self._trigrams: Dict[str, List[int]] = dict()
+        self._phonetic: Dict[str, List[int]] = dict()
+        for tag, tag_names in names.items():
+            for name in tag_names:
+                entry = len(self._names)
+                grams = trigrams(name)
+                key = phonetic_key(name)
+                self._tags.append(tag)
+                self._names.append(name)
+                self._sizes.append(len(grams))
+                self._keys.append(key)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, []).append(entry)
+                self._phonetic.setdefault(key, []).append(entry)
+
+    def __len__(self):
+        return len(self._names)
+
+    def lookup(self, phrase: str, tags: Optional[Iterable[str]] = None,
+               limit: int = 5, min_score: float = 0.4) -> List[FuzzyMatch]:
+        """
+        Find the names closest to a phrase
+        :param phrase: possibly misheard name
+        :param tags: only return names of these tags (default all)
+        :param limit: maximum number of matches to return
+        :param min_score: minimum score between 0 and 1 to return a match
+        :returns: matches ordered by descending score
+        """
+        grams = trigrams(phrase)
+        key = phonetic_key(phrase)
+        if not grams or not key:
+            return []
+        # Shared trigrams per entry; Counter counts whole postings in C
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        # Short keys are shared by too many unrelated names to be evidence
+        sounds_alike = set(self._phonetic.get(key, ())) \
+            if len(key) >= 3 else set()
+        size = len(grams)
+        # An entry sharing `c` trigrams has a Dice coefficient of at most
+        # 2c / (size + c); skip those that cannot reach min_score
+        needed = min_score * size / (2 - min_score)
+        tags = set(tags) if tags else None
+        entries = [e for e, count in shared.items()
+                   if (count >= needed or e in sounds_alike) and
+                   (not tags or self._tags[e] in tags)]
+        entries.extend(e for e in sounds_alike if e not in shared and
+                       (not tags or self._tags[e] in tags))
+
+        def score(entry: int) -> float:
+            dice = 2 * shared[entry] / (size + self._sizes[entry])
+            return 0.8 + 0.2 * dice if entry in sounds_alike else dice
+
+        matches = list()
+        for entry in nlargest(limit, entries, key=score):
+            entry_score = score(entry)
+            if entry_score < min_score:
+                break
+            matches.append(FuzzyMatch(self._tags[entry], self._names[entry],
+                                      round(entry_score, 3)))
+        return matches
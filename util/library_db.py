@@ -0,0 +1,342 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sqlite3
+
+from os import replace
+from os.path import dirname, getsize, isfile
+from threading import Lock, Thread, current_thread, local
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ovos_utils.log import LOG
+from .search_index import normalize, phrases
+
+SCHEMA_VERSION = 1
+
+# Column order matches the `Track` dataclass so rows unpack into it
+TRACK_COLUMNS = "path, title, album, artist, genre, artwork, duration_ms, track"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    title TEXT,
+    album TEXT,
+    artist TEXT,
+    genre TEXT,
+    artwork TEXT,
+    duration_ms INTEGER,
+    track INTEGER,
+    title_key TEXT,
+    album_key TEXT,
+    artist_key TEXT,
+    genre_key TEXT,
+    mtime_ns INTEGER,
+    size INTEGER,
+    inode INTEGER
+);
+CREATE INDEX IF NOT EXISTS tracks_dir ON tracks (dir);
+CREATE INDEX IF NOT EXISTS tracks_title ON tracks (title_key);
+CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album_key);
+CREATE INDEX IF NOT EXISTS tracks_artist ON tracks (artist_key);
+CREATE INDEX IF NOT EXISTS tracks_genre ON tracks (genre_key);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    subdirs TEXT,
+    files TEXT,
+    album_art TEXT
+);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    title, album, artist, genre, content='tracks', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts (rowid, title, album, artist, genre)
+    VALUES (new.id, new.title, new.album, new.artist, new.genre);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_fts_delete AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts (tracks_fts, rowid, title, album, artist, genre)
+    VALUES ('delete', old.id, old.title, old.album, old.artist, old.genre);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_fts_update AFTER UPDATE ON tracks BEGIN
+    INSERT INTO tracks_fts (tracks_fts, rowid, title, album, artist, genre)
+    VALUES ('delete', old.id, old.title, old.album, old.artist, old.genre);
+    INSERT INTO tracks_fts (rowid, title, album, artist, genre)
+    VALUES (new.id, new.title, new.album, new.artist, new.genre);
+END;
+"""
+
+# Names in `dirs` are joined with a separator that cannot occur in a path
+_SEP = "\0"
+# Longest field value in words that `search_field` matches
+_MAX_PHRASE_WORDS = 16
+# Bound parameters per statement; older SQLite builds allow at most 999
+_MAX_VARIABLES = 500
+
+
+def _track_number(track) -> int:
+    if isinstance(track, int):
+        return track
+    number = str(track or "").split('/')[0].strip()
+    return int(number) if number.isnumeric() else 0
+
+
+class LibraryDB:
+    """
+    SQLite store of the tracks, file fingerprints and directory listings of
+    a MusicLibrary. The database runs in WAL mode: one connection writes
+    while every other thread reads through its own connection.
+    """
+    fields = ("artist", "album", "genre", "title")
+
+    def __init__(self, db_file: str):
+        """
+        Open (or create) the database at the specified path
+        :param db_file: path to the SQLite database file
+        """
+        self.db_file = db_file
+        self._readers = local()
+        # Reader connections by thread, closed when their thread ended
+        self._reader_conns: Dict[Thread, sqlite3.Connection] = dict()
+        self._readers_lock = Lock()
+        try:
+            self._conn = self._connect()
+            self._create_schema()
+        except sqlite3.DatabaseError as e:
+            LOG.error(f"{db_file} is not usable ({e}); starting a new one")
+            replace(db_file, f"{db_file}.corrupt")
+            self._conn = self._connect()
+            self._create_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self):
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            LOG.warning(f"SQLite without FTS5, text search uses LIKE: {e}")
+            self.has_fts = False
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES "
+                           "('schema_version', ?)", (str(SCHEMA_VERSION),))
+        self._conn.commit()
+
+    @property
+    def _reader(self) -> sqlite3.Connection:
+        """
+        Connection of the calling thread for queries. The writing connection
+        is not shared with readers so queries see committed data only.
+        """
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._readers.conn = conn
+            with self._readers_lock:
+                for thread in [thread for thread in self._reader_conns
+                               if not thread.is_alive()]:
+                    self._reader_conns.pop(thread).close()
+                self._reader_conns[current_thread()] = conn
+        return conn
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._reader_conns.values():
+                conn.close()
+            self._reader_conns.clear()
+        self._readers = local()
+        self._conn.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def size_bytes(self) -> int:
+        """
+        Get the size of the database including its WAL and shared memory
+        files
+        """
+        files = (self.db_file, f"{self.db_file}-wal", f"{self.db_file}-shm")
+        return sum(getsize(f) for f in files if isfile(f))
+
+    def __len__(self):
+        return self._reader.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def put_track(self, track, fingerprint: Optional[Tuple[int, int, int]]):
+        """
+        Insert or replace a track. Call `commit` to make it visible.
+        :param track: Track to store
+        :param fingerprint: (mtime_ns, size, inode) of the track's file
+        """
+        mtime_ns, size, inode = fingerprint or (None, None, None)
+        self._conn.execute(
+            "INSERT INTO tracks (path, dir, title, album, artist, genre, "
+            "artwork, duration_ms, track, title_key, album_key, artist_key, "
+            "genre_key, mtime_ns, size, inode) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET title=excluded.title, "
+            "album=excluded.album, artist=excluded.artist, "
+            "genre=excluded.genre, artwork=excluded.artwork, "
+            "duration_ms=excluded.duration_ms, track=excluded.track, "
+            "title_key=excluded.title_key, album_key=excluded.album_key, "
+            "artist_key=excluded.artist_key, genre_key=excluded.genre_key, "
+            "mtime_ns=excluded.mtime_ns, size=excluded.size, "
+            "inode=excluded.inode",
+            (track.path, dirname(track.path), track.title, track.album,
+             track.artist, track.genre, track.artwork, track.duration_ms,
+             _track_number(track.track), normalize(track.title),
+             normalize(track.album), normalize(track.artist),
+             normalize(track.genre), mtime_ns, size, inode))
+
+    def set_artwork(self, path: str, artwork: Optional[str]):
+        self._conn.execute("UPDATE tracks SET artwork = ? WHERE path = ?",
+                           (artwork, path))
+
+    def delete_tracks(self, paths: Iterable[str]):
+        self._conn.executemany("DELETE FROM tracks WHERE path = ?",
+                               ((path,) for path in paths))
+
+    def get_track(self, path: str) -> Optional[tuple]:
+        return self._reader.execute(
+            f"SELECT {TRACK_COLUMNS} FROM tracks WHERE path = ?",
+            (path,)).fetchone()
+
+    def iter_tracks(self) -> Iterator[tuple]:
+        return self._reader.execute(
+            f"SELECT {TRACK_COLUMNS} FROM tracks ORDER BY id")
+
+    def get_fingerprint(self, path: str) -> Optional[tuple]:
+        """
+        Get (mtime_ns, size, inode) of an indexed track or None if the path
+        is not indexed
+        """
+        row = self._conn.execute(
+            "SELECT mtime_ns, size, inode FROM tracks WHERE path = ?",
+            (path,)).fetchone()
+        return tuple(row) if row else None
+
+    def paths_under(self, prefix: str) -> List[str]:
+        """
+        Get the paths of all tracks below the specified directory prefix
+        """
+        return [row[0] for row in self._conn.execute(
+            "SELECT path FROM tracks WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix))]
+
+    def dir_fingerprints(self, dir_path: str) -> Dict[str, tuple]:
+        """
+        Get {path: (mtime_ns, size, inode)} of the tracks in one directory
+        """
+        return {row[0]: tuple(row[1:]) for row in self._conn.execute(
+            "SELECT path, mtime_ns, size, inode FROM tracks WHERE dir = ?",
+            (dir_path,))}
+
+    def get_dir(self, dir_path: str) -> Optional[tuple]:
+        """
+        Get (mtime_ns, subdirs, files, album_art) of a scanned directory
+        """
+        row = self._conn.execute(
+            "SELECT mtime_ns, subdirs, files, album_art FROM dirs "
+            "WHERE path = ?", (dir_path,)).fetchone()
+        if not row:
+            return None
+        return (row[0], tuple(filter(None, row[1].split(_SEP))),
+                tuple(filter(None, row[2].split(_SEP))), row[3])
+
+    def put_dir(self, dir_path: str, mtime_ns: int, subdirs: Iterable[str],
+                files: Iterable[str], album_art: Optional[str]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)",
+            (dir_path, mtime_ns, _SEP.join(subdirs), _SEP.join(files),
+             album_art))
+
+    def dirs_under(self, prefix: str) -> List[str]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT path FROM dirs WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix))]
+
+    def delete_dirs(self, paths: Iterable[str]):
+        self._conn.executemany("DELETE FROM dirs WHERE path = ?",
+                               ((path,) for path in paths))
+
+    def search_field(self, field: str, query: str) -> List[tuple]:
+        """
+        Get tracks whose normalized `field` equals a phrase of `query`, i.e.
+        artist "Artist 1" is found by "artist 1 test" but not by "artist"
+        :param field: one of `LibraryDB.fields`
+        :param query: search string
+        :returns: list of track rows in scan order
+        """
+        if field not in self.fields:
+            raise ValueError(f"Unsupported field: {field}")
+        # The number of phrases grows with the square of the query length
+        keys = phrases(query, _MAX_PHRASE_WORDS)
+        rows = dict()
+        for start in range(0, len(keys), _MAX_VARIABLES):
+            batch = keys[start:start + _MAX_VARIABLES]
+            for row in self._reader.execute(
+                    f"SELECT id, {TRACK_COLUMNS} FROM tracks WHERE "
+                    f"{field}_key IN ({', '.join('?' * len(batch))})",
+                    batch):
+                rows[row[0]] = row[1:]
+        return [rows[row_id] for row_id in sorted(rows)]
+
+    def search_text(self, query: str, limit: int = 50) -> List[tuple]:
+        """
+        Full text search over title, album, artist and genre. Every word of
+        the query must match the start of a word in the track's metadata.
+        :param query: search string
+        :param limit: maximum number of tracks to return
+        :returns: list of track rows, best matches first
+        """
+        words = normalize(query).split()
+        if not words:
+            return []
+        if self.has_fts:
+            match = " ".join(f'"{word}"*' for word in words)
+            return self._reader.execute(
+                f"SELECT {', '.join('t.' + c.strip() for c in TRACK_COLUMNS.split(','))} "
+                f"FROM tracks_fts JOIN tracks t ON t.id = tracks_fts.rowid "
+                f"WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)).fetchall()
+        where = " AND ".join(
+            "(title_key || ' ' || album_key || ' ' || artist_key || ' ' || "
+            "genre_key) LIKE ?" for _ in words)
+        return self._reader.execute(
+            f"SELECT {TRACK_COLUMNS} FROM tracks WHERE {where} ORDER BY id "
+            f"LIMIT ?", [f"%{word}%" for word in words] + [limit]).fetchall()
@@ -0,0 +1,80 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unicodedata
+
+from typing import List, Optional, Tuple
+
+
+def normalize(text: str) -> str:
+    """
+    Fold text for matching: case folding, diacritics removed, punctuation
+    replaced by spaces and whitespace collapsed.
+    i.e. "Beyoncé - Déjà Vu!" -> "beyonce deja vu"
+    :param text: string to normalize
+    :returns: normalized string
+    """
+    if not text:
+        return ""
+    folded = unicodedata.normalize("NFKD", str(text).casefold())
+    chars = []
+    for char in folded:
+        category = unicodedata.category(char)
+        if category == "Mn":
+            # combining mark (accent) left over from NFKD decomposition
+            continue
+        chars.append(char if category[0] in "LN" else " ")
+    return " ".join("".join(chars).split())
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """
+    Split text into normalized tokens
+    :param text: string to tokenize
+    :returns: tuple of normalized tokens
+    """
+    return tuple(normalize(text).split())
+
+
+def phrases(text: str, max_words: Optional[int] = None) -> List[str]:
+    """
+    Get every phrase (run of consecutive tokens) of normalized text.
+    A field value is contained in a query when it equals one of its phrases.
+    i.e. "Artist 1 test" -> ["artist", "artist 1", "artist 1 test", "1", ...]
+    :param text: string to split into phrases
+    :param max_words: longest phrase to return, all phrases if None
+    :returns: list of unique phrases
+    """
+    tokens = tokenize(text)
+    found = dict()
+    for start in range(len(tokens)):
+        stop = len(tokens) if max_words is None else \
+            min(len(tokens), start + max_words)
+        for end in range(start + 1, stop + 1):
+            found[" ".join(tokens[start:end])] = None
+    return list(found)
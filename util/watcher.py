@@ -0,0 +1,251 @@
+# NEON AI (TM) SOFTWARE, Software Development Kit & Application Framework
+# All trademark and other rights reserved by their respective owners
+# Copyright 2008-2022 Neongecko.com Inc.
+# Contributors: Daniel McKnight, Guy Daniels, Elon Gasper, Richard Leeds,
+# Regina Bloomstine, Casimiro Ferreira, Andrii Pernatii, Kirill Hrymailo
+# BSD-3 License
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from this
+#    software without specific prior written permission.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS  BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS;  OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE,  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+from os.path import join, isdir
+from threading import Event, Thread
+from time import monotonic
+from typing import Dict, Optional, Set
+from ovos_utils.log import LOG
+
+# inotify event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Files are indexed once written completely (IN_CLOSE_WRITE), not on every
+# IN_MODIFY while a large file is being copied
+_WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """
+    Minimal ctypes binding to the Linux inotify API
+    """
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self, timeout: float):
+        """
+        Wait up to `timeout` seconds and yield (wd, mask, name) of events
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher(Thread):
+    """
+    Keep a MusicLibrary current by watching its `library_paths`. Events are
+    coalesced per path and applied with `MusicLibrary.update_paths` once no
+    new event arrived for `debounce` seconds (at most `max_delay` seconds
+    after the first one), so copying an album is indexed in one batch.
+    Without inotify (i.e. not Linux, network mounts, watch limit reached)
+    the library paths are polled with full rescans instead, which also find
+    tags edited in place.
+    """
+    def __init__(self, library, debounce: float = 2.0,
+                 max_delay: float = 10.0, poll_interval: float = 60.0,
+                 use_inotify: bool = True):
+        """
+        :param library: MusicLibrary to keep up to date
+        :param debounce: seconds without events before changes are applied
+        :param max_delay: maximum seconds to hold back changes during a burst
+        :param poll_interval: seconds between rescans without inotify
+        :param use_inotify: False to always poll
+        """
+        Thread.__init__(self, name="LibraryWatcher", daemon=True)
+        self.library = library
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.polling = False
+        self._stopping = Event()
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, str] = dict()
+        self._pending: Set[str] = set()
+        self._first_event = None
+        self._last_event = None
+        self._full_rescan = False
+
+    def stop(self):
+        """
+        Stop watching; pending changes are applied before the thread exits
+        """
+        self._stopping.set()
+
+    def run(self):
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                for path in self.library.library_paths:
+                    self._watch_tree(path)
+            except OSError as e:
+                LOG.warning(f"inotify not available, polling instead: {e}")
+                if self._inotify:
+                    self._inotify.close()
+                self._inotify = None
+        self.polling = self._inotify is None
+        try:
+            if self.polling:
+                self._poll()
+            else:
+                self._watch()
+        finally:
+            if self._inotify:
+                self._inotify.close()
+
+    def _poll(self):
+        while not self._stopping.wait(self.poll_interval):
+            for path in self.library.library_paths:
+                try:
+                    self.library.update_library(path, full=True)
+                except Exception as e:
+                    LOG.exception(f"Rescan of {path} failed: {e}")
+
+    def _watch(self):
+        while not self._stopping.is_set():
+            try:
+                for wd, mask, name in self._inotify.read_events(
+                        self.debounce / 4):
+                    self._handle_event(wd, mask, name)
+                self._flush_if_quiet()
+            except Exception as e:
+                # Keep watching; the next rescan picks up what was missed
+                LOG.exception(f"Handling inotify events failed: {e}")
+        self._flush()
+
+    def _watch_tree(self, root: str):
+        """
+        Add watches for a directory and all of its subdirectories
+        """
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+            wd = self._inotify.add_watch(directory, _WATCH_MASK)
+            self._watches[wd] = directory
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost, also of files in unchanged directories
+            LOG.warning("inotify queue overflow; rescanning library")
+            self._full_rescan = True
+            self._add_pending(self.library.library_paths)
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        directory = self._watches.get(wd)
+        if directory is None:
+            return
+        path = join(directory, name) if name else directory
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            try:
+                self._watch_tree(path)
+            except OSError as e:
+                LOG.warning(f"Cannot watch {path}: {e}")
+        self._add_pending([path])
+
+    def _add_pending(self, paths):
+        self._pending.update(paths)
+        now = monotonic()
+        self._first_event = self._first_event or now
+        self._last_event = now
+
+    def _flush_if_quiet(self):
+        if not self._pending:
+            return
+        now = monotonic()
+        if now - self._last_event >= self.debounce or \
+                now - self._first_event >= self.max_delay:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        paths = self._pending
+        self._pending = set()
+        full, self._full_rescan = self._full_rescan, False
+        self._first_event = self._last_event = None
+        # A path below another pending directory is covered by its scan
+        dirs = [join(path, "") for path in paths if isdir(path)]
+        roots = [path for path in paths
+                 if not any(path.startswith(d) for d in dirs)]
+        try:
+            self.library.update_paths(roots, full)
+        except Exception as e:
+            LOG.exception(f"Updating library for {len(roots)} paths failed: "
+                          f"{e}")